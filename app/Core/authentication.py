@@ -0,0 +1,242 @@
+"""
+Autenticación por token con cache del usuario
+
+TokenAuthentication consulta authtoken y la tabla de usuarios en cada
+petición. CachedTokenAuthentication y SignedTokenAuthentication guardan
+un resumen del usuario de cada token (pk, is_active y huella de la
+contraseña) en un LRU del proceso y, si TOKEN_CACHE_ALIAS está
+configurado, en un cache compartido. Cada entrada lleva la versión del
+usuario, que se incrementa al guardarlo o al borrar su token, con lo que
+deja de ser válida en todos los procesos sin recorrer claves.
+"""
+from collections import OrderedDict
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import (
+    BaseAuthentication,
+    TokenAuthentication,
+    get_authorization_header,
+)
+
+from Core import tokens, versiones
+from Core.routers import marcar_escritura
+
+
+class LRUCache:
+    """Diccionario acotado a TOKEN_CACHE_SIZE entradas con expiración,
+    compartido por los hilos del proceso"""
+
+    def __init__(self):
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, clave):
+        """Regresa el valor vigente de la clave o None"""
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            valor, expira = entrada
+            if expira < time.monotonic():
+                del self._datos[clave]
+                return None
+            self._datos.move_to_end(clave)
+
+            return valor
+
+    def set(self, clave, valor, timeout):
+        """Guarda el valor y desaloja las entradas menos usadas"""
+        with self._lock:
+            self._datos[clave] = (valor, time.monotonic() + timeout)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > settings.TOKEN_CACHE_SIZE:
+                self._datos.popitem(last=False)
+
+    def descartar(self, condicion):
+        """Elimina las entradas cuyo valor cumple la condición"""
+        with self._lock:
+            claves = [
+                clave for clave, (valor, _) in self._datos.items()
+                if condicion(valor)
+            ]
+            for clave in claves:
+                del self._datos[clave]
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+
+# Token (sha256) o usuario:<id> -> ((pk, is_active, huella), versión)
+tokens_locales = LRUCache()
+
+
+def get_shared_cache():
+    """Backend de TOKEN_CACHE_ALIAS, None si solo se usa el del proceso"""
+    alias = settings.TOKEN_CACHE_ALIAS
+    return caches[alias] if alias else None
+
+
+def _version_key(user_id):
+    return f'auth:version:{user_id}'
+
+
+def _entrada_key(clave):
+    return f'auth:usuario:{clave}'
+
+
+def get_version(user_id):
+    """Versión del usuario en el cache compartido. Sin cache compartido
+    es siempre 0 y la invalidación solo alcanza al proceso actual, los
+    demás la ven al expirar TOKEN_CACHE_TIMEOUT"""
+    cache = get_shared_cache()
+    if cache is None:
+        return 0
+
+    return versiones.get_version(cache, _version_key(user_id))
+
+
+def invalidar_usuario(user_id):
+    """Descarta el usuario cacheado de todos sus tokens. Sus lecturas
+    siguientes van a la primaria"""
+    def invalidar():
+        tokens_locales.descartar(lambda entrada: entrada[0][0] == user_id)
+        cache = get_shared_cache()
+        if cache is not None:
+            versiones.incrementar(cache, _version_key(user_id))
+        marcar_escritura(user_id)
+
+    versiones.al_confirmar(invalidar)
+
+
+def _resumen(user):
+    """Lo único que se cachea del usuario, sin contraseña ni datos
+    personales"""
+    return user.pk, user.is_active, tokens.huella(user)
+
+
+def _usuario(pk, is_active):
+    """Usuario con solo pk e is_active cargados, los demás campos se
+    consultan al usarlos"""
+    User = get_user_model()
+    valores = {User._meta.pk.attname: pk, 'is_active': is_active}
+    campos = [
+        f.attname for f in User._meta.concrete_fields
+        if f.attname in valores
+    ]
+
+    return User.from_db(
+        DEFAULT_DB_ALIAS, campos, [valores[c] for c in campos]
+    )
+
+
+def obtener_usuario(clave, buscar_pk, cargar):
+    """Regresa (usuario, huella) del resumen cacheado bajo la clave si su
+    versión sigue vigente. Si no, toma el pk de la entrada vencida o de
+    buscar_pk(), lee la versión y solo después carga el usuario con
+    cargar(pk) y guarda su resumen. Un cambio confirmado entre la lectura
+    de la versión y la de la fila deja la entrada con la versión
+    anterior, ya invalidada"""
+    cache = get_shared_cache()
+    entrada = tokens_locales.get(clave)
+    compartida = entrada is None and cache is not None
+    if compartida:
+        entrada = cache.get(_entrada_key(clave))
+    if entrada is not None:
+        (pk, is_active, huella), guardada = entrada
+        version = get_version(pk)
+        if guardada == version:
+            if compartida:
+                tokens_locales.set(
+                    clave, entrada, settings.TOKEN_CACHE_TIMEOUT
+                )
+            return _usuario(pk, is_active), huella
+    else:
+        pk = buscar_pk()
+        version = get_version(pk)
+
+    user = cargar(pk)
+    resumen = _resumen(user)
+    entrada = (resumen, version)
+    tokens_locales.set(clave, entrada, settings.TOKEN_CACHE_TIMEOUT)
+    if cache is not None:
+        cache.set(_entrada_key(clave), entrada, settings.TOKEN_CACHE_TIMEOUT)
+
+    return user, resumen[2]
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication que solo consulta la base de datos cuando el
+    token no está en cache o su usuario cambió"""
+
+    def authenticate_credentials(self, key):
+        cargar = super().authenticate_credentials
+
+        def buscar_pk():
+            pk = self.get_model().objects.filter(
+                key=key
+            ).values_list('user_id', flat=True).first()
+            if pk is None:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            return pk
+
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        user = obtener_usuario(digest, buscar_pk, lambda pk: cargar(key)[0])[0]
+
+        return user, self.get_model()(key=key, user=user)
+
+
+def usuario_firmado(datos):
+    """Usuario activo de un token firmado ya verificado. Se carga por el
+    mismo cache, un token emitido antes de cambiar la contraseña ya no
+    corresponde a su huella"""
+    def cargar(pk):
+        user = get_user_model().objects.filter(pk=pk).first()
+        if user is None:
+            raise tokens.TokenInvalido
+        return user
+
+    user, huella = obtener_usuario(
+        f'usuario:{datos["u"]}', lambda: datos['u'], cargar
+    )
+    if not user.is_active or datos['p'] != huella:
+        raise tokens.TokenInvalido
+
+    return user
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """Autenticación con el token de acceso firmado de Core.tokens en el
+    encabezado Authorization: Bearer <token>"""
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(
+                _('Encabezado de token firmado inválido')
+            )
+
+        try:
+            datos = tokens.verificar(auth[1].decode())
+            user = usuario_firmado(datos)
+        except (tokens.TokenInvalido, UnicodeError):
+            raise exceptions.AuthenticationFailed(
+                _('Token inválido o expirado')
+            )
+
+        return user, datos
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -0,0 +1,142 @@
+"""
+Comprobaciones de disponibilidad para la sonda de readiness
+
+Cada dependencia se comprueba en un hilo propio y se mide su latencia.
+La que no termina en READINESS_TIMEOUT segundos cuenta como caída, así
+una base de datos colgada no retiene la sonda, y no se vuelve a enviar
+mientras siga en curso para que los hilos no se acumulen detrás de ella.
+El resultado se reutiliza READINESS_TTL segundos para que las sondas del
+balanceador no lleguen una por una a Postgres.
+"""
+from concurrent.futures import ThreadPoolExecutor, wait
+import math
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+_pool = None
+_lock = threading.Lock()
+_resultado = None
+# Nombre de la comprobación -> su última tarea enviada al pool
+_en_curso = {}
+
+
+def get_pool():
+    """Pool de hilos de las comprobaciones del proceso"""
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(
+            max_workers=len(COMPROBACIONES),
+            thread_name_prefix='readiness',
+        )
+
+    return _pool
+
+
+def comprobar_db():
+    """Ida y vuelta a default con una conexión del driver que se cierra
+    al terminar. La conexión y la consulta tienen sus propios límites
+    para que el hilo no quede bloqueado si Postgres no responde"""
+    wrapper = connections[DEFAULT_DB_ALIAS]
+    params = wrapper.get_connection_params()
+    # libpq acepta segundos enteros y trata menos de 2 como 2
+    params['connect_timeout'] = max(2, math.ceil(settings.READINESS_TIMEOUT))
+    conexion = wrapper.get_new_connection(params)
+    try:
+        with conexion.cursor() as cursor:
+            # PgBouncer rechaza statement_timeout como parámetro de
+            # arranque. SET LOCAL lo limita a la transacción de la sonda
+            # y no queda en la conexión del servidor que PgBouncer reusa
+            cursor.execute(
+                'SET LOCAL statement_timeout = %s',
+                [int(settings.READINESS_TIMEOUT * 1000)],
+            )
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+    finally:
+        conexion.close()
+
+
+def comprobar_cache():
+    """Escribe y lee una clave del cache por omisión"""
+    valor = uuid.uuid4().hex
+    cache.set('salud:sonda', valor, 10)
+    if cache.get('salud:sonda') != valor:
+        raise RuntimeError('El cache no regresó el valor escrito')
+
+
+def comprobar_media():
+    """Crea y borra un archivo en MEDIA_ROOT"""
+    with tempfile.NamedTemporaryFile(dir=settings.MEDIA_ROOT) as archivo:
+        archivo.write(b'ok')
+        archivo.flush()
+
+
+COMPROBACIONES = {
+    'database': comprobar_db,
+    'cache': comprobar_cache,
+    'media': comprobar_media,
+}
+
+
+def _medir(comprobacion):
+    inicio = time.perf_counter()
+    comprobacion()
+    return (time.perf_counter() - inicio) * 1000
+
+
+def comprobar():
+    """Ejecuta las comprobaciones en paralelo y regresa
+    (listo, detalle por dependencia). Una comprobación que sigue en curso
+    desde la sonda anterior no se envía otra vez, se espera la misma"""
+    pendientes = {}
+    for nombre, comprobacion in COMPROBACIONES.items():
+        futuro = _en_curso.get(nombre)
+        if futuro is None or futuro.done():
+            futuro = get_pool().submit(_medir, comprobacion)
+            _en_curso[nombre] = futuro
+        pendientes[futuro] = nombre
+    terminadas, _ = wait(pendientes, timeout=settings.READINESS_TIMEOUT)
+
+    detalle = {}
+    for futuro, nombre in pendientes.items():
+        if futuro not in terminadas:
+            detalle[nombre] = {'ok': False, 'error': 'timeout'}
+        elif futuro.exception() is not None:
+            # La sonda no requiere autenticación, solo se expone la clase
+            detalle[nombre] = {
+                'ok': False, 'error': type(futuro.exception()).__name__
+            }
+        else:
+            detalle[nombre] = {'ok': True, 'ms': round(futuro.result(), 2)}
+
+    return all(d['ok'] for d in detalle.values()), detalle
+
+
+def estado():
+    """Resultado de comprobar() reutilizado READINESS_TTL segundos. Solo
+    una petición a la vez vuelve a comprobar, las demás esperan su
+    resultado"""
+    global _resultado
+    with _lock:
+        if _resultado is None or _resultado[0] <= time.monotonic():
+            listo, detalle = comprobar()
+            _resultado = (
+                time.monotonic() + settings.READINESS_TTL, listo, detalle
+            )
+
+        return _resultado[1:]
+
+
+def limpiar():
+    """Descarta el resultado guardado y las tareas en curso"""
+    global _resultado
+    with _lock:
+        _resultado = None
+        _en_curso.clear()
@@ -0,0 +1,100 @@
+"""
+Comando Django para comparar peticiones por segundo con una conexión
+nueva por petición y con conexiones persistentes
+"""
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+
+from Core.models import Receta
+
+
+# Nombre: (CONN_MAX_AGE, CONN_HEALTH_CHECKS)
+CONFIGURACIONES = {
+    'sin persistencia': (0, False),
+    'persistente': (60, False),
+    'persistente + health checks': (60, True),
+}
+
+
+class Command(BaseCommand):
+    """Atiende las mismas lecturas con --workers hilos, cada uno como un
+    worker de uWSGI que cierra o conserva su conexión al terminar cada
+    petición según CONN_MAX_AGE"""
+    help = 'Benchmark de conexiones persistentes contra Postgres'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--peticiones', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--recetas', type=int, default=10)
+
+    def handle(self, *args, **options):
+        """Comienzo del comando"""
+        user = get_user_model().objects.create_user(
+            f'benchmark-{time.time_ns()}@example.com', None
+        )
+        Receta.objects.bulk_create([
+            Receta(
+                user=user,
+                titulo=f'Receta {i}',
+                tiempo_minutos=10,
+                precio=Decimal('5.00'),
+            )
+            for i in range(options['recetas'])
+        ])
+        auth = f'Token {Token.objects.create(user=user).key}'
+        # Los wrappers de cada hilo comparten este diccionario
+        db = connections.settings['default']
+        original = db['CONN_MAX_AGE'], db['CONN_HEALTH_CHECKS']
+        hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        try:
+            with override_settings(ALLOWED_HOSTS=hosts):
+                for nombre, config in CONFIGURACIONES.items():
+                    connections.close_all()
+                    db['CONN_MAX_AGE'], db['CONN_HEALTH_CHECKS'] = config
+                    total = self._medir(nombre, auth, options)
+                    self.stdout.write(
+                        f'{nombre:<30} '
+                        f'{options["peticiones"] / total:>8.1f} req/s'
+                    )
+        finally:
+            db['CONN_MAX_AGE'], db['CONN_HEALTH_CHECKS'] = original
+            connections.close_all()
+            user.delete()
+
+    def _medir(self, nombre, auth, options):
+        """Regresa los segundos que tardan todas las peticiones. Cada URL
+        es distinta para no responder desde el cache de respuestas"""
+        base = reverse('receta:receta-list')
+        urls = [f'{base}?bench={nombre}-{i}' for i in range(
+            options['peticiones']
+        )]
+        workers = options['workers']
+
+        def worker(urls):
+            client = Client()
+            try:
+                for url in urls:
+                    # Lo mismo que hacen request_started y
+                    # request_finished en el handler WSGI
+                    close_old_connections()
+                    client.get(url, HTTP_AUTHORIZATION=auth)
+                    close_old_connections()
+            finally:
+                connections.close_all()
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(workers) as pool:
+            list(pool.map(worker, [urls[i::workers] for i in range(workers)]))
+
+        return time.perf_counter() - inicio
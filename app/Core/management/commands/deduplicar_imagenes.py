@@ -0,0 +1,130 @@
+"""
+Comando Django para pasar las imágenes de recetas a almacenamiento por
+contenido
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+import re
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from Core.models import Imagen, Receta
+from Core.storage import hash_archivo
+from receta.cache import bump_version
+from receta.imagenes import (
+    directorio_derivados,
+    generar_derivados,
+    purgar_imagenes,
+)
+
+
+# Nombre de un archivo que ya está guardado por contenido
+RUTA_CONTENIDO = re.compile(r'/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+def recalcular_referencias(receta_model, imagen_model):
+    """Recalcula las referencias de todos los archivos con dos
+    sentencias por conjuntos, bloqueando las escrituras a recetas
+    mientras cuenta. Solo usa _meta para poder llamarse desde
+    migraciones con modelos históricos"""
+    q = connection.ops.quote_name
+    receta = q(receta_model._meta.db_table)
+    imagen = q(imagen_model._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {receta} IN SHARE MODE')
+        cursor.execute(
+            f'''
+            INSERT INTO {imagen} (ruta, referencias)
+            SELECT imagen, count(*) FROM {receta}
+            WHERE imagen <> '' GROUP BY imagen
+            ON CONFLICT (ruta) DO UPDATE
+            SET referencias = EXCLUDED.referencias
+            WHERE {imagen}.referencias <> EXCLUDED.referencias
+            '''
+        )
+        cursor.execute(
+            f'''
+            UPDATE {imagen} i SET referencias = 0
+            WHERE referencias <> 0 AND NOT EXISTS (
+                SELECT 1 FROM {receta} r WHERE r.imagen = i.ruta
+            )
+            '''
+        )
+
+
+class Command(BaseCommand):
+    """Renombra por su sha256 las imágenes cargadas antes del
+    almacenamiento por contenido y fusiona las repetidas"""
+    help = 'Deduplica uploads/receta/ por el hash de su contenido'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Archivos leídos en paralelo al calcular los hashes',
+        )
+
+    def handle(self, *args, **options):
+        """Comienzo del comando"""
+        storage = Receta._meta.get_field('imagen').storage
+        viejas = [
+            ruta for ruta in Receta.objects.exclude(imagen='').exclude(
+                imagen=None
+            ).values_list('imagen', flat=True).distinct()
+            if not RUTA_CONTENIDO.search(ruta) and storage.exists(ruta)
+        ]
+
+        def rehash(ruta):
+            with storage.open(ruta, 'rb') as archivo:
+                archivo.sha256 = hash_archivo(archivo)
+                return storage.ruta_contenido(ruta, archivo)
+
+        with ThreadPoolExecutor(options['workers']) as pool:
+            nuevas = list(pool.map(rehash, viejas))
+
+        # Primero se crean los archivos nuevos como enlaces, la base de
+        # datos nunca apunta a un archivo que todavía no existe
+        for vieja, nueva in zip(viejas, nuevas):
+            os.makedirs(os.path.dirname(storage.path(nueva)), exist_ok=True)
+            try:
+                os.link(storage.path(vieja), storage.path(nueva))
+            except FileExistsError:
+                pass
+            derivados = storage.path(directorio_derivados(vieja))
+            if os.path.isdir(derivados):
+                try:
+                    os.rename(
+                        derivados, storage.path(directorio_derivados(nueva))
+                    )
+                except OSError:
+                    # Ya hay derivados del mismo contenido
+                    pass
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'''
+                UPDATE {connection.ops.quote_name(Receta._meta.db_table)} r
+                SET imagen = m.nueva, imagen_estado = %s, updated_at = now()
+                FROM unnest(%s::text[], %s::text[]) m(vieja, nueva)
+                WHERE r.imagen = m.vieja
+                RETURNING r.id, r.user_id
+                ''',
+                [Receta.EstadoImagen.PENDIENTE, viejas, nuevas],
+            )
+            filas = cursor.fetchall()
+            for user_id in {user_id for _, user_id in filas}:
+                bump_version(user_id)
+
+        # Los derivados se reutilizan por contenido, solo se codifican
+        # los que faltan
+        for receta_id, _ in filas:
+            generar_derivados(receta_id)
+        purgadas = purgar_imagenes(viejas)
+        recalcular_referencias(Receta, Imagen)
+
+        self.stdout.write(
+            f'{len(viejas)} imágenes renombradas, '
+            f'{len(set(nuevas))} archivos únicos, '
+            f'{len(purgadas)} archivos purgados'
+        )
+        self.stdout.write(self.style.SUCCESS('Deduplicación terminada'))
@@ -0,0 +1,107 @@
+"""
+Comando Django para fusionar tags e ingredientes con el mismo nombre
+"""
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from Core.models import Receta
+from receta.cache import bump_version
+
+
+# Relaciones de Receta cuyos modelos se deduplican
+RELACIONES = ('tags', 'ingredientes')
+
+
+def fusionar_duplicados(receta_model, relacion, lote=1000):
+    """Conserva el id más antiguo de cada (user, nombre) repetido,
+    mueve a él las filas de la tabla intermedia y borra el resto.
+    Trabaja por lotes de grupos en transacciones cortas y regresa el
+    número de objetos eliminados. Solo usa _meta para poder llamarse
+    desde migraciones con modelos históricos"""
+    field = receta_model._meta.get_field(relacion)
+    q = connection.ops.quote_name
+    tabla = q(field.related_model._meta.db_table)
+    through = q(field.remote_field.through._meta.db_table)
+    receta = q(receta_model._meta.db_table)
+    origen = q(field.m2m_column_name())
+    destino = q(field.m2m_reverse_name())
+
+    eliminados = 0
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'''
+                SELECT user_id, MIN(id), array_agg(id) FROM {tabla}
+                GROUP BY user_id, nombre HAVING COUNT(*) > 1
+                LIMIT %s
+                ''',
+                [lote],
+            )
+            grupos = cursor.fetchall()
+            if not grupos:
+                return eliminados
+
+            duplicados, conservados = [], []
+            for _, conservar, ids in grupos:
+                for pk in ids:
+                    if pk != conservar:
+                        duplicados.append(pk)
+                        conservados.append(conservar)
+
+            cursor.execute(
+                f'''
+                INSERT INTO {through} ({origen}, {destino})
+                SELECT t.{origen}, m.conservar FROM {through} t
+                JOIN unnest(%s::bigint[], %s::bigint[]) m(id, conservar)
+                    ON t.{destino} = m.id
+                ON CONFLICT DO NOTHING
+                ''',
+                [duplicados, conservados],
+            )
+            cursor.execute(
+                f'DELETE FROM {through} WHERE {destino} = ANY(%s)',
+                [duplicados],
+            )
+            cursor.execute(
+                f'''
+                UPDATE {receta} SET updated_at = now() WHERE id IN (
+                    SELECT {origen} FROM {through}
+                    WHERE {destino} = ANY(%s)
+                )
+                ''',
+                [conservados],
+            )
+            cursor.execute(
+                f'UPDATE {tabla} SET updated_at = now() WHERE id = ANY(%s)',
+                [conservados],
+            )
+            cursor.execute(
+                f'DELETE FROM {tabla} WHERE id = ANY(%s)', [duplicados]
+            )
+            eliminados += len(duplicados)
+
+            for user_id in {g[0] for g in grupos}:
+                bump_version(user_id)
+
+
+class Command(BaseCommand):
+    """Fusiona tags e ingredientes duplicados por usuario"""
+    help = 'Fusiona tags e ingredientes repetidos por (user, nombre)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=1000,
+            help='Grupos de duplicados por transacción',
+        )
+
+    def handle(self, *args, **options):
+        """Comienzo del comando"""
+        for relacion in RELACIONES:
+            eliminados = fusionar_duplicados(
+                Receta, relacion, options['lote']
+            )
+            self.stdout.write(
+                f'{relacion}: {eliminados} duplicados fusionados'
+            )
+
+        self.stdout.write(self.style.SUCCESS('Deduplicación terminada'))
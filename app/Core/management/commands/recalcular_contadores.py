@@ -0,0 +1,63 @@
+"""
+Comando Django para recalcular usage_count de tags e ingredientes
+"""
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from Core.models import Receta
+from receta.cache import bump_version
+
+
+# Relaciones de Receta cuyos modelos llevan usage_count
+RELACIONES = ('tags', 'ingredientes')
+
+
+def recalcular_contadores(receta_model, relacion):
+    """Recalcula usage_count de todos los objetos de la relación con un
+    solo UPDATE por conjuntos y regresa el número de filas corregidas.
+    Bloquea las escrituras a la tabla intermedia mientras cuenta para
+    que los triggers no cambien los contadores a medio recalcular. Solo
+    usa _meta para poder llamarse desde migraciones con modelos
+    históricos"""
+    field = receta_model._meta.get_field(relacion)
+    q = connection.ops.quote_name
+    tabla = q(field.related_model._meta.db_table)
+    through = q(field.remote_field.through._meta.db_table)
+    destino = q(field.m2m_reverse_name())
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {through} IN SHARE MODE')
+        cursor.execute(
+            f'''
+            UPDATE {tabla} a
+            SET usage_count = c.total, updated_at = now()
+            FROM (
+                SELECT t.id, count(r.{destino}) total FROM {tabla} t
+                LEFT JOIN {through} r ON r.{destino} = t.id
+                GROUP BY t.id
+            ) c
+            WHERE a.id = c.id AND a.usage_count <> c.total
+            RETURNING a.user_id
+            '''
+        )
+        usuarios = [fila[0] for fila in cursor.fetchall()]
+
+    for user_id in set(usuarios):
+        bump_version(user_id)
+
+    return len(usuarios)
+
+
+class Command(BaseCommand):
+    """Recalcula los contadores de recetas por tag e ingrediente"""
+    help = 'Recalcula usage_count de tags e ingredientes'
+
+    def handle(self, *args, **options):
+        """Comienzo del comando"""
+        for relacion in RELACIONES:
+            corregidos = recalcular_contadores(Receta, relacion)
+            self.stdout.write(
+                f'{relacion}: {corregidos} contadores corregidos'
+            )
+
+        self.stdout.write(self.style.SUCCESS('Contadores recalculados'))
@@ -1,27 +1,103 @@
 """
 Comando Django para esperar a que la base de datos este disponible
 """
+from concurrent.futures import ThreadPoolExecutor
+import random
 import time
 
 from psycopg2 import OperationalError as Psycopg2Error
 
+from django.db import connections
 from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 
 class Command(BaseCommand):
-    """Comando para esperar por la BBDD"""
+    """Comando para esperar por la BBDD. Cada base se prueba en su hilo
+    con una conexión directa, sin los system checks de Django, y entre
+    intentos espera un tiempo aleatorio que crece exponencialmente"""
+    help = 'Espera a que las bases de datos acepten conexiones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', action='append', dest='databases',
+            help='Alias a esperar, se puede repetir (por omisión todos)',
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=60,
+            help='Segundos totales antes de fallar',
+        )
+        parser.add_argument(
+            '--espera-inicial', type=float, default=0.1,
+            help='Segundos máximos de la primera espera',
+        )
+        parser.add_argument(
+            '--espera-maxima', type=float, default=5,
+            help='Tope en segundos de cada espera',
+        )
 
     def handle(self, *args, **options):
         """Comienzpo del comando"""
+        aliases = options['databases'] or list(connections)
         self.stdout.write('Esperando por nuestra BD.....')
-        db_up = False
-        while db_up is False:
+        inicio = time.monotonic()
+        limite = inicio + options['timeout']
+
+        with ThreadPoolExecutor(len(aliases)) as pool:
+            resultados = list(pool.map(
+                lambda alias: self._esperar(alias, inicio, limite, options),
+                aliases,
+            ))
+
+        pendientes = [
+            alias for alias, listo in zip(aliases, resultados)
+            if listo is None
+        ]
+        if pendientes:
+            raise CommandError(
+                f'BD no disponible después de {options["timeout"]:g} '
+                f'segundos: {", ".join(pendientes)}'
+            )
+
+        for alias, (segundos, intentos) in zip(aliases, resultados):
+            self.stdout.write(
+                f'{alias}: lista en {segundos:.2f} s, {intentos} intentos'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Base de Datos Disponible!! '
+            f'({time.monotonic() - inicio:.2f} s)'
+        ))
+
+    def _esperar(self, alias, inicio, limite, options):
+        """Prueba el alias hasta que responda o se acabe el tiempo.
+        Regresa (segundos, intentos) o None si no estuvo disponible"""
+        intentos = 0
+        while True:
+            intentos += 1
             try:
-                self.check(databases=['default'])
-                db_up = True
+                self.probar(alias, limite - time.monotonic())
+                return time.monotonic() - inicio, intentos
             except (Psycopg2Error, OperationalError):
-                self.stdout.write('BD no disponible, esperando 1 segundo....')
-                time.sleep(1)
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    return None
+                # Jitter completo, evita que los contenedores que
+                # arrancan juntos reintenten al mismo tiempo
+                espera = min(restante, random.uniform(0, min(
+                    options['espera_maxima'],
+                    options['espera_inicial'] * 2 ** (intentos - 1),
+                )))
+                self.stdout.write(
+                    f'BD {alias} no disponible, esperando '
+                    f'{espera:.2f} segundos....'
+                )
+                time.sleep(espera)
 
-        self.stdout.write(self.style.SUCCESS('Base de Datos Disponible!!'))
+    def probar(self, alias, restante):
+        """Abre y cierra una conexión del driver con los parámetros del
+        alias, sin preparar la sesión como lo hace Django"""
+        wrapper = connections[alias]
+        params = wrapper.get_connection_params()
+        # libpq acepta segundos enteros y trata menos de 2 como 2
+        params.setdefault('connect_timeout', max(2, int(restante)))
+        wrapper.get_new_connection(params).close()
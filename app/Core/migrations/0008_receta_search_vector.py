@@ -0,0 +1,51 @@
+# Generated by Django 4.1.13 on 2026-10-18 05:41
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+SEARCH_VECTOR = """
+    setweight(to_tsvector('pg_catalog.spanish', coalesce({0}titulo, '')), 'A') ||
+    setweight(to_tsvector('pg_catalog.spanish', coalesce({0}"desc", '')), 'B')
+"""
+
+TRIGGER_SQL = f"""
+CREATE FUNCTION core_receta_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {SEARCH_VECTOR.format('NEW.')};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_receta_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF titulo, "desc" ON "Core_receta"
+    FOR EACH ROW EXECUTE FUNCTION core_receta_search_vector_update();
+
+UPDATE "Core_receta" SET search_vector = {SEARCH_VECTOR.format('')};
+"""
+
+REVERSE_TRIGGER_SQL = """
+DROP TRIGGER IF EXISTS core_receta_search_vector_trigger ON "Core_receta";
+DROP FUNCTION IF EXISTS core_receta_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0007_receta_imagen'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='receta',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='receta',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='receta_search_gin'),
+        ),
+        migrations.RunSQL(TRIGGER_SQL, REVERSE_TRIGGER_SQL),
+    ]
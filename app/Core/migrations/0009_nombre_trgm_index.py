@@ -0,0 +1,24 @@
+# Generated by Django 4.1.13 on 2026-10-18 05:44
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0008_receta_search_vector'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='ingrediente',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['nombre'], name='ingrediente_nombre_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['nombre'], name='tag_nombre_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
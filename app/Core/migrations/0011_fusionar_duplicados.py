@@ -0,0 +1,89 @@
+# Generated by Django 4.1.13 on 2026-10-18 06:05
+
+from django.db import migrations
+
+
+# Copia fija del SQL de deduplicar_nombres, cambiar el comando no cambia
+# esta migración
+def fusionar_duplicados(apps, schema_editor, lote=1000):
+    """Fusiona los duplicados que queden antes de crear las restricciones
+    de 0012: conserva el id más antiguo de cada (user, nombre), mueve a
+    él las filas de la tabla intermedia y borra el resto. En tablas
+    grandes conviene correr antes deduplicar_nombres, que además
+    invalida el cache de los usuarios afectados"""
+    Receta = apps.get_model('Core', 'Receta')
+    q = schema_editor.connection.ops.quote_name
+    receta = q(Receta._meta.db_table)
+    for relacion in ('tags', 'ingredientes'):
+        field = Receta._meta.get_field(relacion)
+        tabla = q(field.related_model._meta.db_table)
+        through = q(field.remote_field.through._meta.db_table)
+        origen = q(field.m2m_column_name())
+        destino = q(field.m2m_reverse_name())
+        with schema_editor.connection.cursor() as cursor:
+            while True:
+                cursor.execute(
+                    f'''
+                    SELECT MIN(id), array_agg(id) FROM {tabla}
+                    GROUP BY user_id, nombre HAVING COUNT(*) > 1
+                    LIMIT %s
+                    ''',
+                    [lote],
+                )
+                grupos = cursor.fetchall()
+                if not grupos:
+                    break
+
+                duplicados, conservados = [], []
+                for conservar, ids in grupos:
+                    for pk in ids:
+                        if pk != conservar:
+                            duplicados.append(pk)
+                            conservados.append(conservar)
+
+                cursor.execute(
+                    f'''
+                    INSERT INTO {through} ({origen}, {destino})
+                    SELECT t.{origen}, m.conservar FROM {through} t
+                    JOIN unnest(%s::bigint[], %s::bigint[]) m(id, conservar)
+                        ON t.{destino} = m.id
+                    ON CONFLICT DO NOTHING
+                    ''',
+                    [duplicados, conservados],
+                )
+                cursor.execute(
+                    f'DELETE FROM {through} WHERE {destino} = ANY(%s)',
+                    [duplicados],
+                )
+                cursor.execute(
+                    f'''
+                    UPDATE {receta} SET updated_at = now() WHERE id IN (
+                        SELECT {origen} FROM {through}
+                        WHERE {destino} = ANY(%s)
+                    )
+                    ''',
+                    [conservados],
+                )
+                cursor.execute(
+                    f'''
+                    UPDATE {tabla} SET updated_at = now()
+                    WHERE id = ANY(%s)
+                    ''',
+                    [conservados],
+                )
+                cursor.execute(
+                    f'DELETE FROM {tabla} WHERE id = ANY(%s)', [duplicados]
+                )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0010_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            fusionar_duplicados, migrations.RunPython.noop
+        ),
+    ]
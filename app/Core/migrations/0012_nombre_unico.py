@@ -0,0 +1,21 @@
+# Generated by Django 4.1.13 on 2026-10-18 06:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0011_fusionar_duplicados'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='ingrediente',
+            constraint=models.UniqueConstraint(fields=('user', 'nombre'), name='ingrediente_user_nombre_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'nombre'), name='tag_user_nombre_unique'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.13 on 2026-10-18 06:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0012_nombre_unico'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='receta',
+            index=models.Index(fields=['user', '-id'], name='receta_user_id_desc'),
+        ),
+    ]
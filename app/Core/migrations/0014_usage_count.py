@@ -0,0 +1,122 @@
+# Generated by Django 4.1.13 on 2026-10-18 06:46
+
+from django.db import migrations, models
+
+
+# (tabla intermedia, columna, tabla contada) de cada relación
+TABLAS = [
+    ('Core_receta_tags', 'tag_id', 'Core_tag'),
+    ('Core_receta_ingredientes', 'ingrediente_id', 'Core_ingrediente'),
+]
+
+# Un UPDATE por sentencia sobre la tabla intermedia con las filas de
+# sus tablas de transición agrupadas por tag o ingrediente
+TRIGGER_SQL = """
+CREATE FUNCTION {funcion}() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE "{tabla}" a SET usage_count = a.usage_count - d.total
+        FROM (
+            SELECT {columna} id, count(*) total FROM viejas GROUP BY {columna}
+        ) d
+        WHERE a.id = d.id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE "{tabla}" a SET usage_count = a.usage_count + d.total
+        FROM (
+            SELECT {columna} id, count(*) total FROM nuevas GROUP BY {columna}
+        ) d
+        WHERE a.id = d.id;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER {funcion}_insert
+    AFTER INSERT ON "{through}" REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION {funcion}();
+
+CREATE TRIGGER {funcion}_delete
+    AFTER DELETE ON "{through}" REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION {funcion}();
+
+CREATE TRIGGER {funcion}_update
+    AFTER UPDATE ON "{through}"
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION {funcion}();
+"""
+
+REVERSE_TRIGGER_SQL = """
+DROP TRIGGER IF EXISTS {funcion}_insert ON "{through}";
+DROP TRIGGER IF EXISTS {funcion}_delete ON "{through}";
+DROP TRIGGER IF EXISTS {funcion}_update ON "{through}";
+DROP FUNCTION IF EXISTS {funcion}();
+"""
+
+
+def _sql(plantilla):
+    return '\n'.join(
+        plantilla.format(
+            funcion=f'{through.lower()}_usage_count',
+            through=through,
+            columna=columna,
+            tabla=tabla,
+        )
+        for through, columna, tabla in TABLAS
+    )
+
+
+# Copia fija del SQL de recalcular_contadores, cambiar el comando no
+# cambia esta migración
+RECALCULAR_SQL = """
+UPDATE "{tabla}" a SET usage_count = c.total, updated_at = now()
+FROM (
+    SELECT t.id, count(r.{columna}) total FROM "{tabla}" t
+    LEFT JOIN "{through}" r ON r.{columna} = t.id
+    GROUP BY t.id
+) c
+WHERE a.id = c.id AND a.usage_count <> c.total;
+"""
+
+
+def recalcular(apps, schema_editor):
+    """Inicializa los contadores de los datos existentes. Los triggers
+    ya están creados, la tabla intermedia se bloquea mientras cuenta"""
+    with schema_editor.connection.cursor() as cursor:
+        for through, columna, tabla in TABLAS:
+            cursor.execute(f'LOCK TABLE "{through}" IN SHARE MODE')
+            cursor.execute(
+                RECALCULAR_SQL.format(
+                    through=through, columna=columna, tabla=tabla
+                )
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0013_receta_user_id_desc'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingrediente',
+            name='usage_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='usage_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='ingrediente',
+            index=models.Index(fields=['user', '-usage_count', '-nombre'], name='ingrediente_user_usage_count'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', '-usage_count', '-nombre'], name='tag_user_usage_count'),
+        ),
+        migrations.RunSQL(_sql(TRIGGER_SQL), _sql(REVERSE_TRIGGER_SQL)),
+        migrations.RunPython(recalcular, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.13 on 2026-10-18 06:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0014_usage_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='receta',
+            name='imagen_estado',
+            field=models.CharField(blank=True, choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('lista', 'Lista'), ('error', 'Error')], max_length=20),
+        ),
+        migrations.AddField(
+            model_name='receta',
+            name='imagenes',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
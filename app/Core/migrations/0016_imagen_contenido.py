@@ -0,0 +1,111 @@
+# Generated by Django 4.1.13 on 2026-10-18 06:58
+
+import Core.models
+import Core.storage
+from django.db import migrations, models
+
+
+# Las altas se suman con INSERT ... ON CONFLICT y las bajas se restan
+# con UPDATE porque la fila insertada debe cumplir referencias >= 0.
+# En un UPDATE que no cambia imagen el +1 y el -1 se cancelan
+TRIGGER_SQL = """
+CREATE FUNCTION core_receta_imagen_referencias() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO "Core_imagen" (ruta, referencias)
+        SELECT imagen, count(*) FROM nuevas
+        WHERE imagen <> '' GROUP BY imagen
+        ON CONFLICT (ruta) DO UPDATE
+        SET referencias = "Core_imagen".referencias + EXCLUDED.referencias;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE "Core_imagen" i SET referencias = i.referencias - d.total
+        FROM (
+            SELECT imagen, count(*) total FROM viejas
+            WHERE imagen <> '' GROUP BY imagen
+        ) d
+        WHERE i.ruta = d.imagen;
+    ELSE
+        WITH deltas AS (
+            SELECT ruta, sum(delta) delta FROM (
+                SELECT imagen ruta, 1 delta FROM nuevas WHERE imagen <> ''
+                UNION ALL
+                SELECT imagen, -1 FROM viejas WHERE imagen <> ''
+            ) d GROUP BY ruta HAVING sum(delta) <> 0
+        ), bajas AS (
+            UPDATE "Core_imagen" i SET referencias = i.referencias + d.delta
+            FROM deltas d WHERE i.ruta = d.ruta AND d.delta < 0
+        )
+        INSERT INTO "Core_imagen" (ruta, referencias)
+        SELECT ruta, delta FROM deltas WHERE delta > 0
+        ON CONFLICT (ruta) DO UPDATE
+        SET referencias = "Core_imagen".referencias + EXCLUDED.referencias;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_receta_imagen_referencias_insert
+    AFTER INSERT ON "Core_receta" REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION core_receta_imagen_referencias();
+
+CREATE TRIGGER core_receta_imagen_referencias_delete
+    AFTER DELETE ON "Core_receta" REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION core_receta_imagen_referencias();
+
+CREATE TRIGGER core_receta_imagen_referencias_update
+    AFTER UPDATE ON "Core_receta"
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION core_receta_imagen_referencias();
+"""
+
+REVERSE_TRIGGER_SQL = """
+DROP TRIGGER IF EXISTS core_receta_imagen_referencias_insert ON "Core_receta";
+DROP TRIGGER IF EXISTS core_receta_imagen_referencias_delete ON "Core_receta";
+DROP TRIGGER IF EXISTS core_receta_imagen_referencias_update ON "Core_receta";
+DROP FUNCTION IF EXISTS core_receta_imagen_referencias();
+"""
+
+
+# Copia fija del SQL de recalcular_referencias en deduplicar_imagenes,
+# cambiar el comando no cambia esta migración
+RECALCULAR_SQL = """
+LOCK TABLE "Core_receta" IN SHARE MODE;
+
+INSERT INTO "Core_imagen" (ruta, referencias)
+SELECT imagen, count(*) FROM "Core_receta"
+WHERE imagen <> '' GROUP BY imagen
+ON CONFLICT (ruta) DO UPDATE
+SET referencias = EXCLUDED.referencias
+WHERE "Core_imagen".referencias <> EXCLUDED.referencias;
+
+UPDATE "Core_imagen" i SET referencias = 0
+WHERE referencias <> 0 AND NOT EXISTS (
+    SELECT 1 FROM "Core_receta" r WHERE r.imagen = i.ruta
+);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0015_imagen_derivados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Imagen',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ruta', models.CharField(max_length=255, unique=True)),
+                ('referencias', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='receta',
+            name='imagen',
+            field=models.ImageField(null=True, storage=Core.storage.ContenidoStorage(), upload_to=Core.models.receta_imagen_file_path),
+        ),
+        migrations.RunSQL(TRIGGER_SQL, REVERSE_TRIGGER_SQL),
+        # Registra los archivos existentes con sus referencias
+        migrations.RunSQL(RECALCULAR_SQL, migrations.RunSQL.noop),
+    ]
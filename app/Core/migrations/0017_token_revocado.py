@@ -0,0 +1,20 @@
+# Generated by Django 4.1.13 on 2026-10-18 08:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0016_imagen_contenido'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenRevocado',
+            fields=[
+                ('jti', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('expira', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
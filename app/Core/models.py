@@ -5,13 +5,21 @@ import uuid
 import os
 
 from django.conf import settings
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import DEFAULT_DB_ALIAS, connection, models
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin
 )
 
+from Core.storage import ContenidoStorage
+
+
+# Configuración de texto usada por el trigger de search_vector
+SEARCH_CONFIG = 'spanish'
+
 
 def receta_imagen_file_path(instance, filename):
     """Genera la ruta del archivo para la nueva imagen de la receta"""
@@ -46,6 +54,125 @@ class UserManager(BaseUserManager):
         return user
 
 
+class AtributoManager(models.Manager):
+    """Manager para Tags e Ingredientes"""
+
+    def upsert_nombres(self, user, nombres):
+        """Crea los nombres faltantes del usuario con un solo
+        INSERT ... ON CONFLICT y regresa ({nombre: id}, ids creados).
+        Se insertan ordenados para que dos transacciones con los mismos
+        nombres nuevos esperen en el índice único en el mismo orden y no
+        queden en deadlock"""
+        nombres = sorted(set(nombres))
+        if not nombres:
+            return {}, set()
+
+        tabla = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'''
+                WITH nuevos AS (
+                    INSERT INTO {tabla} (user_id, nombre, updated_at,
+                                         usage_count)
+                    SELECT %s, nombre, now(), 0
+                    FROM unnest(%s::text[]) nombre
+                    ORDER BY nombre
+                    ON CONFLICT (user_id, nombre) DO NOTHING
+                    RETURNING id, nombre
+                )
+                SELECT id, nombre, true FROM nuevos
+                UNION ALL
+                SELECT id, nombre, false FROM {tabla}
+                WHERE user_id = %s AND nombre = ANY(%s)
+                ''',
+                [user.pk, nombres, user.pk, nombres],
+            )
+            filas = cursor.fetchall()
+
+        ids = {nombre: pk for pk, nombre, _ in filas}
+        creados = {pk for pk, _, creado in filas if creado}
+        faltantes = [n for n in nombres if n not in ids]
+        if faltantes:
+            # Otra transacción confirmó el nombre después de la foto de
+            # esta sentencia, una nueva lectura ya lo ve
+            ids.update(
+                self.filter(
+                    user=user, nombre__in=faltantes,
+                ).values_list('nombre', 'id')
+            )
+
+        return ids, creados
+
+
+class ImagenManager(models.Manager):
+    """Manager para los archivos de imagen por contenido"""
+
+    def reservar(self, ruta):
+        """Crea la fila del archivo si no existe y la bloquea hasta el
+        fin de la transacción. Se llama antes de escribir el archivo
+        para que una purga concurrente no lo borre después"""
+        tabla = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'''
+                INSERT INTO {tabla} (ruta, referencias) VALUES (%s, 0)
+                ON CONFLICT (ruta) DO UPDATE SET ruta = EXCLUDED.ruta
+                ''',
+                [ruta],
+            )
+
+
+class Imagen(models.Model):
+    """Archivo de imagen guardado una sola vez por contenido"""
+    ruta = models.CharField(max_length=255, unique=True)
+    # Recetas que usan el archivo, mantenido por un trigger de Postgres
+    # sobre Receta.imagen. En 0 el archivo se puede purgar
+    referencias = models.PositiveIntegerField(default=0)
+
+    objects = ImagenManager()
+
+    def __str__(self):
+        return self.ruta
+
+
+class TokenRevocadoManager(models.Manager):
+    """Manager para los tokens firmados revocados"""
+
+    def revocar(self, jti, expira):
+        """Registra el token y regresa False si ya estaba registrado. Es
+        un solo INSERT ... ON CONFLICT, de dos peticiones con el mismo
+        token solo una lo registra. De paso borra los ya expirados"""
+        tabla = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'''
+                WITH expirados AS (
+                    DELETE FROM {tabla} WHERE expira < now()
+                )
+                INSERT INTO {tabla} (jti, expira) VALUES (%s, %s)
+                ON CONFLICT (jti) DO NOTHING RETURNING jti
+                ''',
+                [jti, expira],
+            )
+            return cursor.fetchone() is not None
+
+    def revocado(self, jti):
+        """Busca el token en default, una réplica puede no tenerlo aún"""
+        return self.using(DEFAULT_DB_ALIAS).filter(jti=jti).exists()
+
+
+class TokenRevocado(models.Model):
+    """Token de renovación revocado o ya usado, hasta la hora en que
+    habría expirado"""
+    jti = models.CharField(max_length=32, primary_key=True)
+    expira = models.DateTimeField(db_index=True)
+
+    objects = TokenRevocadoManager()
+
+    def __str__(self):
+        return self.jti
+
+
 class User(AbstractBaseUser, PermissionsMixin):
     """User que utilizará el proyecto"""
     correo = models.EmailField(max_length=255, unique=True)
@@ -60,6 +187,14 @@ class User(AbstractBaseUser, PermissionsMixin):
 
 class Receta(models.Model):
     """Objeto Receta"""
+
+    class EstadoImagen(models.TextChoices):
+        """Avance de la generación de derivados de la imagen"""
+        PENDIENTE = 'pendiente'
+        PROCESANDO = 'procesando'
+        LISTA = 'lista'
+        ERROR = 'error'
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -71,7 +206,27 @@ class Receta(models.Model):
     link = models.CharField(max_length=255, blank=True)
     tags = models.ManyToManyField('Tag')
     ingredientes = models.ManyToManyField('Ingrediente')
-    imagen = models.ImageField(null=True, upload_to=receta_imagen_file_path)
+    imagen = models.ImageField(
+        null=True,
+        upload_to=receta_imagen_file_path,
+        storage=ContenidoStorage(),
+    )
+    # Miniaturas y derivados WebP/JPEG, {tamaño: {formato: ruta}},
+    # generados por receta.imagenes fuera de la petición
+    imagen_estado = models.CharField(
+        max_length=20, choices=EstadoImagen.choices, blank=True,
+    )
+    imagenes = models.JSONField(default=dict, blank=True, editable=False)
+    # Mantenido por un trigger de Postgres a partir de titulo y desc
+    search_vector = SearchVectorField(null=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Listado por usuario en orden -id de RecetaViewSet
+            models.Index(fields=['user', '-id'], name='receta_user_id_desc'),
+            GinIndex(fields=['search_vector'], name='receta_search_gin'),
+        ]
 
     def __str__(self):
         return self.titulo
@@ -84,6 +239,31 @@ class Tag(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    updated_at = models.DateTimeField(auto_now=True)
+    # Recetas que lo usan, mantenido por triggers de Postgres sobre la
+    # tabla intermedia y reparable con recalcular_contadores
+    usage_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = AtributoManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'nombre'], name='tag_user_nombre_unique',
+            ),
+        ]
+        indexes = [
+            GinIndex(
+                fields=['nombre'],
+                opclasses=['gin_trgm_ops'],
+                name='tag_nombre_trgm',
+            ),
+            # Listado por popularidad, ?orden=usage_count
+            models.Index(
+                fields=['user', '-usage_count', '-nombre'],
+                name='tag_user_usage_count',
+            ),
+        ]
 
     def __str__(self):
         return self.nombre
@@ -96,6 +276,31 @@ class Ingrediente(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    updated_at = models.DateTimeField(auto_now=True)
+    # Recetas que lo usan, mantenido por triggers de Postgres sobre la
+    # tabla intermedia y reparable con recalcular_contadores
+    usage_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = AtributoManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'nombre'],
+                name='ingrediente_user_nombre_unique',
+            ),
+        ]
+        indexes = [
+            GinIndex(
+                fields=['nombre'],
+                opclasses=['gin_trgm_ops'],
+                name='ingrediente_nombre_trgm',
+            ),
+            models.Index(
+                fields=['user', '-usage_count', '-nombre'],
+                name='ingrediente_user_usage_count',
+            ),
+        ]
 
     def __str__(self):
         return self.nombre
@@ -0,0 +1,31 @@
+"""
+Renderers para el API
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer que usa orjson cuando está instalado.
+    Regresa a la implementación de DRF si se pide indentación
+    o salida ASCII"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Renderiza data a JSON compacto en UTF-8"""
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if (orjson is None or data is None or indent is not None
+                or self.ensure_ascii or not self.compact):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(data, default=self.encoder_class().default)
+
+        # Igual que DRF, se escapan U+2028 y U+2029
+        return ret.replace(
+            b'\xe2\x80\xa8', b'\\u2028'
+        ).replace(
+            b'\xe2\x80\xa9', b'\\u2029'
+        )
@@ -0,0 +1,90 @@
+"""
+Enrutamiento de lecturas a réplicas de Postgres
+
+Las vistas con ReplicaReadMixin atienden sus GET desde una de las
+réplicas de DB_REPLICA_ALIASES, las escrituras siempre van a default.
+Cada escritura de un usuario lo marca por REPLICA_PRIMARIA_TIMEOUT
+segundos en REPLICA_CACHE_ALIAS, un cache que no desaloja entradas, y
+mientras tanto sus lecturas también van a default, así ve de inmediato
+lo que acaba de crear o modificar aunque la réplica tenga retraso.
+"""
+import contextvars
+import random
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+from rest_framework.permissions import SAFE_METHODS
+
+
+# Base de datos para las lecturas de la petición actual, None es default.
+# Un ContextVar llega también a los hilos de lectura de ASGI
+base_lectura = contextvars.ContextVar('base_lectura', default=None)
+
+
+def get_cache():
+    """Cache sin desalojo de las marcas de escritura"""
+    return caches[settings.REPLICA_CACHE_ALIAS]
+
+
+def _primaria_key(user_id):
+    return f'db:primaria:{user_id}'
+
+
+def marcar_escritura(user_id):
+    """Las lecturas del usuario van a la primaria durante
+    REPLICA_PRIMARIA_TIMEOUT segundos"""
+    if settings.DB_REPLICA_ALIASES:
+        get_cache().set(
+            _primaria_key(user_id), True, settings.REPLICA_PRIMARIA_TIMEOUT
+        )
+
+
+def elegir_replica(user_id):
+    """Réplica para las lecturas del usuario, None si no hay réplicas o
+    escribió hace poco"""
+    aliases = settings.DB_REPLICA_ALIASES
+    if not aliases or get_cache().get(_primaria_key(user_id)):
+        return None
+
+    return random.choice(aliases)
+
+
+class ReplicaRouter:
+    """Lee de la base elegida para la petición y escribe en default"""
+
+    def db_for_read(self, model, **hints):
+        return base_lectura.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """Las réplicas tienen los mismos datos que default"""
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """Las réplicas reciben el esquema por replicación"""
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaReadMixin:
+    """Atiende los métodos seguros de la vista desde una réplica. La
+    autenticación ocurre antes en default, un token recién creado todavía
+    puede no estar en la réplica"""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            self._base_lectura = base_lectura.set(
+                elegir_replica(request.user.pk)
+            )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_base_lectura', None)
+        if token is not None:
+            base_lectura.reset(token)
+            self._base_lectura = None
+
+        return super().finalize_response(request, response, *args, **kwargs)
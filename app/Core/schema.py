@@ -0,0 +1,17 @@
+"""
+Extensiones de drf-spectacular para el esquema del API
+"""
+from drf_spectacular.extensions import OpenApiAuthenticationExtension
+
+
+class SignedTokenScheme(OpenApiAuthenticationExtension):
+    """Documenta SignedTokenAuthentication como Authorization: Bearer"""
+    target_class = 'Core.authentication.SignedTokenAuthentication'
+    name = 'tokenFirmado'
+
+    def get_security_definition(self, auto_schema):
+        return {
+            'type': 'http',
+            'scheme': 'bearer',
+            'description': 'Token firmado de /api/user/token/firmado/',
+        }
@@ -0,0 +1,24 @@
+"""
+Señales que invalidan el cache de autenticación por token
+"""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from Core.authentication import invalidar_usuario
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidar_por_usuario(sender, instance, **kwargs):
+    """Cualquier cambio del usuario, incluidas la desactivación y la
+    contraseña de UserSerializer.update, descarta su versión cacheada"""
+    invalidar_usuario(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def invalidar_por_token(sender, instance, **kwargs):
+    """Un token borrado deja de autenticar de inmediato"""
+    invalidar_usuario(instance.user_id)
@@ -0,0 +1,62 @@
+"""
+Almacenamiento por contenido para las imágenes de recetas
+"""
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+# Bytes leídos por iteración al calcular el hash de un archivo
+TAMANO_BLOQUE = 1024 * 1024
+
+
+def hash_archivo(archivo):
+    """Calcula el sha256 de un archivo leyéndolo por bloques"""
+    digest = hashlib.sha256()
+    archivo.seek(0)
+    for bloque in iter(lambda: archivo.read(TAMANO_BLOQUE), b''):
+        digest.update(bloque)
+    archivo.seek(0)
+
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContenidoStorage(FileSystemStorage):
+    """Guarda cada archivo una sola vez bajo el sha256 de su contenido.
+    Del nombre pedido solo se conservan el directorio y la extensión"""
+
+    def ruta_contenido(self, name, content):
+        """Regresa <directorio>/<hash[:2]>/<hash><ext> para el contenido.
+        Usa el hash calculado al recibir la carga si existe"""
+        digest = getattr(content, 'sha256', None)
+        if digest is None:
+            digest = hash_archivo(content)
+            content.sha256 = digest
+        extension = os.path.splitext(name)[1].lower()
+
+        return os.path.join(
+            os.path.dirname(name), digest[:2], f'{digest}{extension}'
+        )
+
+    def save(self, name, content, max_length=None):
+        return super().save(
+            self.ruta_contenido(name, content), content, max_length
+        )
+
+    def get_available_name(self, name, max_length=None):
+        """El nombre depende solo del contenido, no se renombra"""
+        return name
+
+    def _save(self, name, content):
+        """Escribe en un nombre temporal y lo mueve al definitivo, una
+        escritura concurrente del mismo contenido deja el mismo archivo"""
+        if self.exists(name):
+            return name
+        temporal = super()._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(temporal), self.path(name))
+
+        return name
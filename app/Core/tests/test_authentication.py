@@ -0,0 +1,174 @@
+"""
+Pruebas de la autenticación por token con cache
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from Core import tokens
+from Core.authentication import (
+    CachedTokenAuthentication,
+    LRUCache,
+    tokens_locales,
+)
+
+
+ME_URL = reverse('user:me')
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Pruebas del cache de token a usuario y su invalidación"""
+
+    def setUp(self):
+        tokens_locales.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass123', nombre='Nombre'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def _autenticar(self):
+        return CachedTokenAuthentication().authenticate_credentials(
+            self.token.key
+        )
+
+    def test_token_cacheado_sin_consultas(self):
+        """Prueba que la segunda autenticación no consulte authtoken y
+        que el cache solo guarde pk, is_active y huella"""
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            user, _ = self._autenticar()
+
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertTrue(user.is_active)
+        self.assertIn('password', user.get_deferred_fields())
+        (resumen, _), _ = next(iter(tokens_locales._datos.values()))
+        self.assertEqual(
+            resumen, (self.user.pk, True, tokens.huella(self.user))
+        )
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['correo'], self.user.correo)
+
+    def test_cache_compartido_entre_procesos(self):
+        """Prueba que otro proceso, sin LRU propio, use la entrada del
+        cache compartido"""
+        self.client.get(ME_URL)
+        tokens_locales.clear()
+
+        with self.assertNumQueries(0):
+            user, _ = self._autenticar()
+
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_token_eliminado(self):
+        """Prueba que un token borrado deje de autenticar de inmediato"""
+        self.client.get(ME_URL)
+
+        self.token.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_usuario_desactivado(self):
+        """Prueba que desactivar al usuario invalide su entrada"""
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cambio_durante_la_carga(self):
+        """Prueba que un cambio confirmado mientras se carga el usuario
+        no quede cacheado como vigente"""
+        cargar = TokenAuthentication.authenticate_credentials
+
+        def cargar_y_desactivar(auth, key):
+            resultado = cargar(auth, key)
+            self.user.is_active = False
+            self.user.save()
+            return resultado
+
+        with patch.object(
+            TokenAuthentication, 'authenticate_credentials',
+            cargar_y_desactivar,
+        ):
+            self._autenticar()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_invalidacion_en_otro_proceso(self):
+        """Prueba que la versión del cache compartido invalide la entrada
+        del LRU de un proceso que no recibió la señal"""
+        self.client.get(ME_URL)
+        entrada = tokens_locales._datos.copy()
+
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            is_active=False
+        )
+        self.user.save(update_fields=['nombre'])
+        tokens_locales._datos.update(entrada)
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cambio_de_password(self):
+        """Prueba que UserSerializer.update invalide el usuario cacheado"""
+        self.client.get(ME_URL)
+
+        res = self.client.patch(
+            ME_URL, {'nombre': 'Nuevo', 'password': 'nuevapass123'}
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['nombre'], 'Nuevo')
+        self.assertEqual(len(tokens_locales._datos), 1)
+        (resumen, _), _ = next(iter(tokens_locales._datos.values()))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('nuevapass123'))
+        self.assertEqual(resumen[2], tokens.huella(self.user))
+
+    @override_settings(TOKEN_CACHE_ALIAS=None)
+    def test_solo_cache_del_proceso(self):
+        """Prueba que sin cache compartido se use y se invalide el LRU
+        del proceso"""
+        self.client.get(ME_URL)
+        cache.clear()
+        self.assertEqual(len(tokens_locales._datos), 1)
+
+        with self.assertNumQueries(0):
+            self._autenticar()
+        self.token.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(TOKEN_CACHE_SIZE=2)
+    def test_lru_desaloja_y_expira(self):
+        """Prueba que el LRU desaloje la entrada menos usada y descarte
+        las expiradas"""
+        lru = LRUCache()
+        lru.set('a', 1, 60)
+        lru.set('b', 2, 60)
+        lru.get('a')
+        lru.set('c', 3, 60)
+
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('c'), 3)
+        lru.set('d', 4, -1)
+        self.assertIsNone(lru.get('d'))
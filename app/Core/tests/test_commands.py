@@ -1,34 +1,164 @@
 """
 Prueba de comandos decarpeta management
 """
+from io import StringIO
 from unittest.mock import patch
 
 from psycopg2 import OperationalError as Psycopg2Error
 
-from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase
 
+from Core.management.commands.wait_for_db import Command
+from Core.models import Receta, Tag, Ingrediente
 
-@patch('Core.management.commands.wait_for_db.Command.check')
+
+@patch('Core.management.commands.wait_for_db.Command.probar')
 class CommandTests(SimpleTestCase):
     """Prueba de comandos"""
 
-    def test_wait_for_db_ready(self, patched_check):
+    def test_wait_for_db_ready(self, patched_probar):
         """Test espera por base de datos si esta está lista"""
-        patched_check.return_value = True
+        salida = StringIO()
 
-        call_command('wait_for_db')
+        call_command('wait_for_db', database=['default'], stdout=salida)
 
-        patched_check.assert_called_once_with(databases=['default'])
+        patched_probar.assert_called_once()
+        self.assertEqual(patched_probar.call_args.args[0], 'default')
+        self.assertIn('default: lista en', salida.getvalue())
+        self.assertIn('Base de Datos Disponible!!', salida.getvalue())
 
     @patch('time.sleep')
-    def test_wait_for_db_delay(self, patched_sleep, patched_check):
+    def test_wait_for_db_delay(self, patched_sleep, patched_probar):
         """Test espera por base de datos Cuando regresa OperationalError"""
-        patched_check.side_effect = [Psycopg2Error] * 2 + \
-            [OperationalError] * 3 + [True]
+        patched_probar.side_effect = [Psycopg2Error] * 2 + \
+            [OperationalError] * 3 + [None]
+
+        call_command('wait_for_db', database=['default'], stdout=StringIO())
+
+        self.assertEqual(patched_probar.call_count, 6)
+        self.assertEqual(patched_sleep.call_count, 5)
+
+    @patch('time.sleep')
+    def test_wait_for_db_backoff(self, patched_sleep, patched_probar):
+        """Prueba que las esperas crezcan exponencialmente hasta el tope"""
+        patched_probar.side_effect = [OperationalError] * 6 + [None]
+
+        with patch('random.uniform', side_effect=lambda a, b: b):
+            call_command(
+                'wait_for_db', database=['default'], espera_inicial=0.5,
+                espera_maxima=4, stdout=StringIO(),
+            )
+
+        esperas = [c.args[0] for c in patched_sleep.call_args_list]
+        self.assertEqual(esperas, [0.5, 1, 2, 4, 4, 4])
+
+    def test_wait_for_db_timeout(self, patched_probar):
+        """Prueba que el comando falle al agotar el tiempo"""
+        patched_probar.side_effect = OperationalError
+
+        with self.assertRaises(CommandError):
+            call_command(
+                'wait_for_db', database=['default'], timeout=0,
+                stdout=StringIO(),
+            )
+
+    def test_wait_for_db_todas(self, patched_probar):
+        """Prueba que sin --database se esperen todos los alias"""
+        call_command('wait_for_db', stdout=StringIO())
+
+        self.assertEqual(
+            sorted(c.args[0] for c in patched_probar.call_args_list),
+            sorted(connections),
+        )
+
+
+class ProbarConexionTests(SimpleTestCase):
+    """Prueba la conexión directa contra la base de pruebas"""
+    databases = {'default'}
+
+    def test_probar(self):
+        """Prueba que la conexión del driver se abra y se cierre"""
+        Command().probar('default', 10)
+
+
+class DeduplicarNombresTests(TestCase):
+    """Prueba del comando deduplicar_nombres"""
+
+    def setUp(self):
+        # Las filas repetidas solo existen en bases anteriores a la
+        # restricción, se quita dentro de la transacción de la prueba
+        with connection.cursor() as cursor:
+            for model in (Tag, Ingrediente):
+                tabla = model._meta.db_table
+                cursor.execute(
+                    f'ALTER TABLE "{tabla}" DROP CONSTRAINT '
+                    f'{model._meta.model_name}_user_nombre_unique'
+                )
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass123'
+        )
+
+    def test_deduplicar_nombres(self):
+        """Prueba fusionar duplicados conservando las relaciones"""
+        cena, cena_2, cena_3 = Tag.objects.bulk_create([
+            Tag(user=self.user, nombre='Cena') for _ in range(3)
+        ])
+        postre = Tag.objects.create(user=self.user, nombre='Postre')
+        ajo, ajo_2 = Ingrediente.objects.bulk_create([
+            Ingrediente(user=self.user, nombre='Ajo') for _ in range(2)
+        ])
+        r1 = Receta.objects.create(
+            user=self.user, titulo='R1', tiempo_minutos=5, precio='1.00'
+        )
+        r2 = Receta.objects.create(
+            user=self.user, titulo='R2', tiempo_minutos=5, precio='1.00'
+        )
+        r1.tags.add(cena, cena_2, postre)
+        r2.tags.add(cena_3)
+        r2.ingredientes.add(ajo_2)
+
+        call_command('deduplicar_nombres', lote=1, stdout=StringIO())
+
+        self.assertEqual(
+            list(Tag.objects.order_by('id')), [cena, postre]
+        )
+        self.assertEqual(list(Ingrediente.objects.all()), [ajo])
+        self.assertEqual(set(r1.tags.all()), {cena, postre})
+        self.assertEqual(list(r2.tags.all()), [cena])
+        self.assertEqual(list(r2.ingredientes.all()), [ajo])
+
+
+class RecalcularContadoresTests(TestCase):
+    """Prueba del comando recalcular_contadores"""
+
+    def test_recalcular_contadores(self):
+        """Prueba que el comando corrija los contadores desviados"""
+        user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass123'
+        )
+        cena = Tag.objects.create(user=user, nombre='Cena')
+        postre = Tag.objects.create(user=user, nombre='Postre')
+        ajo = Ingrediente.objects.create(user=user, nombre='Ajo')
+        receta = Receta.objects.create(
+            user=user, titulo='R1', tiempo_minutos=5, precio='1.00'
+        )
+        receta.tags.add(cena)
+        receta.ingredientes.add(ajo)
+        Tag.objects.update(usage_count=7)
+        Ingrediente.objects.update(usage_count=0)
 
-        call_command('wait_for_db')
+        salida = StringIO()
+        call_command('recalcular_contadores', stdout=salida)
 
-        self.assertEqual(patched_check.call_count, 6)
-        patched_check.assert_called_with(databases=['default'])
+        cena.refresh_from_db()
+        postre.refresh_from_db()
+        ajo.refresh_from_db()
+        self.assertEqual(cena.usage_count, 1)
+        self.assertEqual(postre.usage_count, 0)
+        self.assertEqual(ajo.usage_count, 1)
+        self.assertIn('tags: 2 contadores corregidos', salida.getvalue())
+        self.assertIn('ingredientes: 1 contadores', salida.getvalue())
@@ -1,14 +1,27 @@
 """
 Prueba para chequear el estado de salud del API
 """
+import shutil
+import tempfile
+import threading
+from unittest.mock import call, patch
 
-from django.test import TestCase
+from psycopg2 import OperationalError as Psycopg2Error
+
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, connections
 from django.urls import reverse
 
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from Core import health
+
+
+READINESS_URL = reverse('readiness')
+
 
 class HealthCheckTest(TestCase):
     """Prueba el chequeo de salud del API"""
@@ -17,6 +30,137 @@ class HealthCheckTest(TestCase):
         """Prueba chequeo de salid del API"""
         client = APIClient()
         url = reverse('health-check')
-        res = client.get(url)
+        with CaptureQueriesContext(connection) as consultas:
+            res = client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), {'healthy': True})
+        self.assertEqual(len(consultas), 0)
+
+
+class ReadinessTest(TestCase):
+    """Prueba la sonda de readiness"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        health.limpiar()
+        self.addCleanup(health.limpiar)
+        self.client = APIClient()
+
+    def test_readiness(self):
+        """Prueba que reporte cada dependencia con su latencia"""
+        res = self.client.get(READINESS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        datos = res.json()
+        self.assertTrue(datos['ready'])
+        for nombre in ['database', 'cache', 'media']:
+            self.assertTrue(datos['checks'][nombre]['ok'])
+            self.assertGreaterEqual(datos['checks'][nombre]['ms'], 0)
+        self.assertIn('no-cache', res['Cache-Control'])
+
+    def test_reutiliza_resultado(self):
+        """Prueba que dentro del TTL no se vuelva a comprobar"""
+        with patch.object(
+            health, 'comprobar', wraps=health.comprobar
+        ) as comprobar:
+            self.client.get(READINESS_URL)
+            self.client.get(READINESS_URL)
+
+        self.assertEqual(comprobar.call_count, 1)
+
+    @override_settings(READINESS_TTL=0)
+    def test_media_no_escribible(self):
+        """Prueba que un volumen sin escritura responda 503"""
+        with override_settings(MEDIA_ROOT=f'{self.media_root}/no-existe'):
+            res = self.client.get(READINESS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        datos = res.json()
+        self.assertFalse(datos['ready'])
+        self.assertEqual(datos['checks']['media'], {
+            'ok': False, 'error': 'FileNotFoundError'
+        })
+        self.assertTrue(datos['checks']['database']['ok'])
+
+    @override_settings(READINESS_TTL=0, READINESS_TIMEOUT=0.05)
+    def test_timeout(self):
+        """Prueba que una dependencia colgada cuente como caída sin
+        retener la respuesta"""
+        liberar = threading.Event()
+        self.addCleanup(liberar.set)
+        colgada = dict(health.COMPROBACIONES, cache=lambda: liberar.wait(5))
+
+        with patch.dict(health.COMPROBACIONES, colgada):
+            res = self.client.get(READINESS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(
+            res.json()['checks']['cache'], {'ok': False, 'error': 'timeout'}
+        )
+
+    @override_settings(READINESS_TIMEOUT=0.5)
+    def test_no_reenvia_comprobacion_colgada(self):
+        """Prueba que una comprobación que sigue en curso no se envíe de
+        nuevo al pool en la siguiente sonda"""
+        liberar = threading.Event()
+        self.addCleanup(liberar.set)
+        llamadas = []
+
+        def colgada():
+            llamadas.append(1)
+            liberar.wait(5)
+
+        with patch.dict(health.COMPROBACIONES, cache=colgada):
+            health.comprobar()
+            listo, detalle = health.comprobar()
+
+        self.assertFalse(listo)
+        self.assertEqual(detalle['cache'], {'ok': False, 'error': 'timeout'})
+        self.assertTrue(detalle['database']['ok'])
+        self.assertEqual(len(llamadas), 1)
+
+    @override_settings(READINESS_TIMEOUT=0.5)
+    def test_db_con_limites(self):
+        """Prueba que la conexión de la comprobación lleve connect_timeout
+        y su transacción statement_timeout"""
+        wrapper = connections['default']
+        with patch.object(
+            type(wrapper), 'get_new_connection', autospec=True,
+        ) as nueva:
+            health.comprobar_db()
+
+        params = nueva.call_args.args[1]
+        self.assertEqual(params['connect_timeout'], 2)
+        conexion = nueva.return_value
+        cursor = conexion.cursor.return_value.__enter__.return_value
+        self.assertEqual(cursor.execute.call_args_list, [
+            call('SET LOCAL statement_timeout = %s', [500]),
+            call('SELECT 1'),
+        ])
+        conexion.close.assert_called_once()
+
+    @override_settings(DB_PGBOUNCER=True, READINESS_TTL=0)
+    def test_db_con_pgbouncer(self):
+        """Prueba que la comprobación funcione detrás de PgBouncer, que
+        rechaza options como parámetro de arranque"""
+        wrapper = connections['default']
+        get_new_connection = type(wrapper).get_new_connection
+
+        def pgbouncer(wrapper, params):
+            if 'options' in params:
+                raise Psycopg2Error('unsupported startup parameter: options')
+            return get_new_connection(wrapper, params)
+
+        with patch.object(
+            type(wrapper), 'get_new_connection', autospec=True,
+            side_effect=pgbouncer,
+        ):
+            res = self.client.get(READINESS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.json()['checks']['database']['ok'])
@@ -0,0 +1,115 @@
+"""
+Pruebas de la entrega de imágenes de MEDIA_URL
+"""
+from decimal import Decimal
+from io import BytesIO
+import shutil
+import tempfile
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from Core.models import Receta
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def media_url(ruta):
+    """URL pública de un archivo de MEDIA_ROOT"""
+    return reverse('media', args=[ruta])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, IMAGEN_WORKERS=0)
+class MediaTests(TestCase):
+    """Pruebas de la autorización y entrega de imágenes"""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass123'
+        )
+        self.receta = Receta.objects.create(
+            user=user,
+            titulo='Receta',
+            tiempo_minutos=10,
+            precio=Decimal('5.00'),
+        )
+        buffer = BytesIO()
+        Image.new('RGB', (64, 64), 'red').save(buffer, 'JPEG')
+        client = APIClient()
+        client.force_authenticate(user)
+        url = reverse('receta:receta-upload-image', args=[self.receta.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post(url, {
+                'imagen': SimpleUploadedFile('foto.jpg', buffer.getvalue())
+            })
+        self.receta.refresh_from_db()
+        self.client = APIClient()
+
+    @override_settings(MEDIA_ACCEL_REDIRECT=True)
+    def test_accel_redirect_original_y_derivado(self):
+        """Prueba que Django autorice la imagen y delegue el envío a
+        nginx sin incluir el archivo en la respuesta"""
+        rutas = [
+            self.receta.imagen.name,
+            self.receta.imagenes['miniatura']['webp'],
+        ]
+        for ruta in rutas:
+            with self.subTest(ruta=ruta):
+                with self.assertNumQueries(1):
+                    res = self.client.get(media_url(ruta))
+
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                self.assertEqual(
+                    res['X-Accel-Redirect'], f'/media-interno/{ruta}'
+                )
+                self.assertEqual(res.content, b'')
+        self.assertEqual(res['Content-Type'], 'image/webp')
+
+    @override_settings(MEDIA_ACCEL_REDIRECT=True)
+    def test_rutas_no_publicadas(self):
+        """Prueba que no se autoricen archivos sin recetas ni rutas fuera
+        de las imágenes"""
+        ruta = self.receta.imagen.name
+        with self.captureOnCommitCallbacks(execute=True):
+            self.receta.delete()
+
+        rutas = [ruta, 'cache/sesion', 'uploads/receta/../../secreto']
+        for ruta in rutas:
+            with self.subTest(ruta=ruta):
+                res = self.client.get(media_url(ruta))
+
+                self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+                self.assertNotIn('X-Accel-Redirect', res)
+
+    def test_sin_accel_redirect_entrega_django(self):
+        """Prueba que sin nginx Django envíe el archivo con caché
+        inmutable"""
+        res = self.client.get(media_url(self.receta.imagen.name))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('X-Accel-Redirect', res)
+        self.assertIn('immutable', res['Cache-Control'])
+        self.assertIn('max-age=31536000', res['Cache-Control'])
+        with self.receta.imagen.open('rb') as archivo:
+            self.assertEqual(b''.join(res.streaming_content), archivo.read())
+
+    def test_solo_lectura(self):
+        """Prueba que la ruta de imágenes solo acepte GET y HEAD"""
+        res = self.client.post(media_url(self.receta.imagen.name))
+
+        self.assertEqual(
+            res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED
+        )
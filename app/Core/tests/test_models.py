@@ -94,6 +94,56 @@ class ModelTests(TestCase):
 
         self.assertEqual(str(ingrediente), ingrediente.nombre)
 
+    def test_upsert_nombres(self):
+        """Prueba que upsert_nombres cree solo los nombres faltantes"""
+        user = crear_usuario()
+        otro = crear_usuario('otro@example.com')
+        cena = models.Tag.objects.create(user=user, nombre='Cena')
+        models.Tag.objects.create(user=otro, nombre='Postre')
+
+        ids, creados = models.Tag.objects.upsert_nombres(
+            user, ['Cena', 'Postre', 'Postre']
+        )
+
+        postre = models.Tag.objects.get(user=user, nombre='Postre')
+        self.assertEqual(ids, {'Cena': cena.id, 'Postre': postre.id})
+        self.assertEqual(creados, {postre.id})
+        self.assertEqual(models.Tag.objects.filter(user=user).count(), 2)
+
+    def test_usage_count_sigue_la_tabla_intermedia(self):
+        """Prueba que usage_count cambie con add, set, clear y con las
+        eliminaciones en cascada"""
+        user = crear_usuario()
+        cena, postre = models.Tag.objects.bulk_create([
+            models.Tag(user=user, nombre='Cena'),
+            models.Tag(user=user, nombre='Postre'),
+        ])
+        r1, r2 = [
+            models.Receta.objects.create(
+                user=user, titulo=titulo, tiempo_minutos=5,
+                precio=Decimal('1.00'),
+            )
+            for titulo in ('R1', 'R2')
+        ]
+
+        def contadores():
+            return dict(
+                models.Tag.objects.values_list('nombre', 'usage_count')
+            )
+
+        r1.tags.add(cena, postre)
+        r2.tags.add(cena)
+        self.assertEqual(contadores(), {'Cena': 2, 'Postre': 1})
+
+        r1.tags.set([postre])
+        self.assertEqual(contadores(), {'Cena': 1, 'Postre': 1})
+
+        r2.delete()
+        self.assertEqual(contadores(), {'Cena': 0, 'Postre': 1})
+
+        r1.tags.clear()
+        self.assertEqual(contadores(), {'Cena': 0, 'Postre': 0})
+
     @patch('Core.models.uuid.uuid4')
     def test_receta_nombre_archivo_uuid(self, mock_uuid):
         """Prueba la generación de la ruta de la imagen"""
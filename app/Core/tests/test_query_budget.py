@@ -0,0 +1,323 @@
+"""
+Pruebas de presupuesto de consultas para las rutas del API
+"""
+from decimal import Decimal
+import tempfile
+
+from PIL import Image
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from Core.models import Receta, Tag, Ingrediente
+from receta.urls import router
+from User.urls import urlpatterns as user_urlpatterns
+
+
+# Número máximo de consultas por (ruta, método). Incluye las dos consultas
+# de TokenAuthentication con el cache vacío en las rutas autenticadas: el
+# usuario del token, para leer su versión antes de cargarlo, y el token
+# con su usuario.
+PRESUPUESTOS = {
+    ('receta:api-root', 'get'): 0,
+    ('receta:receta-list', 'get'): 6,
+    ('receta:receta-list', 'post'): 14,
+    ('receta:receta-detail', 'get'): 6,
+    ('receta:receta-detail', 'put'): 17,
+    ('receta:receta-detail', 'patch'): 8,
+    ('receta:receta-detail', 'delete'): 8,
+    ('receta:receta-upload-image', 'post'): 7,
+    ('receta:tag-list', 'get'): 4,
+    ('receta:tag-autocompletar', 'get'): 2,
+    ('receta:tag-detail', 'patch'): 5,
+    ('receta:tag-detail', 'delete'): 5,
+    ('receta:ingrediente-list', 'get'): 4,
+    ('receta:ingrediente-autocompletar', 'get'): 2,
+    ('receta:ingrediente-detail', 'patch'): 5,
+    ('receta:ingrediente-detail', 'delete'): 5,
+    ('user:create', 'post'): 2,
+    ('user:token', 'post'): 5,
+    ('user:token-firmado', 'post'): 1,
+    ('user:token-renovar', 'post'): 3,
+    ('user:token-revocar', 'post'): 0,
+    ('user:me', 'get'): 2,
+    ('user:me', 'patch'): 3,
+}
+
+
+def sembrar_usuario(correo, recetas, relacionados):
+    """Crea un usuario con recetas, tags e ingredientes asignados"""
+    user = get_user_model().objects.create_user(correo, 'testpass123')
+    tags = Tag.objects.bulk_create([
+        Tag(user=user, nombre=f'Tag {i}') for i in range(relacionados)
+    ])
+    ingredientes = Ingrediente.objects.bulk_create([
+        Ingrediente(user=user, nombre=f'Ingrediente {i}')
+        for i in range(relacionados)
+    ])
+    objs = Receta.objects.bulk_create([
+        Receta(
+            user=user,
+            titulo=f'Receta {i}',
+            tiempo_minutos=10,
+            precio=Decimal('5.00'),
+            desc='Descripción',
+        )
+        for i in range(recetas)
+    ])
+    Receta.tags.through.objects.bulk_create([
+        Receta.tags.through(receta_id=r.id, tag_id=t.id)
+        for r in objs for t in tags
+    ])
+    Receta.ingredientes.through.objects.bulk_create([
+        Receta.ingredientes.through(receta_id=r.id, ingrediente_id=i.id)
+        for r in objs for i in ingredientes
+    ])
+
+    return user
+
+
+class QueryBudgetTests(TestCase):
+    """Prueba que cada ruta ejecute un número fijo de consultas"""
+
+    def setUp(self):
+        self.usuarios = [
+            sembrar_usuario('chico@example.com', recetas=1, relacionados=1),
+            sembrar_usuario('grande@example.com', recetas=60, relacionados=15),
+        ]
+
+    def _cliente(self, user):
+        """Crea un cliente autenticado con token real"""
+        token, _ = Token.objects.get_or_create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def _assert_presupuesto(self, nombre, metodo, peticion):
+        """Ejecuta la petición para cada usuario sembrado y
+        compara el número de consultas con el presupuesto"""
+        presupuesto = PRESUPUESTOS[(nombre, metodo)]
+        for user in self.usuarios:
+            client = self._cliente(user)
+            with self.subTest(ruta=nombre, metodo=metodo, user=user.correo):
+                with CaptureQueriesContext(connection) as consultas:
+                    res = peticion(client, user)
+                self.assertLessEqual(len(consultas), presupuesto)
+                self.assertLess(res.status_code, 400)
+
+    def test_todas_las_rutas_tienen_presupuesto(self):
+        """Prueba que ninguna ruta quede sin presupuesto de consultas"""
+        rutas = {f'receta:{p.name}' for p in router.urls}
+        rutas |= {f'user:{p.name}' for p in user_urlpatterns}
+        con_presupuesto = {nombre for nombre, _ in PRESUPUESTOS}
+
+        self.assertEqual(rutas - con_presupuesto, set())
+
+    def test_api_root(self):
+        """Presupuesto de la raíz del router"""
+        url = reverse('receta:api-root')
+        self._assert_presupuesto(
+            'receta:api-root', 'get', lambda c, u: c.get(url)
+        )
+
+    def test_receta_list(self):
+        """Presupuesto del listado de recetas"""
+        url = reverse('receta:receta-list')
+        self._assert_presupuesto(
+            'receta:receta-list', 'get', lambda c, u: c.get(url)
+        )
+
+    def test_receta_create(self):
+        """Presupuesto de creación de recetas con relaciones"""
+        url = reverse('receta:receta-list')
+        payload = {
+            'titulo': 'Nueva',
+            'tiempo_minutos': 5,
+            'precio': '2.50',
+            'tags': [{'nombre': 'Tag 0'}, {'nombre': 'Nuevo'}],
+            'ingredientes': [{'nombre': 'Ingrediente 0'}],
+        }
+        self._assert_presupuesto(
+            'receta:receta-list', 'post',
+            lambda c, u: c.post(url, payload, format='json'),
+        )
+
+    def _detalle(self, user):
+        """URL del detalle de la última receta del usuario"""
+        receta = Receta.objects.filter(user=user).latest('id')
+        return reverse('receta:receta-detail', args=[receta.id])
+
+    def test_receta_retrieve(self):
+        """Presupuesto del detalle de receta"""
+        url = {u.id: self._detalle(u) for u in self.usuarios}
+        self._assert_presupuesto(
+            'receta:receta-detail', 'get', lambda c, u: c.get(url[u.id])
+        )
+
+    def test_receta_update(self):
+        """Presupuesto de la modificación total de recetas"""
+        payload = {
+            'titulo': 'Cambiada',
+            'tiempo_minutos': 5,
+            'precio': '2.50',
+            'tags': [{'nombre': 'Tag 0'}, {'nombre': 'Nuevo'}],
+            'ingredientes': [{'nombre': 'Ingrediente 0'}],
+        }
+        url = {u.id: self._detalle(u) for u in self.usuarios}
+        self._assert_presupuesto(
+            'receta:receta-detail', 'put',
+            lambda c, u: c.put(url[u.id], payload, format='json'),
+        )
+
+    def test_receta_partial_update(self):
+        """Presupuesto de la modificación parcial de recetas"""
+        url = {u.id: self._detalle(u) for u in self.usuarios}
+        self._assert_presupuesto(
+            'receta:receta-detail', 'patch',
+            lambda c, u: c.patch(url[u.id], {'titulo': 'Parcial'}),
+        )
+
+    def test_receta_destroy(self):
+        """Presupuesto de la eliminación de recetas"""
+        url = {u.id: self._detalle(u) for u in self.usuarios}
+        self._assert_presupuesto(
+            'receta:receta-detail', 'delete',
+            lambda c, u: c.delete(url[u.id]),
+        )
+
+    def test_receta_upload_image(self):
+        """Presupuesto de la carga de imágenes"""
+        recetas = {
+            u.id: Receta.objects.filter(user=u).latest('id')
+            for u in self.usuarios
+        }
+
+        def peticion(client, user):
+            url = reverse(
+                'receta:receta-upload-image', args=[recetas[user.id].id]
+            )
+            with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+                img = Image.new('RGB', (10, 10))
+                img.save(image_file, format='JPEG')
+                image_file.seek(0)
+                return client.post(
+                    url, {'imagen': image_file}, format='multipart'
+                )
+
+        self._assert_presupuesto(
+            'receta:receta-upload-image', 'post', peticion
+        )
+        for receta in recetas.values():
+            receta.refresh_from_db()
+            receta.imagen.delete()
+
+    def _assert_atributo(self, basename, model):
+        """Presupuestos de listado, modificación y eliminación
+        para tags e ingredientes"""
+        lista = reverse(f'receta:{basename}-list')
+        self._assert_presupuesto(
+            f'receta:{basename}-list', 'get', lambda c, u: c.get(lista)
+        )
+        self._assert_presupuesto(
+            f'receta:{basename}-list', 'get',
+            lambda c, u: c.get(lista, {'asignado': 1}),
+        )
+        self._assert_presupuesto(
+            f'receta:{basename}-list', 'get',
+            lambda c, u: c.get(lista, {'orden': 'usage_count'}),
+        )
+        autocompletar = reverse(f'receta:{basename}-autocompletar')
+        self._assert_presupuesto(
+            f'receta:{basename}-autocompletar', 'get',
+            lambda c, u: c.get(autocompletar, {'q': 'ing'}),
+        )
+
+        detalle = {
+            u.id: reverse(
+                f'receta:{basename}-detail',
+                args=[model.objects.filter(user=u).latest('id').id],
+            )
+            for u in self.usuarios
+        }
+        self._assert_presupuesto(
+            f'receta:{basename}-detail', 'patch',
+            lambda c, u: c.patch(detalle[u.id], {'nombre': 'Cambiado'}),
+        )
+        self._assert_presupuesto(
+            f'receta:{basename}-detail', 'delete',
+            lambda c, u: c.delete(detalle[u.id]),
+        )
+
+    def test_tags(self):
+        """Presupuesto de las rutas de tags"""
+        self._assert_atributo('tag', Tag)
+
+    def test_ingredientes(self):
+        """Presupuesto de las rutas de ingredientes"""
+        self._assert_atributo('ingrediente', Ingrediente)
+
+    def test_user_create(self):
+        """Presupuesto de la creación de usuarios"""
+        url = reverse('user:create')
+        payload = {
+            'correo': 'nuevo@example.com',
+            'password': 'testpass123',
+            'nombre': 'Nuevo',
+        }
+        with self.assertNumQueries(PRESUPUESTOS[('user:create', 'post')]):
+            res = APIClient().post(url, payload)
+
+        self.assertEqual(res.status_code, 201)
+
+    def test_user_token(self):
+        """Presupuesto de la obtención de tokens"""
+        url = reverse('user:token')
+        payload = {'correo': 'grande@example.com', 'password': 'testpass123'}
+        with self.assertNumQueries(PRESUPUESTOS[('user:token', 'post')]):
+            res = APIClient().post(url, payload)
+
+        self.assertEqual(res.status_code, 200)
+
+    def test_user_tokens_firmados(self):
+        """Presupuesto de la emisión, renovación y revocación de tokens
+        firmados"""
+        payload = {'correo': 'grande@example.com', 'password': 'testpass123'}
+        client = APIClient()
+        with self.assertNumQueries(
+            PRESUPUESTOS[('user:token-firmado', 'post')]
+        ):
+            res = client.post(reverse('user:token-firmado'), payload)
+        self.assertEqual(res.status_code, 200)
+
+        with self.assertNumQueries(
+            PRESUPUESTOS[('user:token-renovar', 'post')]
+        ):
+            res = client.post(
+                reverse('user:token-renovar'), {'refresh': res.data['refresh']}
+            )
+        self.assertEqual(res.status_code, 200)
+
+        with self.assertNumQueries(
+            PRESUPUESTOS[('user:token-revocar', 'post')]
+        ):
+            res = client.post(
+                reverse('user:token-revocar'), {'token': res.data['access']}
+            )
+        self.assertEqual(res.status_code, 204)
+
+    def test_user_me(self):
+        """Presupuesto de consulta y modificación del perfil"""
+        url = reverse('user:me')
+        self._assert_presupuesto(
+            'user:me', 'get', lambda c, u: c.get(url)
+        )
+        self._assert_presupuesto(
+            'user:me', 'patch',
+            lambda c, u: c.patch(url, {'nombre': 'Otro nombre'}),
+        )
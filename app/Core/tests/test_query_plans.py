@@ -0,0 +1,260 @@
+"""
+Pruebas de regresión de los planes de consulta de las rutas de lectura
+"""
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from Core.models import Receta, Tag, Ingrediente
+
+
+USUARIOS = 400
+RECETAS_POR_USUARIO = 250
+ATRIBUTOS_POR_USUARIO = 250
+# Usuario consultado por las pruebas, una fracción pequeña de la tabla.
+# Sus recetas se intercalan con las del resto como en producción
+RECETAS_USUARIO = 1000
+ATRIBUTOS_USUARIO = 500
+# Tags e ingredientes por receta
+POR_RECETA = 5
+# Una de cada N recetas menciona el texto buscado
+FRECUENCIA_BUSQUEDA = 50
+
+# Nodos del plan que indican que una consulta dejó de usar índices
+NODOS_LENTOS = {'Seq Scan'}
+# Nodos que ordenan filas en memoria o en disco
+NODOS_ORDEN = {'Sort', 'Incremental Sort'}
+
+
+def _sembrar():
+    """Siembra usuarios, recetas, atributos y relaciones con SQL por
+    conjuntos y actualiza las estadísticas del planificador. Regresa el
+    usuario consultado"""
+    usuario, *_ = get_user_model().objects.bulk_create([
+        get_user_model()(correo=f'plan{i}@example.com', password='!')
+        for i in range(USUARIOS)
+    ])
+    q = connection.ops.quote_name
+    receta = q(Receta._meta.db_table)
+    user = q(get_user_model()._meta.db_table)
+    cantidad = 'CASE WHEN u.id = %s THEN %s ELSE %s END'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''
+            INSERT INTO {receta} (user_id, titulo, tiempo_minutos, precio,
+                                  "desc", link, updated_at, imagen_estado,
+                                  imagenes)
+            SELECT u.id, 'Receta ' || n, n %% 120, 5.25,
+                   CASE WHEN n %% %s = 0 THEN 'Sopa de tomate con ajo'
+                        ELSE 'Guiso de lentejas' END, '', now(), '', '{{}}'
+            FROM {user} u, generate_series(1, {cantidad}) n
+            ORDER BY md5(u.id || ':' || n)
+            ''',
+            [
+                FRECUENCIA_BUSQUEDA,
+                usuario.id, RECETAS_USUARIO, RECETAS_POR_USUARIO,
+            ],
+        )
+        for relacion in ('tags', 'ingredientes'):
+            field = Receta._meta.get_field(relacion)
+            tabla = q(field.related_model._meta.db_table)
+            through = q(field.remote_field.through._meta.db_table)
+            cursor.execute(
+                f'''
+                INSERT INTO {tabla} (user_id, nombre, updated_at,
+                                     usage_count)
+                SELECT u.id, md5(u.id || ':' || n), now(), 0
+                FROM {user} u, generate_series(1, {cantidad}) n
+                ''',
+                [usuario.id, ATRIBUTOS_USUARIO, ATRIBUTOS_POR_USUARIO],
+            )
+            # Cada receta recibe POR_RECETA atributos distintos de su
+            # usuario repartidos entre todos los suyos
+            cursor.execute(
+                f'''
+                INSERT INTO {through} ({q(field.m2m_column_name())},
+                                       {q(field.m2m_reverse_name())})
+                SELECT r.id, a.id FROM (
+                    SELECT id, user_id, row_number() OVER (
+                        PARTITION BY user_id ORDER BY id
+                    ) n
+                    FROM {receta}
+                ) r
+                JOIN (
+                    SELECT user_id, count(*) total
+                    FROM {tabla} GROUP BY user_id
+                ) t USING (user_id)
+                CROSS JOIN generate_series(0, %(por)s - 1) k
+                JOIN (
+                    SELECT id, user_id, row_number() OVER (
+                        PARTITION BY user_id ORDER BY id
+                    ) - 1 m
+                    FROM {tabla}
+                ) a ON a.user_id = r.user_id
+                   AND a.m = (r.n + k * t.total / %(por)s) %% t.total
+                ''',
+                {'por': POR_RECETA},
+            )
+        # Valida una sola vez las FK diferidas de la siembra, si no cada
+        # prueba las vuelve a revisar al terminar
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        cursor.execute('ANALYZE')
+
+    return usuario
+
+
+def _nodos(plan):
+    """Recorre el árbol de un plan JSON de EXPLAIN"""
+    yield plan
+    for hijo in plan.get('Plans', []):
+        yield from _nodos(hijo)
+
+
+def _orden_explicito(plan):
+    """Indica si el ORDER BY de la consulta se resuelve ordenando filas
+    en lugar de recorrer un índice en orden. Los Sort internos, como
+    los de un Merge Join, no cuentan"""
+    if plan['Node Type'] == 'Limit':
+        plan = plan['Plans'][0]
+
+    return plan['Node Type'] in NODOS_ORDEN
+
+
+class QueryPlanTests(TestCase):
+    """Prueba que las consultas de lectura usen índices y no ordenen
+    filas en memoria, con suficientes datos para que el planificador
+    prefiera los índices cuando existen"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = _sembrar()
+        tags = Tag.objects.filter(user=cls.user).order_by('id')
+        cls.tags = [t.id for t in tags[:2]]
+        cls.ingrediente = Ingrediente.objects.filter(user=cls.user).first()
+        cls.receta = Receta.objects.filter(user=cls.user).first()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _planes(self, url, params=None):
+        """Ejecuta la petición sin cache y regresa los planes de cada
+        SELECT que generó"""
+        cache.clear()
+        with CaptureQueriesContext(connection) as consultas:
+            res = self.client.get(url, params)
+        self.assertEqual(res.status_code, 200)
+
+        planes = []
+        with connection.cursor() as cursor:
+            for consulta in consultas:
+                sql = consulta['sql']
+                if not sql.startswith('SELECT'):
+                    continue
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+                planes.append((sql, cursor.fetchone()[0][0]['Plan']))
+
+        return res, planes
+
+    def _assert_planes(self, url, params=None, ordena=False, indices=()):
+        """Falla si algún plan recorre una tabla completa, si alguna
+        consulta deduplica con DISTINCT, si resuelve el ORDER BY
+        ordenando filas cuando la ruta no está ordenada por relevancia
+        o si no aparecen los índices esperados"""
+        res, planes = self._planes(url, params)
+        self.assertTrue(planes)
+        usados = set()
+        for sql, plan in planes:
+            nodos = list(_nodos(plan))
+            usados.update(n['Index Name'] for n in nodos if 'Index Name' in n)
+            lentos = [
+                (n['Node Type'], n.get('Relation Name'))
+                for n in nodos if n['Node Type'] in NODOS_LENTOS
+            ]
+            with self.subTest(url=url, params=params, sql=sql):
+                detalle = json.dumps(plan, indent=1)
+                self.assertEqual(lentos, [], detalle)
+                self.assertNotIn('DISTINCT', sql)
+                if not ordena:
+                    self.assertFalse(_orden_explicito(plan), detalle)
+        self.assertEqual(set(indices) - usados, set())
+
+        return res
+
+    def test_receta_list(self):
+        """Listado de recetas y su segunda página"""
+        url = reverse('receta:receta-list')
+        res = self._assert_planes(url, indices=['receta_user_id_desc'])
+        self._assert_planes(res.data['next'], indices=['receta_user_id_desc'])
+
+    def test_receta_list_campos(self):
+        """Listado de recetas con campos dispersos"""
+        url = reverse('receta:receta-list')
+        self._assert_planes(url, {'fields': 'id,titulo,tags'})
+
+    def test_receta_list_filtros(self):
+        """Listado de recetas filtrado por tags e ingredientes. Con
+        filtros selectivos el planificador parte del índice de la tabla
+        intermedia y ordena solo las recetas que coinciden"""
+        url = reverse('receta:receta-list')
+        tags = ','.join(map(str, self.tags))
+        self._assert_planes(url, {'tags': tags}, ordena=True)
+        self._assert_planes(url, {'tags': tags, 'match': 'all'}, ordena=True)
+        self._assert_planes(
+            url, {'ingredientes': self.ingrediente.id}, ordena=True
+        )
+
+    def test_receta_list_busqueda(self):
+        """La búsqueda de texto ordena por relevancia, solo se exige
+        que no recorra la tabla completa"""
+        url = reverse('receta:receta-list')
+        self._assert_planes(url, {'q': 'tomate'}, ordena=True)
+
+    def test_receta_retrieve(self):
+        """Detalle de receta con sus relaciones"""
+        url = reverse('receta:receta-detail', args=[self.receta.id])
+        self._assert_planes(url)
+
+    def test_atributos_list(self):
+        """Listado de tags e ingredientes y su segunda página"""
+        for basename in ('tag', 'ingrediente'):
+            url = reverse(f'receta:{basename}-list')
+            indices = [f'{basename}_user_nombre_unique']
+            res = self._assert_planes(url, {'page_size': 10}, indices=indices)
+            self._assert_planes(res.data['next'], indices=indices)
+
+    def test_atributos_asignados(self):
+        """Listado de tags e ingredientes asignados a recetas, con el
+        semi-join sobre la tabla intermedia"""
+        for basename in ('tag', 'ingrediente'):
+            url = reverse(f'receta:{basename}-list')
+            indices = [f'{basename}_user_nombre_unique']
+            params = {'asignado': 1, 'page_size': 10}
+            res = self._assert_planes(url, params, indices=indices)
+            self._assert_planes(res.data['next'], indices=indices)
+
+    def test_atributos_usage_count(self):
+        """Listado de tags e ingredientes por popularidad y su segunda
+        página, sobre el índice de (user, -usage_count, -nombre)"""
+        for basename in ('tag', 'ingrediente'):
+            url = reverse(f'receta:{basename}-list')
+            indices = [f'{basename}_user_usage_count']
+            params = {'orden': 'usage_count', 'page_size': 10}
+            res = self._assert_planes(url, params, indices=indices)
+            self._assert_planes(res.data['next'], indices=indices)
+
+    def test_atributos_autocompletar(self):
+        """El autocompletado ordena por similitud, solo se exige que
+        no recorra la tabla completa"""
+        for basename in ('tag', 'ingrediente'):
+            url = reverse(f'receta:{basename}-autocompletar')
+            model = Tag if basename == 'tag' else Ingrediente
+            prefijo = model.objects.filter(user=self.user).first().nombre[:8]
+            self._assert_planes(url, {'q': prefijo}, ordena=True)
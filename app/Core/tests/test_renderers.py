@@ -0,0 +1,41 @@
+"""
+Pruebas para los renderers del API
+"""
+import json
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+
+from rest_framework.renderers import JSONRenderer
+
+from Core.renderers import ORJSONRenderer
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    """Pruebas del renderer basado en orjson"""
+
+    def test_misma_salida_que_drf(self):
+        """Prueba que la salida sea igual a la de JSONRenderer de DRF"""
+        data = OrderedDict([
+            ('id', 1),
+            ('titulo', 'Ají de queso\u2028'),
+            ('precio', Decimal('5.50')),
+            ('tags', [{'id': 2, 'nombre': 'Cena'}]),
+        ])
+
+        res = ORJSONRenderer().render(data)
+
+        self.assertEqual(res, JSONRenderer().render(data))
+
+    def test_indentacion_usa_drf(self):
+        """Prueba que pedir indentación regrese JSON indentado"""
+        res = ORJSONRenderer().render(
+            {'a': 1}, 'application/json; indent=2'
+        )
+
+        self.assertEqual(res, json.dumps({'a': 1}, indent=2).encode())
+
+    def test_sin_datos(self):
+        """Prueba que None se renderice vacío"""
+        self.assertEqual(ORJSONRenderer().render(None), b'')
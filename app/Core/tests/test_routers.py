@@ -0,0 +1,150 @@
+"""
+Pruebas del enrutamiento de lecturas a réplicas
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from Core.models import Receta
+from Core.routers import ReplicaRouter, base_lectura
+
+
+REPLICA = 'replica_0'
+RECETAS_URL = reverse('receta:receta-list')
+TAGS_URL = reverse('receta:tag-list')
+ME_URL = reverse('user:me')
+
+# Sin DB_REPLICAS la réplica es otra conexión a la base de pruebas, el
+# runner la necesita antes de preparar las bases
+connections.settings.setdefault(REPLICA, {
+    **connections.settings['default'],
+    'TEST': {'MIRROR': 'default'},
+})
+
+
+@override_settings(DB_REPLICA_ALIASES=[REPLICA])
+class ReplicaRouterTests(TransactionTestCase):
+    """La réplica es una conexión aparte, por eso las pruebas no corren
+    dentro de una transacción que no vería"""
+    databases = {'default', REPLICA}
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+
+    def setUp(self):
+        self.estado = caches['estado']
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass123'
+        )
+        Receta.objects.create(
+            user=self.user,
+            titulo='Receta',
+            tiempo_minutos=10,
+            precio=Decimal('5.00'),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # Las escrituras de setUp no cuentan
+        self.estado.clear()
+
+    def _consultas(self, metodo, url, data=None):
+        """Regresa la respuesta y las consultas en default y en la
+        réplica"""
+        with CaptureQueriesContext(connections['default']) as default, \
+                CaptureQueriesContext(connections[REPLICA]) as replica:
+            res = getattr(self.client, metodo)(url, data, format='json')
+
+        return res, default.captured_queries, replica.captured_queries
+
+    def test_lecturas_en_replica(self):
+        """Prueba que las lecturas de las vistas vayan a la réplica"""
+        for url in [RECETAS_URL, TAGS_URL]:
+            with self.subTest(url=url):
+                res, default, replica = self._consultas('get', url)
+
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                self.assertEqual(default, [])
+                self.assertNotEqual(replica, [])
+
+        self.assertIsNone(base_lectura.get())
+
+    def test_escrituras_en_default(self):
+        """Prueba que las escrituras no toquen la réplica"""
+        res, default, replica = self._consultas('post', RECETAS_URL, {
+            'titulo': 'Nueva',
+            'tiempo_minutos': 5,
+            'precio': '2.50',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertNotEqual(default, [])
+        self.assertEqual(replica, [])
+
+    def test_lee_sus_escrituras(self):
+        """Prueba que después de escribir el usuario lea de default hasta
+        que termine la ventana"""
+        self.client.post(RECETAS_URL, {
+            'titulo': 'Nueva',
+            'tiempo_minutos': 5,
+            'precio': '2.50',
+        }, format='json')
+
+        res, default, replica = self._consultas('get', RECETAS_URL)
+
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertNotEqual(default, [])
+        self.assertEqual(replica, [])
+
+        # Vaciar el cache general no termina la ventana
+        cache.clear()
+        res, default, replica = self._consultas(
+            'get', f'{RECETAS_URL}?q=Receta'
+        )
+        self.assertEqual(replica, [])
+
+        self.estado.clear()
+        res, default, replica = self._consultas(
+            'get', f'{RECETAS_URL}?q=Nueva'
+        )
+
+        self.assertEqual(default, [])
+        self.assertNotEqual(replica, [])
+
+    def test_cambio_de_perfil(self):
+        """Prueba que actualizar el perfil también fije las lecturas en
+        default"""
+        res = self.client.patch(ME_URL, {'name': 'Nuevo'}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res, default, replica = self._consultas('get', TAGS_URL)
+
+        self.assertNotEqual(default, [])
+        self.assertEqual(replica, [])
+
+    @override_settings(DB_REPLICA_ALIASES=[])
+    def test_sin_replicas(self):
+        """Prueba que sin réplicas configuradas todo vaya a default"""
+        res, default, replica = self._consultas('get', RECETAS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(default, [])
+        self.assertEqual(replica, [])
+
+    def test_migraciones_solo_en_default(self):
+        """Prueba que las réplicas no reciban migraciones ni escrituras"""
+        router = ReplicaRouter()
+
+        self.assertTrue(router.allow_migrate('default', 'Core'))
+        self.assertFalse(router.allow_migrate(REPLICA, 'Core'))
+        self.assertEqual(router.db_for_write(Receta), 'default')
@@ -0,0 +1,165 @@
+"""
+Pruebas del almacenamiento de imágenes por contenido
+"""
+from decimal import Decimal
+import hashlib
+from io import BytesIO, StringIO
+import os
+import shutil
+import tempfile
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from Core.models import Imagen, Receta
+from Core.uploads import HashingFileUploadHandler
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def contenido_imagen(color='red'):
+    """Bytes de una imagen JPEG"""
+    buffer = BytesIO()
+    Image.new('RGB', (64, 64), color).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, IMAGEN_WORKERS=0)
+class ContenidoStorageTests(TestCase):
+    """Pruebas de deduplicación y referencias de imágenes"""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _receta(self):
+        return Receta.objects.create(
+            user=self.user,
+            titulo='Receta',
+            tiempo_minutos=10,
+            precio=Decimal('5.00'),
+        )
+
+    def _cargar(self, receta, contenido):
+        url = reverse('receta:receta-upload-image', args=[receta.id])
+        archivo = SimpleUploadedFile('foto.JPG', contenido)
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(url, {'imagen': archivo})
+        self.assertEqual(res.status_code, 200)
+        receta.refresh_from_db()
+
+        return receta.imagen.name
+
+    def test_misma_imagen_se_guarda_una_vez(self):
+        """Prueba que cargar el mismo contenido en dos recetas use un
+        solo archivo nombrado por su sha256"""
+        contenido = contenido_imagen()
+        digest = hashlib.sha256(contenido).hexdigest()
+
+        nombre_1 = self._cargar(self._receta(), contenido)
+        nombre_2 = self._cargar(self._receta(), contenido)
+
+        self.assertEqual(nombre_1, nombre_2)
+        self.assertEqual(
+            nombre_1, f'uploads/receta/{digest[:2]}/{digest}.jpg'
+        )
+        directorio = os.path.join(MEDIA_ROOT, 'uploads', 'receta', digest[:2])
+        self.assertEqual(os.listdir(directorio), [f'{digest}.jpg'])
+        self.assertEqual(Imagen.objects.get(ruta=nombre_1).referencias, 2)
+
+    def test_reemplazo_purga_archivo_sin_referencias(self):
+        """Prueba que al reemplazar la imagen se borre el archivo
+        anterior solo cuando ninguna otra receta lo usa"""
+        receta_1, receta_2 = self._receta(), self._receta()
+        compartida = self._cargar(receta_1, contenido_imagen('red'))
+        self._cargar(receta_2, contenido_imagen('red'))
+        storage = receta_1.imagen.storage
+
+        self._cargar(receta_1, contenido_imagen('blue'))
+        self.assertTrue(storage.exists(compartida))
+        self.assertEqual(Imagen.objects.get(ruta=compartida).referencias, 1)
+
+        self._cargar(receta_2, contenido_imagen('blue'))
+        self.assertFalse(storage.exists(compartida))
+        self.assertFalse(Imagen.objects.filter(ruta=compartida).exists())
+
+    def test_eliminar_receta_purga_archivo(self):
+        """Prueba que eliminar la última receta borre su archivo y sus
+        derivados"""
+        receta = self._receta()
+        nombre = self._cargar(receta, contenido_imagen('green'))
+        receta.refresh_from_db()
+        derivado = receta.imagenes['miniatura']['webp']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            receta.delete()
+
+        self.assertFalse(os.path.exists(os.path.join(MEDIA_ROOT, nombre)))
+        self.assertFalse(os.path.exists(os.path.join(MEDIA_ROOT, derivado)))
+        self.assertFalse(Imagen.objects.filter(ruta=nombre).exists())
+
+    def test_handler_calcula_hash_en_disco(self):
+        """Prueba que el manejador de cargas escriba a un archivo
+        temporal y calcule el hash por bloques"""
+        contenido = contenido_imagen()
+        handler = HashingFileUploadHandler()
+        handler.new_file('imagen', 'foto.jpg', 'image/jpeg', len(contenido))
+        for inicio in range(0, len(contenido), 100):
+            handler.receive_data_chunk(contenido[inicio:inicio + 100], inicio)
+
+        archivo = handler.file_complete(len(contenido))
+
+        self.assertEqual(archivo.sha256, hashlib.sha256(contenido).hexdigest())
+        self.assertTrue(os.path.exists(archivo.temporary_file_path()))
+        archivo.close()
+
+    def test_comando_deduplicar_imagenes(self):
+        """Prueba que el comando renombre por contenido las imágenes
+        anteriores y fusione las repetidas"""
+        plano = FileSystemStorage(location=MEDIA_ROOT)
+        contenido = contenido_imagen('yellow')
+        recetas = [self._receta() for _ in range(3)]
+        viejas = [
+            plano.save(f'uploads/receta/vieja-{i}.jpg', ContentFile(datos))
+            for i, datos in enumerate(
+                [contenido, contenido, contenido_imagen('purple')]
+            )
+        ]
+        for receta, vieja in zip(recetas, viejas):
+            Receta.objects.filter(pk=receta.pk).update(imagen=vieja)
+        salida = StringIO()
+
+        call_command('deduplicar_imagenes', workers=2, stdout=salida)
+
+        for receta in recetas:
+            receta.refresh_from_db()
+        self.assertEqual(recetas[0].imagen.name, recetas[1].imagen.name)
+        self.assertNotEqual(recetas[0].imagen.name, recetas[2].imagen.name)
+        digest = hashlib.sha256(contenido).hexdigest()
+        self.assertTrue(recetas[0].imagen.name.endswith(f'{digest}.jpg'))
+        self.assertEqual(recetas[0].imagen_estado, 'lista')
+        for vieja in viejas:
+            self.assertFalse(plano.exists(vieja))
+        self.assertEqual(
+            Imagen.objects.get(ruta=recetas[0].imagen.name).referencias, 2
+        )
+        self.assertIn('3 imágenes renombradas, 2 archivos únicos',
+                      salida.getvalue())
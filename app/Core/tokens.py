@@ -0,0 +1,224 @@
+"""
+Tokens firmados con HMAC que se verifican sin consultar la base de datos
+
+El token de acceso vive TOKEN_ACCESO_TIMEOUT segundos y se renueva con el
+de renovación, que vive TOKEN_RENOVACION_TIMEOUT y se rota en cada uso.
+Los tokens de acceso revocados se buscan en una lista en memoria de cada
+proceso. Cada revocación se publica en TOKEN_REVOCADOS_CACHE_ALIAS, un
+cache que no desaloja entradas, y los demás procesos la agregan a su
+lista a lo más TOKEN_REVOCADOS_INTERVALO segundos después. Los tokens de
+renovación usados o revocados se reclaman en la tabla TokenRevocado, que
+decide cuál de dos renovaciones simultáneas recibe el par nuevo.
+"""
+from datetime import datetime, timezone
+import secrets
+import threading
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+
+from Core.models import TokenRevocado
+
+
+SALT = 'Core.tokens'
+ACCESO = 'a'
+RENOVACION = 'r'
+
+# Las revocaciones publicadas se agrupan por el minuto en que ocurrieron.
+# Un token de acceso revocado expira a lo más TOKEN_ACCESO_TIMEOUT
+# segundos después, solo se leen los grupos de esa ventana
+GRUPO = 60
+
+
+class TokenInvalido(Exception):
+    """Firma incorrecta, token expirado, revocado o de otro tipo"""
+
+
+def get_cache():
+    """Cache sin desalojo de las revocaciones publicadas"""
+    return caches[settings.TOKEN_REVOCADOS_CACHE_ALIAS]
+
+
+def _grupo_key(grupo):
+    return f'tokens:revocados:{grupo}'
+
+
+def _revocacion_key(grupo, n):
+    return f'tokens:revocados:{grupo}:{n}'
+
+
+class ListaRevocados:
+    """Identificadores de tokens revocados hasta su expiración,
+    compartidos por los hilos del proceso"""
+
+    def __init__(self):
+        self._expira = {}
+        self._lock = threading.Lock()
+        self._sincronizando = threading.Lock()
+        self._proxima = 0
+        # Grupo -> revocaciones ya leídas sin huecos
+        self._leidas = {}
+
+    def agregar(self, jti, expira):
+        """Agrega el token y descarta los que ya expiraron"""
+        self._agregar({jti: expira})
+
+    def _agregar(self, nuevos):
+        ahora = time.time()
+        with self._lock:
+            self._expira = {
+                j: e for j, e in self._expira.items() if e > ahora
+            }
+            self._expira.update(nuevos)
+
+    def publicar(self, jti, expira):
+        """Agrega el token y lo publica para los demás procesos como la
+        siguiente revocación del grupo del minuto actual"""
+        self.agregar(jti, expira)
+        cache = get_cache()
+        grupo = int(time.time()) // GRUPO
+        timeout = settings.TOKEN_ACCESO_TIMEOUT + 2 * GRUPO
+        cache.add(_grupo_key(grupo), 0, timeout)
+        n = cache.incr(_grupo_key(grupo))
+        cache.set(_revocacion_key(grupo, n), (jti, expira), timeout)
+
+    def sincronizar(self):
+        """Agrega las revocaciones publicadas desde la última lectura.
+        Lee el cache a lo más cada TOKEN_REVOCADOS_INTERVALO segundos y
+        solo un hilo a la vez, los demás siguen con la lista actual"""
+        ahora = time.time()
+        if ahora < self._proxima:
+            return
+        if not self._sincronizando.acquire(blocking=False):
+            return
+
+        try:
+            self._proxima = ahora + settings.TOKEN_REVOCADOS_INTERVALO
+            self._leer(get_cache(), int(ahora))
+        finally:
+            self._sincronizando.release()
+
+    def _leer(self, cache, ahora):
+        """Dos lecturas al cache: el total de cada grupo de la ventana y
+        las revocaciones que faltan. Una revocación contada que todavía
+        no aparece se vuelve a pedir en la siguiente lectura"""
+        grupos = range(
+            (ahora - settings.TOKEN_ACCESO_TIMEOUT) // GRUPO,
+            ahora // GRUPO + 1,
+        )
+        self._leidas = {
+            g: n for g, n in self._leidas.items() if g in grupos
+        }
+        totales = cache.get_many([_grupo_key(g) for g in grupos])
+        pendientes = {
+            g: range(
+                self._leidas.get(g, 0) + 1,
+                totales.get(_grupo_key(g), 0) + 1,
+            )
+            for g in grupos
+        }
+        revocaciones = cache.get_many([
+            _revocacion_key(g, n)
+            for g, numeros in pendientes.items() for n in numeros
+        ])
+
+        nuevos = {}
+        for g, numeros in pendientes.items():
+            hueco = False
+            for n in numeros:
+                revocacion = revocaciones.get(_revocacion_key(g, n))
+                if revocacion is None:
+                    hueco = True
+                    continue
+                jti, expira = revocacion
+                nuevos[jti] = expira
+                if not hueco:
+                    self._leidas[g] = n
+        if nuevos:
+            self._agregar(nuevos)
+
+    def __contains__(self, jti):
+        with self._lock:
+            return self._expira.get(jti, 0) > time.time()
+
+    def clear(self):
+        with self._lock:
+            self._expira.clear()
+            self._proxima = 0
+            self._leidas = {}
+
+
+revocados = ListaRevocados()
+
+
+def huella(user):
+    """Cambia con la contraseña, un token emitido antes de cambiarla
+    deja de ser válido"""
+    return user.get_session_auth_hash()[:16]
+
+
+def emitir(user, tipo):
+    """Firma un token del tipo pedido para el usuario"""
+    duracion = {
+        ACCESO: settings.TOKEN_ACCESO_TIMEOUT,
+        RENOVACION: settings.TOKEN_RENOVACION_TIMEOUT,
+    }[tipo]
+    return signing.Signer(salt=SALT).sign_object({
+        'u': user.pk,
+        't': tipo,
+        'j': secrets.token_urlsafe(9),
+        'e': int(time.time()) + duracion,
+        'p': huella(user),
+    })
+
+
+def emitir_par(user):
+    """Regresa un token de acceso y uno de renovación"""
+    return {
+        'access': emitir(user, ACCESO),
+        'refresh': emitir(user, RENOVACION),
+    }
+
+
+def esta_revocado(datos):
+    """Busca el token en la lista del proceso. Un token de renovación
+    también se busca en la tabla, se usa una sola vez"""
+    revocados.sincronizar()
+    if datos['j'] in revocados:
+        return True
+
+    return datos['t'] == RENOVACION and TokenRevocado.objects.revocado(
+        datos['j']
+    )
+
+
+def verificar(token, tipos=(ACCESO,)):
+    """Regresa el contenido del token si la firma es válida, no expiró,
+    no fue revocado y su tipo es uno de los pedidos"""
+    try:
+        datos = signing.Signer(salt=SALT).unsign_object(token)
+    except (signing.BadSignature, ValueError):
+        raise TokenInvalido
+    if datos.get('t') not in tipos or datos['e'] <= time.time():
+        raise TokenInvalido
+    if esta_revocado(datos):
+        raise TokenInvalido
+
+    return datos
+
+
+def revocar(datos):
+    """Revoca el token hasta su expiración. Uno de acceso se publica
+    para todos los procesos. Uno de renovación se reclama en la tabla y
+    regresa False si otra petición ya lo había reclamado, así se usa una
+    sola vez"""
+    if datos['t'] == ACCESO:
+        revocados.publicar(datos['j'], datos['e'])
+        return True
+
+    revocados.agregar(datos['j'], datos['e'])
+    return TokenRevocado.objects.revocar(
+        datos['j'], datetime.fromtimestamp(datos['e'], tz=timezone.utc)
+    )
@@ -0,0 +1,26 @@
+"""
+Manejadores de carga de archivos
+"""
+import hashlib
+
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+
+class HashingFileUploadHandler(TemporaryFileUploadHandler):
+    """Escribe cada carga a un archivo temporal en disco mientras
+    calcula su sha256, sin mantener el cuerpo completo en memoria. El
+    hash queda en el atributo sha256 del archivo para ContenidoStorage"""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        archivo = super().file_complete(file_size)
+        archivo.sha256 = self.digest.hexdigest()
+
+        return archivo
@@ -0,0 +1,40 @@
+"""
+Contadores de versión en cache
+
+Las entradas cacheadas de un usuario llevan su versión. Incrementarla
+deja inalcanzables las entradas anteriores en todos los procesos sin
+recorrer claves. La usan el cache de respuestas de recetas y el cache de
+autenticación.
+"""
+import time
+
+from django.db import connection, transaction
+
+
+def get_version(cache, key):
+    """Regresa la versión guardada en key y la inicia si no existe"""
+    version = cache.get(key)
+    if version is None:
+        # Se inicia con el reloj para no reutilizar versiones
+        # anteriores si la clave fue desalojada
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+
+    return version
+
+
+def incrementar(cache, key):
+    """Incrementa la versión guardada en key"""
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def al_confirmar(invalidar):
+    """Ejecuta invalidar y, dentro de una transacción, la repite al
+    confirmarla para que ninguna lectura concurrente guarde datos previos
+    al commit"""
+    invalidar()
+    if connection.in_atomic_block:
+        transaction.on_commit(invalidar)
@@ -1,12 +1,69 @@
 """
 Vista Core para app
 """
+import mimetypes
+from urllib.parse import quote
 
-from rest_framework.decorators import api_view
-from rest_framework.response import Response
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_safe
+from django.views.static import serve
 
+from Core import health
+from receta.imagenes import imagen_publicada
 
-@api_view(['GET'])
+
+# Los archivos de MEDIA_ROOT se nombran por su contenido, la misma URL
+# nunca cambia de bytes
+MEDIA_MAX_AGE = 60 * 60 * 24 * 365
+
+# Cuerpo fijo de la sonda de liveness, no se serializa en cada petición
+VIVO = b'{"healthy": true}'
+
+
+@require_safe
 def health_check(request):
-    """Regresa una respuesta correctamente"""
-    return Response({'healthy': True})
+    """Liveness: el proceso responde. No toca dependencias ni pasa por
+    la negociación y el render de DRF"""
+    return HttpResponse(VIVO, content_type='application/json')
+
+
+@never_cache
+@require_safe
+def readiness(request):
+    """Readiness: base de datos, cache y volumen de media disponibles,
+    con la latencia de cada uno. Responde 503 si alguno falla"""
+    listo, detalle = health.estado()
+    return JsonResponse(
+        {'ready': listo, 'checks': detalle}, status=200 if listo else 503
+    )
+
+
+@require_safe
+def media(request, ruta):
+    """Autoriza un archivo de MEDIA_ROOT. Con MEDIA_ACCEL_REDIRECT la
+    respuesta va vacía y nginx envía el archivo desde su ubicación
+    interna, sin ocupar un worker de uWSGI mientras se transfiere"""
+    if not imagen_publicada(ruta):
+        raise Http404('Imagen no encontrada')
+
+    if settings.MEDIA_ACCEL_REDIRECT:
+        # nginx agrega Cache-Control y atiende Range en la ubicación
+        # interna
+        content_type = mimetypes.guess_type(ruta)[0]
+        response = HttpResponse(
+            content_type=content_type or 'application/octet-stream'
+        )
+        response['X-Accel-Redirect'] = (
+            settings.MEDIA_ACCEL_PREFIX + quote(ruta)
+        )
+        return response
+
+    response = serve(request, ruta, document_root=settings.MEDIA_ROOT)
+    patch_cache_control(
+        response, public=True, max_age=MEDIA_MAX_AGE, immutable=True
+    )
+
+    return response
@@ -10,6 +10,9 @@ from django.utils.translation import gettext as _
 
 from rest_framework import serializers
 
+from Core import tokens
+from Core.authentication import usuario_firmado
+
 
 class UserSerializer(serializers.ModelSerializer):
     """Serializer para el objeto usuario"""
@@ -64,3 +67,48 @@ class AuthTokenSerializer(serializers.Serializer):
 
         attrs['user'] = user
         return attrs
+
+
+class SignedTokenSerializer(serializers.Serializer):
+    """Par de tokens firmados de acceso y renovación"""
+    access = serializers.CharField(read_only=True)
+    refresh = serializers.CharField(read_only=True)
+
+
+class RefreshTokenSerializer(serializers.Serializer):
+    """Serializer para renovar los tokens firmados"""
+    refresh = serializers.CharField(write_only=True)
+
+    def validate(self, attrs):
+        """Verifica el token de renovación y lo rota por un par nuevo"""
+        try:
+            datos = tokens.verificar(attrs['refresh'], (tokens.RENOVACION,))
+            user = usuario_firmado(datos)
+        except tokens.TokenInvalido:
+            msg = _('Token de renovación inválido o expirado')
+            raise serializers.ValidationError(msg, code='authorization')
+
+        # Se reclama antes de emitir, de dos renovaciones simultáneas
+        # con el mismo token solo una recibe un par nuevo
+        if not tokens.revocar(datos):
+            msg = _('Token de renovación inválido o expirado')
+            raise serializers.ValidationError(msg, code='authorization')
+
+        return tokens.emitir_par(user)
+
+
+class RevokeTokenSerializer(serializers.Serializer):
+    """Serializer para revocar un token firmado de acceso o renovación"""
+    token = serializers.CharField(write_only=True)
+
+    def validate(self, attrs):
+        """Verifica el token para revocarlo"""
+        try:
+            attrs['datos'] = tokens.verificar(
+                attrs['token'], (tokens.ACCESO, tokens.RENOVACION)
+            )
+        except tokens.TokenInvalido:
+            msg = _('Token inválido o expirado')
+            raise serializers.ValidationError(msg, code='authorization')
+
+        return attrs
@@ -0,0 +1,270 @@
+"""
+Pruebas de los tokens firmados de acceso y renovación
+"""
+import threading
+import time
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from Core import tokens
+from Core.authentication import tokens_locales, usuario_firmado
+
+TOKEN_FIRMADO_URL = reverse('user:token-firmado')
+RENOVAR_URL = reverse('user:token-renovar')
+REVOCAR_URL = reverse('user:token-revocar')
+ME_URL = reverse('user:me')
+RECETAS_URL = reverse('receta:receta-list')
+
+
+class TokensFirmadosTests(TestCase):
+    """Prueba la emisión, verificación y revocación de tokens firmados"""
+
+    def setUp(self):
+        tokens_locales.clear()
+        tokens.revocados.clear()
+        tokens.get_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass123', nombre='Nombre'
+        )
+        self.client = APIClient()
+        res = self.client.post(TOKEN_FIRMADO_URL, {
+            'correo': 'test@example.com',
+            'password': 'testpass123',
+        })
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.access, self.refresh = res.data['access'], res.data['refresh']
+
+    def _autenticar(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_acceso_sin_consultar_token(self):
+        """Prueba que el token de acceso autentique y que con el usuario
+        en cache no se consulte la base de datos"""
+        self._autenticar(self.access)
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            user = usuario_firmado(tokens.verificar(self.access))
+
+        self.assertEqual(user.pk, self.user.pk)
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['correo'], self.user.correo)
+        self.assertFalse(Token.objects.filter(user=self.user).exists())
+        res = self.client.get(RECETAS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_credenciales_incorrectas(self):
+        """Prueba que no se emitan tokens con contraseña incorrecta"""
+        res = APIClient().post(TOKEN_FIRMADO_URL, {
+            'correo': 'test@example.com',
+            'password': 'malpassw',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNotIn('access', res.data)
+
+    def test_tokens_invalidos(self):
+        """Prueba que se rechacen tokens alterados, expirados y los de
+        renovación usados como acceso"""
+        with override_settings(TOKEN_ACCESO_TIMEOUT=-1):
+            expirado = tokens.emitir(self.user, tokens.ACCESO)
+        for token in [self.access[:-1] + 'x', expirado, self.refresh]:
+            with self.subTest(token=token):
+                self._autenticar(token)
+                res = self.client.get(ME_URL)
+
+                self.assertEqual(
+                    res.status_code, status.HTTP_401_UNAUTHORIZED
+                )
+
+    def test_token_de_authtoken_sigue_funcionando(self):
+        """Prueba que los clientes con token de authtoken no cambien"""
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_renovar_rota_el_token(self):
+        """Prueba que la renovación emita un par nuevo y revoque el token
+        de renovación usado"""
+        res = self.client.post(RENOVAR_URL, {'refresh': self.refresh})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self._autenticar(res.data['access'])
+        self.assertEqual(
+            self.client.get(ME_URL).status_code, status.HTTP_200_OK
+        )
+        res = self.client.post(RENOVAR_URL, {'refresh': self.refresh})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_renovar_con_token_de_acceso(self):
+        """Prueba que un token de acceso no sirva para renovar"""
+        res = self.client.post(RENOVAR_URL, {'refresh': self.access})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_revocar_en_todos_los_procesos(self):
+        """Prueba que un token revocado deje de autenticar, también en un
+        proceso cuya lista en memoria no lo tiene"""
+        res = self.client.post(REVOCAR_URL, {'token': self.access})
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self._autenticar(self.access)
+
+        self.assertEqual(
+            self.client.get(ME_URL).status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+        tokens.revocados.clear()
+        self.assertEqual(
+            self.client.get(ME_URL).status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+
+    def test_revocado_sin_consultar(self):
+        """Prueba que un token de acceso revocado se rechace sin consultar
+        la base de datos"""
+        self.client.post(REVOCAR_URL, {'token': self.access})
+
+        with self.assertNumQueries(0):
+            with self.assertRaises(tokens.TokenInvalido):
+                tokens.verificar(self.access)
+
+    @override_settings(TOKEN_REVOCADOS_INTERVALO=60)
+    def test_revocaciones_de_otro_proceso(self):
+        """Prueba que otro proceso agregue a su lista la revocación
+        publicada en su siguiente lectura"""
+        jti = tokens.verificar(self.access)['j']
+        otro = tokens.ListaRevocados()
+        otro.sincronizar()
+
+        self.client.post(REVOCAR_URL, {'token': self.access})
+        otro.sincronizar()
+        self.assertNotIn(jti, otro)
+        # Pasa el intervalo
+        otro._proxima = 0
+        otro.sincronizar()
+
+        self.assertIn(jti, otro)
+
+    @override_settings(TOKEN_REVOCADOS_INTERVALO=0)
+    def test_revocacion_publicada_tarde(self):
+        """Prueba que una revocación ya contada en su grupo pero todavía
+        sin escribir se lea en la siguiente sincronización"""
+        otro = tokens.ListaRevocados()
+        cache = tokens.get_cache()
+        grupo = int(time.time()) // tokens.GRUPO
+        expira = time.time() + 60
+        cache.add(tokens._grupo_key(grupo), 0)
+        n = cache.incr(tokens._grupo_key(grupo))
+        tokens.revocados.publicar('siguiente', expira)
+        otro.sincronizar()
+        self.assertIn('siguiente', otro)
+        self.assertNotIn('tarde', otro)
+
+        cache.set(tokens._revocacion_key(grupo, n), ('tarde', expira))
+        otro.sincronizar()
+
+        self.assertIn('tarde', otro)
+
+    def test_revocacion_no_depende_del_cache(self):
+        """Prueba que vaciar el cache y la lista del proceso no vuelva a
+        aceptar un token revocado"""
+        self.client.post(REVOCAR_URL, {'token': self.access})
+        cache.clear()
+        tokens.revocados.clear()
+        self._autenticar(self.access)
+
+        self.assertEqual(
+            self.client.get(ME_URL).status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+
+    def test_cambio_de_password_invalida_tokens(self):
+        """Prueba que los tokens emitidos antes de cambiar la contraseña
+        dejen de ser válidos"""
+        self._autenticar(self.access)
+        res = self.client.patch(ME_URL, {'password': 'nuevapass123'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        res = self.client.post(RENOVAR_URL, {'refresh': self.refresh})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_usuario_desactivado(self):
+        """Prueba que un usuario desactivado no pueda usar sus tokens"""
+        self._autenticar(self.access)
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(
+            self.client.get(ME_URL).status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+
+    def test_lista_revocados_descarta_expirados(self):
+        """Prueba que la lista en memoria solo guarde tokens vigentes"""
+        lista = tokens.ListaRevocados()
+        lista.agregar('viejo', time.time() - 1)
+        lista.agregar('nuevo', time.time() + 60)
+
+        self.assertNotIn('viejo', lista)
+        self.assertIn('nuevo', lista)
+        self.assertEqual(list(lista._expira), ['nuevo'])
+
+
+class RenovacionConcurrenteTests(TransactionTestCase):
+    """Cada petición usa su propia conexión, por eso la prueba no corre
+    dentro de una transacción"""
+
+    def test_renovacion_concurrente(self):
+        """Prueba que dos renovaciones simultáneas con el mismo token
+        emitan un solo par nuevo"""
+        tokens.revocados.clear()
+        user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass123'
+        )
+        refresh = tokens.emitir(user, tokens.RENOVACION)
+        # Ambas verifican el token antes de que alguna lo revoque
+        barrera = threading.Barrier(2, timeout=5)
+        verificar = tokens.verificar
+        respuestas = []
+
+        def verificar_juntas(*args, **kwargs):
+            datos = verificar(*args, **kwargs)
+            barrera.wait()
+            return datos
+
+        def renovar():
+            try:
+                respuestas.append(APIClient().post(
+                    RENOVAR_URL, {'refresh': refresh}
+                ))
+            finally:
+                connections.close_all()
+
+        with patch.object(tokens, 'verificar', verificar_juntas):
+            hilos = [threading.Thread(target=renovar) for _ in range(2)]
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+
+        self.assertEqual(
+            sorted(res.status_code for res in respuestas),
+            [status.HTTP_200_OK, status.HTTP_400_BAD_REQUEST],
+        )
@@ -11,5 +11,20 @@ app_name = 'user'
 urlpatterns = [
     path('create/', views.CreateUserView.as_view(), name='create'),
     path('token/', views.CreateTokenView.as_view(), name='token'),
+    path(
+        'token/firmado/',
+        views.CreateSignedTokenView.as_view(),
+        name='token-firmado',
+    ),
+    path(
+        'token/renovar/',
+        views.RefreshTokenView.as_view(),
+        name='token-renovar',
+    ),
+    path(
+        'token/revocar/',
+        views.RevokeTokenView.as_view(),
+        name='token-revocar',
+    ),
     path('me/', views.ManageUserView.as_view(), name='me'),
 ]
@@ -2,13 +2,26 @@
 Views para el API de User
 """
 
-from rest_framework import generics, authentication, permissions
+from django.contrib.auth import get_user_model
+from drf_spectacular.utils import extend_schema
+from rest_framework import generics, permissions, status
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
+from Core import tokens
+from Core.authentication import (
+    CachedTokenAuthentication,
+    SignedTokenAuthentication,
+)
+from Core.routers import ReplicaReadMixin
+
 from .serializers import (
     UserSerializer,
-    AuthTokenSerializer
+    AuthTokenSerializer,
+    SignedTokenSerializer,
+    RefreshTokenSerializer,
+    RevokeTokenSerializer,
 )
 
 
@@ -23,12 +36,62 @@ class CreateTokenView(ObtainAuthToken):
     render_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class CreateSignedTokenView(generics.GenericAPIView):
+    """Crea un par de tokens firmados que se verifican sin consultar la
+    base de datos, alternativa opcional al token de authtoken"""
+    serializer_class = AuthTokenSerializer
+
+    @extend_schema(responses=SignedTokenSerializer)
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        return Response(
+            tokens.emitir_par(serializer.validated_data['user'])
+        )
+
+
+class RefreshTokenView(generics.GenericAPIView):
+    """Cambia un token de renovación por un par nuevo, el anterior queda
+    revocado"""
+    serializer_class = RefreshTokenSerializer
+
+    @extend_schema(responses=SignedTokenSerializer)
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        return Response(serializer.validated_data)
+
+
+class RevokeTokenView(generics.GenericAPIView):
+    """Revoca un token firmado hasta su expiración"""
+    serializer_class = RevokeTokenSerializer
+
+    @extend_schema(responses={204: None})
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        tokens.revocar(serializer.validated_data['datos'])
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ManageUserView(ReplicaReadMixin, generics.RetrieveUpdateAPIView):
     """Maneja el usuario autenticado"""
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [
+        CachedTokenAuthentication,
+        SignedTokenAuthentication,
+    ]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        """Recupera y retorna el usuario autenticado"""
-        return self.request.user
+        """Recupera y retorna el usuario autenticado. El de la
+        autenticación cacheada solo trae pk e is_active, se carga completo
+        para leerlo o modificarlo"""
+        user = self.request.user
+        if user.get_deferred_fields():
+            user = get_user_model().objects.get(pk=user.pk)
+
+        return user
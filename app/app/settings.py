@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'Core',
     'rest_framework',
     'rest_framework.authtoken',
@@ -62,7 +63,15 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'app.urls'
+#Despliegue ASGI, app/asgi.py lo activa. Las lecturas de recetas, tags e
+#ingredientes se atienden con vistas async que ejecutan la consulta en un
+#pool de ASYNC_LECTURA_HILOS hilos por proceso, cada uno con su conexión.
+#Un hilo sin peticiones por ASYNC_LECTURA_INACTIVO segundos la cierra
+ASGI = bool(int(os.environ.get('ASGI', 0)))
+ASYNC_LECTURA_HILOS = int(os.environ.get('ASYNC_LECTURA_HILOS', 16))
+ASYNC_LECTURA_INACTIVO = float(os.environ.get('ASYNC_LECTURA_INACTIVO', 10))
+
+ROOT_URLCONF = 'app.urls_asgi' if ASGI else 'app.urls'
 
 TEMPLATES = [
     {
@@ -86,16 +95,125 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+#Conexiones persistentes: segundos que cada worker reutiliza su conexión
+#(0 la cierra al terminar cada petición). Con DB_CONN_HEALTH_CHECKS se
+#verifica la conexión antes de usarla en una nueva petición
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+DB_CONN_HEALTH_CHECKS = bool(int(os.environ.get('DB_CONN_HEALTH_CHECKS', 1)))
+
+#PgBouncer en modo transaction: cada transacción puede usar otra conexión
+#del servidor, así que no hay cursores del lado del servidor
+#(QuerySet.iterator) que sobrevivan entre sentencias. psycopg2 no usa
+#sentencias preparadas del protocolo, no hay nada que desactivar
+DB_PGBOUNCER = bool(int(os.environ.get('DB_PGBOUNCER', 0)))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
         'HOST': os.environ.get('DB_HOST'),
+        'PORT': os.environ.get('DB_PORT', ''),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': DB_CONN_HEALTH_CHECKS,
+        'DISABLE_SERVER_SIDE_CURSORS': DB_PGBOUNCER,
     }
 }
 
+#Réplicas de lectura separadas por comas como host[:puerto][/base], sin
+#puerto o base usan los de default. Las pruebas las tratan como espejo
+#de default
+DB_REPLICA_ALIASES = []
+for i, replica in enumerate(filter(None, os.environ.get(
+    'DB_REPLICAS', ''
+).split(','))):
+    host, _, nombre = replica.strip().partition('/')
+    host, _, puerto = host.partition(':')
+    DB_REPLICA_ALIASES.append(f'replica_{i}')
+    DATABASES[f'replica_{i}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': puerto or DATABASES['default']['PORT'],
+        'NAME': nombre or DATABASES['default']['NAME'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['Core.routers.ReplicaRouter']
+
+#Segundos que las lecturas de un usuario van a default después de que
+#escribe, debe cubrir el retraso de replicación
+REPLICA_PRIMARIA_TIMEOUT = int(os.environ.get('REPLICA_PRIMARIA_TIMEOUT', 5))
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# Con varios workers se necesita un backend compartido (Redis o
+# Memcached) para que la invalidación de un worker sea visible en los
+# demás. El despliegue usa Redis con allkeys-lru, fuera de los volúmenes
+# que sirve nginx.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+#LocMemCache y FileBasedCache borran al azar 1/CULL_FREQUENCY de sus
+#entradas cuando llegan a MAX_ENTRIES, el límite por omisión de 300 se
+#llena con el cache de respuestas. Redis y Memcached no aceptan estas
+#opciones, se limitan con su propia memoria máxima
+if CACHES['default']['BACKEND'].rsplit('.', 1)[-1] in (
+    'LocMemCache', 'FileBasedCache'
+):
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 10000)),
+        'CULL_FREQUENCY': int(os.environ.get('CACHE_CULL_FREQUENCY', 10)),
+    }
+
+#Estado que no se puede perder por desalojo: las marcas que mantienen en
+#la primaria las lecturas de quien acaba de escribir y los tokens de
+#acceso revocados. En el despliegue es un Redis con maxmemory-policy
+#noeviction, las entradas expiran solas
+CACHES['estado'] = {
+    'BACKEND': os.environ.get(
+        'ESTADO_CACHE_BACKEND',
+        'django.core.cache.backends.locmem.LocMemCache'
+    ),
+    'LOCATION': os.environ.get('ESTADO_CACHE_LOCATION', 'estado'),
+}
+if CACHES['estado']['BACKEND'].endswith('LocMemCache'):
+    CACHES['estado']['OPTIONS'] = {'MAX_ENTRIES': 10 ** 6}
+
+REPLICA_CACHE_ALIAS = 'estado'
+
+RECETA_CACHE_ALIAS = 'default'
+RECETA_CACHE_TIMEOUT = int(os.environ.get('RECETA_CACHE_TIMEOUT', 300))
+
+#Cache de token a usuario de CachedTokenAuthentication: entradas por
+#proceso, segundos de vida y alias del cache compartido entre procesos
+#(vacío para usar solo el de cada proceso)
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 1024))
+TOKEN_CACHE_TIMEOUT = int(os.environ.get('TOKEN_CACHE_TIMEOUT', 60))
+TOKEN_CACHE_ALIAS = os.environ.get('TOKEN_CACHE_ALIAS', 'default') or None
+
+#Segundos de vida de los tokens firmados opcionales de acceso y renovación
+TOKEN_ACCESO_TIMEOUT = int(os.environ.get('TOKEN_ACCESO_TIMEOUT', 300))
+TOKEN_RENOVACION_TIMEOUT = int(
+    os.environ.get('TOKEN_RENOVACION_TIMEOUT', 60 * 60 * 24 * 7)
+)
+
+#Los tokens de acceso revocados se publican en este cache y cada proceso
+#los lee a lo más cada TOKEN_REVOCADOS_INTERVALO segundos
+TOKEN_REVOCADOS_CACHE_ALIAS = 'estado'
+TOKEN_REVOCADOS_INTERVALO = float(
+    os.environ.get('TOKEN_REVOCADOS_INTERVALO', 1)
+)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -141,6 +259,25 @@ MEDIA_URL = '/static/media/'
 STATIC_ROOT = '/vol/web/static'
 MEDIA_ROOT = '/vol/web/media'
 
+#Con MEDIA_ACCEL_REDIRECT Django solo autoriza los archivos de MEDIA_URL
+#y nginx los envía desde la ubicación interna MEDIA_ACCEL_PREFIX. Sin él
+#los entrega Django, útil solo en desarrollo
+MEDIA_ACCEL_REDIRECT = bool(int(os.environ.get('MEDIA_ACCEL_REDIRECT', 0)))
+MEDIA_ACCEL_PREFIX = '/media-interno/'
+
+#Las cargas se escriben a disco mientras se calcula su sha256, sin
+#mantener el cuerpo completo en memoria
+FILE_UPLOAD_HANDLERS = ['Core.uploads.HashingFileUploadHandler']
+
+#Hilos por proceso que generan las miniaturas de las recetas fuera de la
+#petición, con 0 se generan al confirmar la transacción en el mismo hilo
+IMAGEN_WORKERS = int(os.environ.get('IMAGEN_WORKERS', 2))
+
+#Sonda de readiness: segundos que espera a sus comprobaciones y segundos
+#que reutiliza el resultado
+READINESS_TIMEOUT = float(os.environ.get('READINESS_TIMEOUT', 1))
+READINESS_TTL = float(os.environ.get('READINESS_TTL', 5))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -152,9 +289,17 @@ AUTH_USER_MODEL = 'Core.User'
 
 #DRF Spectacular
 REST_FRAMEWORK = {
-    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema'
+    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_RENDERER_CLASSES': [
+        'Core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
+#Paginación por cursor, tamaño por defecto y máximo que puede pedir un cliente
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 50))
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 200))
+
 #Cargar imagenes por la interfaz del navegador
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True
@@ -13,13 +13,14 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from drf_spectacular.views import (
     SpectacularAPIView,
     SpectacularSwaggerView,
 )
 from django.contrib import admin
-from django.urls import path, include
-from django.conf.urls.static import static
+from django.urls import path, include, re_path
 from django.conf import settings
 
 from Core import views as core_views
@@ -28,6 +29,9 @@ from Core import views as core_views
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/health-check/', core_views.health_check, name='health-check'),
+    path(
+        'api/health-check/ready/', core_views.readiness, name='readiness'
+    ),
     path('api/schema/', SpectacularAPIView.as_view(), name='api-schema'),
     path(
         'api/docs',
@@ -36,10 +40,9 @@ urlpatterns = [
     ),
     path('api/user/', include('User.urls')),
     path('api/receta/', include('receta.urls')),
+    re_path(
+        r'^%s(?P<ruta>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')),
+        core_views.media,
+        name='media',
+    ),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL,
-        document_root=settings.MEDIA_ROOT
-    )
@@ -0,0 +1,18 @@
+"""
+URLs del despliegue ASGI
+
+Las mismas rutas de app.urls, con las de recetas, tags e ingredientes
+atendidas por las vistas async de receta.async_views.
+"""
+from django.urls import path, include
+
+from app.urls import urlpatterns as urlpatterns_wsgi
+from receta.async_views import lecturas_async
+from receta.urls import router
+
+
+urlpatterns = [
+    path('api/receta/', include((lecturas_async(router.urls), 'receta')))
+    if getattr(patron, 'app_name', None) == 'receta' else patron
+    for patron in urlpatterns_wsgi
+]
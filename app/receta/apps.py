@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RecetaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'receta'
+
+    def ready(self):
+        from receta import signals  # noqa: F401
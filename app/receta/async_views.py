@@ -0,0 +1,105 @@
+"""
+Vistas async de recetas, tags e ingredientes para el despliegue ASGI
+
+El ORM async de Django 4.1 delega cada consulta a sync_to_async con
+thread_sensitive=True, es decir a un solo hilo por proceso, y bajo ASGI
+una consulta lenta detendría a todas las demás. Estas vistas ejecutan la
+lectura completa (autenticación, cache, ETag, consulta y render) en un
+pool propio de hilos, cada uno con su conexión, y dejan libre el event
+loop mientras la base de datos responde. Un hilo que pasa
+ASYNC_LECTURA_INACTIVO segundos sin peticiones cierra sus conexiones,
+close_old_connections solo corre al atender una y las conexiones
+persistentes de los hilos ociosos quedarían abiertas.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import queue
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.urls import URLPattern
+
+
+LECTURAS = ('GET', 'HEAD', 'OPTIONS')
+
+_pool = None
+
+
+class _ColaLecturas(queue.SimpleQueue):
+    """Cola de trabajo del pool. Los hilos esperan aquí la siguiente
+    petición y al pasar el tiempo de inactividad cierran sus conexiones
+    antes de seguir esperando"""
+
+    def get(self, block=True, timeout=None):
+        if not block or timeout is not None:
+            return super().get(block, timeout)
+
+        try:
+            return super().get(timeout=settings.ASYNC_LECTURA_INACTIVO)
+        except queue.Empty:
+            connections.close_all()
+            return super().get()
+
+
+def get_pool():
+    """Pool de hilos de lectura del proceso, acota las conexiones que
+    abren las lecturas concurrentes"""
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(
+            max_workers=settings.ASYNC_LECTURA_HILOS,
+            thread_name_prefix='lecturas',
+        )
+        _pool._work_queue = _ColaLecturas()
+
+    return _pool
+
+
+def _en_hilo(vista):
+    """Ejecuta la vista síncrona como un worker WSGI: con las conexiones
+    del hilo y el render dentro del mismo hilo"""
+    def ejecutar(request, *args, **kwargs):
+        close_old_connections()
+        try:
+            response = vista(request, *args, **kwargs)
+            if callable(getattr(response, 'render', None)):
+                response.render()
+            return response
+        finally:
+            close_old_connections()
+
+    return ejecutar
+
+
+def vista_async(vista):
+    """Versión async de una vista de DRF. Las lecturas van al pool de
+    lecturas, las escrituras al hilo de Django como cualquier vista
+    síncrona bajo ASGI"""
+    lectura = _en_hilo(vista)
+    escritura = sync_to_async(vista)
+
+    @functools.wraps(vista)
+    async def view(request, *args, **kwargs):
+        if request.method in LECTURAS:
+            return await sync_to_async(
+                lectura, thread_sensitive=False, executor=get_pool()
+            )(request, *args, **kwargs)
+
+        return await escritura(request, *args, **kwargs)
+
+    return view
+
+
+def lecturas_async(patrones):
+    """Reemplaza la vista de cada patrón por su versión async"""
+    return [
+        URLPattern(
+            patron.pattern,
+            vista_async(patron.callback),
+            patron.default_args,
+            patron.name,
+        )
+        for patron in patrones
+    ]
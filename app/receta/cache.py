@@ -0,0 +1,70 @@
+"""
+Cache de respuestas por usuario para las APIs recetas
+
+Cada entrada lleva la versión de datos del usuario en su clave. Cualquier
+escritura sobre Receta, Tag o Ingrediente incrementa esa versión, con lo
+que las entradas anteriores quedan inalcanzables sin recorrer claves.
+"""
+import functools
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from Core import versiones
+from Core.routers import marcar_escritura
+
+
+def get_cache():
+    """Backend configurado en CACHES para las respuestas"""
+    return caches[settings.RECETA_CACHE_ALIAS]
+
+
+def _version_key(user_id):
+    return f'receta:version:{user_id}'
+
+
+def get_version(user_id):
+    """Regresa la versión de datos actual del usuario"""
+    return versiones.get_version(get_cache(), _version_key(user_id))
+
+
+def bump_version(user_id):
+    """Invalida todas las respuestas cacheadas del usuario. Sus lecturas
+    siguientes van a la primaria mientras las réplicas se ponen al día"""
+    def invalidar():
+        versiones.incrementar(get_cache(), _version_key(user_id))
+        marcar_escritura(user_id)
+
+    versiones.al_confirmar(invalidar)
+
+
+def response_key(request):
+    """Clave por usuario, versión, endpoint y parámetros"""
+    user_id = request.user.pk
+    url = hashlib.sha256(
+        request.build_absolute_uri().encode()
+    ).hexdigest()
+    return f'receta:respuesta:{user_id}:{get_version(user_id)}:{url}'
+
+
+def cache_por_usuario(metodo):
+    """Decorador para acciones GET de viewsets que guarda
+    response.data en el cache versionado del usuario"""
+    @functools.wraps(metodo)
+    def wrapper(self, request, *args, **kwargs):
+        key = response_key(request)
+        data = get_cache().get(key)
+        if data is not None:
+            return Response(data)
+
+        response = metodo(self, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            get_cache().set(key, response.data, settings.RECETA_CACHE_TIMEOUT)
+
+        return response
+
+    return wrapper
@@ -0,0 +1,88 @@
+"""
+GET condicional (ETag / Last-Modified / 304) para las APIs recetas
+"""
+import functools
+import hashlib
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date
+
+from receta.cache import get_cache, response_key
+
+
+def _calcular_validador(view, request, kwargs):
+    """Obtiene la última modificación y el total de objetos con una
+    sola consulta de agregación, sin cargar las filas"""
+    queryset = view.filter_queryset(view.get_queryset())
+    lookup = view.lookup_url_kwarg or view.lookup_field
+    if lookup in kwargs:
+        queryset = queryset.filter(**{view.lookup_field: kwargs[lookup]})
+
+    validador = queryset.order_by().aggregate(
+        ultima=Max('updated_at'),
+        total=Count('pk'),
+    )
+    if lookup in kwargs and not validador['total']:
+        return None
+
+    ultima = validador['ultima']
+    firma = ':'.join([
+        str(request.user.pk),
+        request.get_full_path(),
+        request.accepted_renderer.format,
+        str(validador['total']),
+        ultima.isoformat() if ultima else '',
+    ])
+    etag = '"%s"' % hashlib.sha256(firma.encode()).hexdigest()
+    last_modified = int(ultima.timestamp()) if ultima else None
+
+    return etag, last_modified
+
+
+def get_validador(view, request, kwargs):
+    """Regresa (etag, last_modified) cacheados con la misma versión
+    de datos del usuario que las respuestas"""
+    key = f'{response_key(request)}:validador'
+    validador = get_cache().get(key)
+    if validador is None:
+        validador = _calcular_validador(view, request, kwargs)
+        if validador is not None:
+            get_cache().set(
+                key, validador, settings.RECETA_CACHE_TIMEOUT
+            )
+
+    return validador
+
+
+def respuesta_condicional(metodo):
+    """Decorador para acciones GET de viewsets que responde 304 si
+    If-None-Match o If-Modified-Since coinciden, sin serializar"""
+    @functools.wraps(metodo)
+    def wrapper(self, request, *args, **kwargs):
+        validador = get_validador(self, request, kwargs)
+        if validador is None:
+            return metodo(self, request, *args, **kwargs)
+
+        etag, last_modified = validador
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = metodo(self, request, *args, **kwargs)
+
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ['Authorization'])
+
+        return response
+
+    return wrapper
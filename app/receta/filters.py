@@ -0,0 +1,39 @@
+"""
+Filtros para las APIs recetas
+"""
+from django.db.models import Exists, OuterRef
+
+from Core.models import Receta
+
+
+def filtrar_por_relacion(queryset, relacion, ids, match_all=False):
+    """Filtra recetas por los ids de una relación M2M (tags o
+    ingredientes) con semi-joins EXISTS, sin necesidad de DISTINCT.
+    Con match_all la receta debe tener todos los ids pedidos"""
+    field = Receta._meta.get_field(relacion)
+    through = field.remote_field.through
+    origen = field.m2m_field_name()
+    destino = f'{field.m2m_reverse_field_name()}_id'
+    ids = sorted(set(ids))
+
+    if not match_all:
+        return queryset.filter(Exists(through.objects.filter(
+            **{origen: OuterRef('pk'), f'{destino}__in': ids}
+        )))
+
+    for pk in ids:
+        queryset = queryset.filter(Exists(through.objects.filter(
+            **{origen: OuterRef('pk'), destino: pk}
+        )))
+
+    return queryset
+
+
+def filtrar_asignados(queryset, relacion):
+    """Filtra tags o ingredientes asignados a alguna receta con un
+    semi-join EXISTS sobre el índice de la tabla intermedia, sin
+    unir todas sus filas ni deduplicar con DISTINCT"""
+    field = Receta._meta.get_field(relacion)
+    return queryset.filter(Exists(field.remote_field.through.objects.filter(
+        **{field.m2m_reverse_field_name(): OuterRef('pk')}
+    )))
@@ -0,0 +1,210 @@
+"""
+Generación de miniaturas y derivados WebP/JPEG de las imágenes de
+recetas fuera del ciclo de la petición
+"""
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import logging
+import os
+import re
+
+from PIL import Image, ImageOps
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from Core.models import Imagen, Receta
+from receta.cache import bump_version
+
+
+logger = logging.getLogger(__name__)
+
+# Tamaño máximo (ancho, alto) de cada derivado, se conserva la proporción
+TAMANOS = {
+    'miniatura': (320, 320),
+    'mediana': (1024, 1024),
+}
+# Formato de Pillow: (extensión, opciones de guardado)
+FORMATOS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+# derivados/receta/<base>/<tamaño>.<ext>, ver ruta_derivado
+RUTA_DERIVADO = re.compile(r'^derivados/receta/(?P<base>[\w-]+)/\w+\.\w+$')
+
+_pool = None
+
+
+def get_pool():
+    """Pool de hilos del proceso, se crea al primer uso para que cada
+    worker de uWSGI tenga el suyo después del fork"""
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(
+            max_workers=settings.IMAGEN_WORKERS,
+            thread_name_prefix='imagenes',
+        )
+
+    return _pool
+
+
+def directorio_derivados(nombre):
+    """uploads/receta/<aa>/<hash>.jpg -> derivados/receta/<hash>"""
+    base = os.path.splitext(os.path.basename(nombre))[0]
+    return os.path.join('derivados', 'receta', base)
+
+
+def ruta_derivado(nombre, tamano, formato):
+    """Ruta de un derivado, compartida por las recetas con la misma
+    imagen porque el original se nombra por su contenido"""
+    extension = 'jpg' if formato == 'jpeg' else formato
+    return os.path.join(
+        directorio_derivados(nombre), f'{tamano}.{extension}'
+    )
+
+
+def imagen_publicada(ruta):
+    """Indica si la ruta de MEDIA_ROOT es un original o un derivado de
+    un archivo que alguna receta usa. Las rutas fuera de uploads/receta
+    y derivados/receta y los archivos sin referencias no se publican"""
+    derivado = RUTA_DERIVADO.match(ruta)
+    if derivado:
+        # El hash y el uuid tienen largo fijo, el prefijo no puede
+        # coincidir con otro original
+        base = derivado['base']
+        filtro = Q(ruta__startswith=f'uploads/receta/{base[:2]}/{base}') | Q(
+            ruta__startswith=f'uploads/receta/{base}'
+        )
+    elif ruta.startswith('uploads/receta/'):
+        filtro = Q(ruta=ruta)
+    else:
+        return False
+
+    return Imagen.objects.filter(filtro, referencias__gt=0).exists()
+
+
+def _abrir(archivo):
+    """Abre la imagen orientada según su EXIF. En JPEG decodifica
+    directamente a escala reducida cuando el original es mucho más
+    grande que el derivado mayor"""
+    imagen = Image.open(archivo)
+    imagen.draft('RGB', max(TAMANOS.values()))
+    imagen = ImageOps.exif_transpose(imagen)
+    transparente = 'A' in imagen.getbands() or 'transparency' in imagen.info
+
+    return imagen.convert('RGBA' if transparente else 'RGB')
+
+
+def _codificar(imagen, formato):
+    """Codifica la imagen en el formato pedido. JPEG no admite
+    transparencia, se compone sobre fondo blanco"""
+    nombre_pil, opciones = FORMATOS[formato]
+    if nombre_pil == 'JPEG' and imagen.mode == 'RGBA':
+        fondo = Image.new('RGB', imagen.size, 'white')
+        fondo.paste(imagen, mask=imagen.getchannel('A'))
+        imagen = fondo
+    buffer = BytesIO()
+    imagen.save(buffer, nombre_pil, **opciones)
+
+    return ContentFile(buffer.getvalue())
+
+
+def generar_derivados(receta_id, forzar=False):
+    """Genera los derivados de la imagen actual de la receta y guarda
+    sus rutas. Reutiliza los que ya existen para el mismo archivo salvo
+    con forzar. Si la imagen cambió mientras se procesaba el resultado
+    se descarta, la nueva carga ya programó su propia generación"""
+    receta = Receta.objects.only('imagen', 'user_id').filter(
+        pk=receta_id
+    ).first()
+    if receta is None or not receta.imagen:
+        return
+    nombre = receta.imagen.name
+    actual = Receta.objects.filter(pk=receta_id, imagen=nombre)
+    actual.update(imagen_estado=Receta.EstadoImagen.PROCESANDO)
+
+    imagenes = {
+        tamano: {f: ruta_derivado(nombre, tamano, f) for f in FORMATOS}
+        for tamano in TAMANOS
+    }
+    rutas = [r for formatos in imagenes.values() for r in formatos.values()]
+    try:
+        if forzar or not all(default_storage.exists(r) for r in rutas):
+            _escribir_derivados(receta.imagen, imagenes)
+        estado = Receta.EstadoImagen.LISTA
+    except (OSError, ValueError, Image.DecompressionBombError):
+        logger.exception('No se pudieron generar derivados de %s', nombre)
+        imagenes, estado = {}, Receta.EstadoImagen.ERROR
+
+    if actual.update(
+        imagen_estado=estado, imagenes=imagenes, updated_at=timezone.now()
+    ):
+        bump_version(receta.user_id)
+
+
+def _escribir_derivados(imagen, imagenes):
+    """Codifica el original en cada tamaño y formato de imagenes"""
+    with imagen.open('rb') as archivo:
+        original = _abrir(archivo)
+    for tamano, caja in TAMANOS.items():
+        copia = original.copy()
+        copia.thumbnail(caja, Image.LANCZOS)
+        for formato, ruta in imagenes[tamano].items():
+            default_storage.delete(ruta)
+            guardado = default_storage.save(ruta, _codificar(copia, formato))
+            if guardado != ruta:
+                # Otra receta con el mismo original escribió la ruta
+                # mientras tanto, su derivado es idéntico
+                default_storage.delete(guardado)
+
+
+def purgar_imagenes(rutas):
+    """Borra los archivos sin recetas que los usen junto con sus
+    derivados. La fila se borra y bloquea antes que el archivo, una
+    carga concurrente del mismo contenido espera en Imagen.reservar y
+    lo vuelve a escribir"""
+    storage = Receta._meta.get_field('imagen').storage
+    with transaction.atomic():
+        purgadas = list(
+            Imagen.objects.filter(
+                ruta__in=set(rutas), referencias=0
+            ).select_for_update().values_list('ruta', flat=True)
+        )
+        Imagen.objects.filter(ruta__in=purgadas).delete()
+        for ruta in purgadas:
+            storage.delete(ruta)
+            directorio = directorio_derivados(ruta)
+            if default_storage.exists(directorio):
+                for archivo in default_storage.listdir(directorio)[1]:
+                    default_storage.delete(os.path.join(directorio, archivo))
+                default_storage.delete(directorio)
+
+    return purgadas
+
+
+def _tarea(receta_id):
+    """Ejecuta generar_derivados en un hilo del pool"""
+    try:
+        generar_derivados(receta_id)
+    except Exception:
+        logger.exception('Falló la generación de derivados de %s', receta_id)
+    finally:
+        # Cada hilo abre su propia conexión, no debe quedar abierta
+        connections.close_all()
+
+
+def encolar_derivados(receta_id):
+    """Programa la generación para cuando se confirme la transacción.
+    Con IMAGEN_WORKERS = 0 se genera en el mismo hilo"""
+    def enviar():
+        if settings.IMAGEN_WORKERS:
+            get_pool().submit(_tarea, receta_id)
+        else:
+            generar_derivados(receta_id)
+
+    transaction.on_commit(enviar)
@@ -0,0 +1,169 @@
+"""
+Comando Django para comparar concurrencia y latencia de cola de las
+lecturas entre el despliegue WSGI y el ASGI con una base de datos lenta
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+
+from Core.models import Receta
+
+
+class Command(BaseCommand):
+    """Atiende las mismas lecturas con N workers síncronos, como uWSGI,
+    y con el event loop y el pool de lecturas de ASGI. Cada consulta
+    espera --latencia ms antes de ejecutarse en Postgres"""
+    help = 'Benchmark de lecturas concurrentes WSGI contra ASGI'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--latencia', type=float, default=50,
+            help='Milisegundos agregados a cada consulta',
+        )
+        parser.add_argument('--clientes', type=int, default=32)
+        parser.add_argument('--peticiones', type=int, default=256)
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Workers síncronos del despliegue WSGI',
+        )
+        parser.add_argument('--recetas', type=int, default=100)
+
+    def handle(self, *args, **options):
+        """Comienzo del comando"""
+        latencia = options['latencia'] / 1000
+
+        def lento(execute, sql, params, many, context):
+            time.sleep(latencia)
+            return execute(sql, params, many, context)
+
+        def instalar(sender, connection, **kwargs):
+            # La señal se repite cada vez que el hilo vuelve a conectar
+            if lento not in connection.execute_wrappers:
+                connection.execute_wrappers.append(lento)
+
+        # Los hilos necesitan ver los datos, se confirman y se borran
+        # al terminar
+        user = self._sembrar(options)
+        auth = f'Token {Token.objects.create(user=user).key}'
+        connections.close_all()
+        connection_created.connect(instalar)
+        hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        try:
+            with override_settings(
+                ROOT_URLCONF='app.urls', ALLOWED_HOSTS=hosts
+            ):
+                wsgi = self._wsgi(auth, options)
+            with override_settings(
+                ROOT_URLCONF='app.urls_asgi', ALLOWED_HOSTS=hosts
+            ):
+                asgi = asyncio.run(self._asgi(auth, options))
+        finally:
+            connection_created.disconnect(instalar)
+            connections.close_all()
+            user.delete()
+
+        self.stdout.write(
+            f'{options["peticiones"]} lecturas, {options["clientes"]} '
+            f'clientes, {options["latencia"]:g} ms por consulta'
+        )
+        self._reportar(f'wsgi ({options["workers"]} workers)', *wsgi)
+        self._reportar(
+            f'asgi ({settings.ASYNC_LECTURA_HILOS} hilos)', *asgi
+        )
+
+    def _sembrar(self, options):
+        """Crea un usuario con recetas"""
+        user = get_user_model().objects.create_user(
+            f'benchmark-{time.time_ns()}@example.com', None
+        )
+        Receta.objects.bulk_create([
+            Receta(
+                user=user,
+                titulo=f'Receta {i}',
+                tiempo_minutos=10,
+                precio=Decimal('5.00'),
+            )
+            for i in range(options['recetas'])
+        ])
+
+        return user
+
+    def _repartir(self, modo, options):
+        """Reparte las URLs entre los clientes. Cada petición usa una
+        URL distinta para no responder desde el cache de respuestas"""
+        base = reverse('receta:receta-list')
+        urls = [
+            f'{base}?bench={modo}-{i}' for i in range(options['peticiones'])
+        ]
+        clientes = options['clientes']
+        return [urls[i::clientes] for i in range(clientes)]
+
+    def _wsgi(self, auth, options):
+        """Cada cliente es un hilo, a lo más --workers peticiones se
+        atienden a la vez y las demás esperan un worker libre"""
+        workers = threading.Semaphore(options['workers'])
+        latencias, errores = [], []
+
+        def cliente(urls):
+            client = Client()
+            for url in urls:
+                inicio = time.perf_counter()
+                with workers:
+                    try:
+                        res = client.get(url, HTTP_AUTHORIZATION=auth)
+                    finally:
+                        close_old_connections()
+                latencias.append(time.perf_counter() - inicio)
+                if res.status_code != 200:
+                    errores.append(res.status_code)
+
+        repartidas = self._repartir('wsgi', options)
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(len(repartidas)) as pool:
+            list(pool.map(cliente, repartidas))
+
+        return latencias, errores, time.perf_counter() - inicio
+
+    async def _asgi(self, auth, options):
+        """Cada cliente es una corrutina sobre el mismo event loop"""
+        client = AsyncClient()
+        latencias, errores = [], []
+
+        async def cliente(urls):
+            for url in urls:
+                inicio = time.perf_counter()
+                res = await client.get(url, AUTHORIZATION=auth)
+                latencias.append(time.perf_counter() - inicio)
+                if res.status_code != 200:
+                    errores.append(res.status_code)
+
+        repartidas = self._repartir('asgi', options)
+        inicio = time.perf_counter()
+        await asyncio.gather(*[cliente(urls) for urls in repartidas])
+
+        return latencias, errores, time.perf_counter() - inicio
+
+    def _reportar(self, nombre, latencias, errores, total):
+        """Imprime peticiones por segundo y percentiles de latencia"""
+        percentiles = statistics.quantiles(latencias, n=100)
+        self.stdout.write(
+            f'{nombre:<20} {len(latencias) / total:>8.1f} req/s  '
+            f'p50 {percentiles[49] * 1000:>7.1f} ms  '
+            f'p95 {percentiles[94] * 1000:>7.1f} ms  '
+            f'p99 {percentiles[98] * 1000:>7.1f} ms  '
+            f'{len(errores)} errores'
+        )
@@ -0,0 +1,129 @@
+"""
+Comando Django para comparar los planes del filtrado de recetas
+JOIN + DISTINCT contra semi-joins EXISTS
+"""
+import re
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from Core.models import Receta, Tag, Ingrediente
+from receta.filters import filtrar_por_relacion
+
+
+class Command(BaseCommand):
+    """Siembra un dataset y compara EXPLAIN ANALYZE de ambos planes"""
+    help = 'Benchmark del filtrado de recetas por tags e ingredientes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recetas', type=int, default=1_000_000)
+        parser.add_argument('--tags', type=int, default=50)
+        parser.add_argument('--por-receta', type=int, default=3)
+        parser.add_argument('--filtro', type=int, default=5)
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--batch', type=int, default=10_000)
+        parser.add_argument(
+            '--conservar',
+            action='store_true',
+            help='No revierte los datos sembrados al terminar',
+        )
+
+    def handle(self, *args, **options):
+        """Comienzo del comando"""
+        with transaction.atomic():
+            user, tags = self._sembrar(options)
+            ids = [t.id for t in tags[:options['filtro']]]
+            base = Receta.objects.filter(user=user)
+            limite = options['page_size']
+
+            planes = {
+                'join + distinct': base.filter(
+                    tags__id__in=ids
+                ).order_by('-id').distinct(),
+                'exists (any)': filtrar_por_relacion(
+                    base, 'tags', ids
+                ).order_by('-id'),
+                'join + distinct (all)': self._join_all(base, ids),
+                'exists (all)': filtrar_por_relacion(
+                    base, 'tags', ids, match_all=True
+                ).order_by('-id'),
+            }
+            for nombre, queryset in planes.items():
+                self._medir(nombre, queryset[:limite], options)
+                self._medir(f'{nombre} count', queryset, options, True)
+
+            if not options['conservar']:
+                transaction.set_rollback(True)
+
+    def _sembrar(self, options):
+        """Crea un usuario con recetas y tags asignados en lotes"""
+        inicio = time.perf_counter()
+        user = get_user_model().objects.create_user(
+            f'benchmark-{time.time_ns()}@example.com', None
+        )
+        tags = Tag.objects.bulk_create([
+            Tag(user=user, nombre=f'Tag {i}') for i in range(options['tags'])
+        ])
+        Ingrediente.objects.create(user=user, nombre='Ingrediente')
+
+        total = options['recetas']
+        for offset in range(0, total, options['batch']):
+            Receta.objects.bulk_create([
+                Receta(
+                    user=user,
+                    titulo=f'Receta {i}',
+                    tiempo_minutos=i % 120,
+                    precio='5.00',
+                )
+                for i in range(offset, min(offset + options['batch'], total))
+            ])
+
+        # Cada receta recibe por_receta tags consecutivos
+        through = Receta.tags.through._meta.db_table
+        receta_table = Receta._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'''
+                INSERT INTO "{through}" (receta_id, tag_id)
+                SELECT r.id, (%s::bigint[])[1 + (r.id + g) %% %s]
+                FROM "{receta_table}" r, generate_series(0, %s - 1) g
+                WHERE r.user_id = %s
+                ''',
+                [[t.id for t in tags], len(tags), options['por_receta'],
+                 user.id],
+            )
+            cursor.execute(f'ANALYZE "{receta_table}"')
+            cursor.execute(f'ANALYZE "{through}"')
+
+        self.stdout.write(
+            f'Sembradas {total} recetas en '
+            f'{time.perf_counter() - inicio:.1f} s'
+        )
+        return user, tags
+
+    def _join_all(self, base, ids):
+        """Versión anterior de match=all: un JOIN por cada tag"""
+        queryset = base
+        for pk in ids:
+            queryset = queryset.filter(tags__id=pk)
+        return queryset.order_by('-id').distinct()
+
+    def _medir(self, nombre, queryset, options, count=False):
+        """Imprime el tiempo de ejecución reportado por EXPLAIN ANALYZE"""
+        if count:
+            queryset = queryset.values('pk').order_by()
+            sql, params = queryset.query.sql_with_params()
+            sql = f'SELECT count(*) FROM ({sql}) AS sub'
+        else:
+            sql, params = queryset.query.sql_with_params()
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS) {sql}', params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+
+        ejecucion = re.search(r'Execution Time: ([\d.]+) ms', plan)
+        self.stdout.write(f'{nombre:<30} {ejecucion.group(1):>12} ms')
+        if options['verbosity'] > 1:
+            self.stdout.write(plan)
@@ -0,0 +1,107 @@
+"""
+Comando Django para comparar el throughput del listado de recetas con
+ModelSerializer contra la ruta de filas values()
+"""
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from rest_framework.renderers import JSONRenderer
+
+from Core.models import Receta, Tag, Ingrediente
+from Core.renderers import ORJSONRenderer
+from receta.serializers import RecetaSerializer, RecetaFilasSerializer
+
+
+class Command(BaseCommand):
+    """Siembra una página de recetas y mide páginas por segundo"""
+    help = 'Benchmark de serialización de páginas de recetas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recetas', type=int, default=1000)
+        parser.add_argument('--por-receta', type=int, default=5)
+        parser.add_argument('--iteraciones', type=int, default=20)
+
+    def handle(self, *args, **options):
+        """Comienzo del comando"""
+        with transaction.atomic():
+            user = self._sembrar(options)
+            base = Receta.objects.filter(user=user).order_by('-id')
+            campos = RecetaSerializer.Meta.fields
+            columnas = [
+                c for c in campos if c not in ('tags', 'ingredientes')
+            ]
+
+            def model_serializer():
+                page = list(base.prefetch_related('tags', 'ingredientes'))
+                data = RecetaSerializer(page, many=True).data
+                return JSONRenderer().render(data)
+
+            def filas():
+                page = list(base.values(*columnas))
+                data = RecetaFilasSerializer(page, many=True).data
+                return ORJSONRenderer().render(data)
+
+            referencia = self._medir(
+                'ModelSerializer + JSONRenderer', model_serializer, options
+            )
+            rapido = self._medir('values() + ORJSONRenderer', filas, options)
+            self.stdout.write(f'Aceleración: {referencia / rapido:.1f}x')
+
+            transaction.set_rollback(True)
+
+    def _sembrar(self, options):
+        """Crea un usuario con recetas, tags e ingredientes asignados"""
+        user = get_user_model().objects.create_user(
+            f'benchmark-{time.time_ns()}@example.com', None
+        )
+        n = options['por_receta']
+        tags = Tag.objects.bulk_create([
+            Tag(user=user, nombre=f'Tag {i}') for i in range(n * 4)
+        ])
+        ingredientes = Ingrediente.objects.bulk_create([
+            Ingrediente(user=user, nombre=f'Ingrediente {i}')
+            for i in range(n * 4)
+        ])
+        recetas = Receta.objects.bulk_create([
+            Receta(
+                user=user,
+                titulo=f'Receta {i}',
+                tiempo_minutos=i % 120,
+                precio=Decimal('5.25'),
+                link='http://example.com/receta.pdf',
+            )
+            for i in range(options['recetas'])
+        ])
+        Receta.tags.through.objects.bulk_create([
+            Receta.tags.through(
+                receta_id=r.id, tag_id=tags[(i + j) % len(tags)].id,
+            )
+            for i, r in enumerate(recetas) for j in range(n)
+        ])
+        Receta.ingredientes.through.objects.bulk_create([
+            Receta.ingredientes.through(
+                receta_id=r.id,
+                ingrediente_id=ingredientes[(i + j) % len(ingredientes)].id,
+            )
+            for i, r in enumerate(recetas) for j in range(n)
+        ])
+
+        return user
+
+    def _medir(self, nombre, funcion, options):
+        """Imprime ms por página y páginas por segundo"""
+        funcion()
+        inicio = time.perf_counter()
+        for _ in range(options['iteraciones']):
+            funcion()
+        por_pagina = (time.perf_counter() - inicio) / options['iteraciones']
+
+        self.stdout.write(
+            f'{nombre:<32} {por_pagina * 1000:8.1f} ms/página '
+            f'{1 / por_pagina:8.1f} páginas/s'
+        )
+        return por_pagina
@@ -0,0 +1,62 @@
+"""
+Comando Django para generar los derivados de imágenes de recetas que
+quedaron sin procesar
+"""
+from concurrent.futures import ThreadPoolExecutor
+import functools
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from Core.models import Receta
+from receta.imagenes import generar_derivados
+
+
+def _generar(receta_id, forzar=False):
+    """Genera los derivados de una receta y cierra la conexión del hilo"""
+    try:
+        generar_derivados(receta_id, forzar=forzar)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    """Genera derivados de imágenes cargadas antes del pipeline o cuya
+    tarea se perdió al reiniciar un worker"""
+    help = 'Genera miniaturas y derivados WebP/JPEG pendientes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--todas', action='store_true',
+            help='Regenera también las imágenes ya procesadas',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Imágenes procesadas en paralelo',
+        )
+
+    def handle(self, *args, **options):
+        """Comienzo del comando"""
+        recetas = Receta.objects.exclude(imagen='').exclude(imagen=None)
+        if not options['todas']:
+            recetas = recetas.exclude(
+                imagen_estado=Receta.EstadoImagen.LISTA
+            )
+        ids = list(recetas.values_list('id', flat=True))
+        # Con --todas se reescriben aunque los derivados ya existan
+        forzar = options['todas']
+
+        if options['workers'] > 1:
+            with ThreadPoolExecutor(options['workers']) as pool:
+                list(pool.map(functools.partial(_generar, forzar=forzar), ids))
+        else:
+            for receta_id in ids:
+                generar_derivados(receta_id, forzar=forzar)
+
+        errores = Receta.objects.filter(
+            id__in=ids, imagen_estado=Receta.EstadoImagen.ERROR
+        ).count()
+        self.stdout.write(
+            f'{len(ids)} imágenes procesadas, {errores} con error'
+        )
+        self.stdout.write(self.style.SUCCESS('Derivados generados'))
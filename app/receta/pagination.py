@@ -0,0 +1,168 @@
+"""
+Paginación por cursor para las APIs recetas
+
+CursorPagination de DRF guarda en el cursor solo el primer campo del
+orden y resuelve los empates con un desplazamiento limitado a
+offset_cutoff filas. Los órdenes de varios campos, cuyo último campo es
+único, guardan todos sus valores y filtran con una comparación de filas
+de SQL, así los empates no se repiten ni se pierden páginas.
+"""
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import F, Field, Func, Value
+from django.db.models.lookups import GreaterThan, LessThan
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+
+class Fila(Func):
+    """Constructor de fila de SQL, (a, b) < (x, y) compara en orden
+    lexicográfico y puede recorrer un índice de (a, b)"""
+    template = '(%(expressions)s)'
+    output_field = Field()
+
+
+def _invertir(ordering):
+    return tuple(
+        campo[1:] if campo.startswith('-') else f'-{campo}'
+        for campo in ordering
+    )
+
+
+class RecetaCursorPagination(CursorPagination):
+    """Paginación keyset sobre -id, el costo de cada página
+    no depende de su profundidad"""
+    ordering = '-id'
+    # Orden usado cuando la búsqueda de texto (?q=) anota la relevancia
+    search_ordering = ('-rank', '-id')
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        """Ordena por relevancia cuando hay búsqueda de texto"""
+        if self.search_ordering and request.query_params.get('q'):
+            return self.search_ordering
+
+        return super().get_ordering(request, queryset, view)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Los órdenes de un campo usan la paginación de DRF, los de
+        varios la de _paginar_compuesto"""
+        ordering = self.get_ordering(request, queryset, view)
+        if len(ordering) == 1:
+            return super().paginate_queryset(queryset, request, view)
+
+        return self._paginar_compuesto(queryset, request, ordering)
+
+    def _paginar_compuesto(self, queryset, request, ordering):
+        """Como CursorPagination.paginate_queryset con la posición de
+        todos los campos. Cada posición es única y el desplazamiento
+        siempre es 0"""
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = ordering
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, posicion = False, None
+        else:
+            reverse, posicion = self.cursor.reverse, self.cursor.position
+
+        if reverse:
+            queryset = queryset.order_by(*_invertir(ordering))
+        else:
+            queryset = queryset.order_by(*ordering)
+
+        if posicion is not None:
+            queryset = queryset.filter(
+                self._despues_de(queryset, posicion, reverse)
+            )
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        siguiente = None
+        if len(results) > len(self.page):
+            siguiente = self._get_position_from_instance(
+                results[-1], ordering
+            )
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = posicion is not None
+            self.has_previous = siguiente is not None
+            self.next_position = posicion
+            self.previous_position = siguiente
+        else:
+            self.has_next = siguiente is not None
+            self.has_previous = posicion is not None
+            self.next_position = siguiente
+            self.previous_position = posicion
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def _despues_de(self, queryset, posicion, reverse):
+        """Condición (campos) < (posición) o > según la dirección. Todos
+        los campos del orden deben ir en la misma dirección"""
+        campos = [campo.lstrip('-') for campo in self.ordering]
+        descendente = {campo.startswith('-') for campo in self.ordering}
+        assert len(descendente) == 1, (
+            'El orden compuesto debe ir en una sola dirección'
+        )
+        try:
+            valores = json.loads(posicion)
+            if not isinstance(valores, list) or len(valores) != len(campos):
+                raise ValueError
+            valores = [
+                queryset.query.resolve_ref(campo).output_field.to_python(v)
+                for campo, v in zip(campos, valores)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        lookup = LessThan if reverse != descendente.pop() else GreaterThan
+        return lookup(
+            Fila(*[F(campo) for campo in campos]),
+            Fila(*[Value(valor) for valor in valores]),
+        )
+
+    def _get_position_from_instance(self, instance, ordering):
+        """Posición de la fila, con varios campos es la lista de sus
+        valores en JSON"""
+        if len(ordering) == 1:
+            return super()._get_position_from_instance(instance, ordering)
+
+        valores = []
+        for campo in ordering:
+            campo = campo.lstrip('-')
+            if isinstance(instance, dict):
+                valores.append(instance[campo])
+            else:
+                valores.append(getattr(instance, campo))
+
+        return json.dumps(valores)
+
+
+class AtributoCursorPagination(RecetaCursorPagination):
+    """Paginación keyset para Tags e Ingredientes. El nombre es único
+    por usuario y se recorre con el índice de (user, nombre)"""
+    ordering = '-nombre'
+    search_ordering = None
+    # Orden por popularidad con ?orden=usage_count. Muchos tags empatan
+    # en usage_count, el cursor compuesto guarda también el nombre
+    usage_ordering = ('-usage_count', '-nombre')
+
+    def get_ordering(self, request, queryset, view):
+        """Ordena por número de recetas cuando se pide"""
+        if request.query_params.get('orden') == 'usage_count':
+            return self.usage_ordering
+
+        return super().get_ordering(request, queryset, view)
@@ -2,12 +2,72 @@
 Serializers para las APIs recetas
 """
 
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
 from rest_framework import serializers
 
-from Core.models import Receta, Tag, Ingrediente
+from Core.models import (
+    Imagen,
+    Receta,
+    Tag,
+    Ingrediente,
+    receta_imagen_file_path,
+)
+from receta.cache import bump_version
+from receta.imagenes import encolar_derivados, purgar_imagenes
+
+
+def campos_dinamicos(request, disponibles):
+    """Regresa los campos pedidos por ?fields= y ?omit= en lecturas,
+    respetando el orden de los campos disponibles"""
+    campos = list(disponibles)
+    if request is None or request.method != 'GET':
+        return campos
+
+    fields = request.query_params.get('fields')
+    omit = request.query_params.get('omit')
+    if fields:
+        pedidos = {f.strip() for f in fields.split(',')}
+        campos = [c for c in campos if c in pedidos]
+    if omit:
+        omitidos = {f.strip() for f in omit.split(',')}
+        campos = [c for c in campos if c not in omitidos]
+
+    return campos
+
+
+class CamposDinamicosMixin:
+    """Recorta la salida del serializer con ?fields= y ?omit="""
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        campos = set(campos_dinamicos(request, self.fields))
+        for nombre in list(self.fields):
+            if nombre not in campos:
+                self.fields.pop(nombre)
 
-class IngredienteSerializer(serializers.ModelSerializer):
+
+class NombreUnicoMixin:
+    """Rechaza renombrar un tag o ingrediente a un nombre que el
+    usuario ya tiene, en lugar de chocar con la restricción única"""
+
+    def validate_nombre(self, value):
+        if self.instance is not None:
+            existe = type(self.instance).objects.filter(
+                user=self.instance.user_id, nombre=value,
+            ).exclude(pk=self.instance.pk).exists()
+            if existe:
+                raise serializers.ValidationError(
+                    'Ya existe un elemento con este nombre.'
+                )
+
+        return value
+
+
+class IngredienteSerializer(NombreUnicoMixin, serializers.ModelSerializer):
     """Serializer para Ingredientes"""
 
     class Meta:
@@ -16,7 +76,7 @@ class IngredienteSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(NombreUnicoMixin, serializers.ModelSerializer):
     """Serializer para Tags"""
 
     class Meta:
@@ -25,83 +85,249 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class RecetaSerializer(serializers.ModelSerializer):
+class IngredienteUsoSerializer(IngredienteSerializer):
+    """Serializer para Ingredientes con el número de recetas que
+    lo usan"""
+
+    class Meta(IngredienteSerializer.Meta):
+        fields = IngredienteSerializer.Meta.fields + ['usage_count']
+
+
+class TagUsoSerializer(TagSerializer):
+    """Serializer para Tags con el número de recetas que lo usan"""
+
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ['usage_count']
+
+
+class DerivadosField(serializers.ReadOnlyField):
+    """Convierte las rutas de los derivados {tamaño: {formato: ruta}}
+    en URLs, absolutas cuando hay petición como en ImageField"""
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        urls = {}
+        for tamano, formatos in value.items():
+            urls[tamano] = {}
+            for formato, ruta in formatos.items():
+                url = default_storage.url(ruta)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                urls[tamano][formato] = url
+
+        return urls
+
+
+class RecetaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """Serializer para Recetas"""
     tags = TagSerializer(many=True, required=False)
     ingredientes = IngredienteSerializer(many=True, required=False)
+    imagenes = DerivadosField()
 
     class Meta:
         model = Receta
         fields = [
             'id', 'titulo', 'tiempo_minutos', 'precio', 'link', 'tags',
-            'ingredientes'
+            'ingredientes', 'imagenes'
         ]
         read_only_fields = ['id']
 
-    def _get_or_create_tags(self, tags, receta):
-        """Maneja obtención o creación de tags como sea necesario"""
-        auth_user = self.context['request'].user
-        for t in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user=auth_user,
-                **t,
-            )
-            receta.tags.add(tag_obj)
-
-    def _get_or_create_ingredientes(self, ingredientes, receta):
-        """Maneja obtención o creación de ingredientes como sea necesario"""
+    def _asignar(self, relacion, items, receta, actuales=()):
+        """Resuelve y crea los nombres con un solo upsert y aplica sobre
+        la tabla intermedia solo la diferencia con los ids actuales.
+        Regresa si hubo cambios"""
         auth_user = self.context['request'].user
-        for i in ingredientes:
-            ing_obj, created = Ingrediente.objects.get_or_create(
-                user=auth_user,
-                **i,
-            )
-            receta.ingredientes.add(ing_obj)
+        field = Receta._meta.get_field(relacion)
+        model = field.related_model
+        nombres = list(dict.fromkeys(i['nombre'] for i in items))
+
+        ids, creados = model.objects.upsert_nombres(auth_user, nombres)
+
+        actuales = set(actuales)
+        objetivo = list(dict.fromkeys(ids[n] for n in nombres))
+        agregar = [pk for pk in objetivo if pk not in actuales]
+        quitar = actuales.difference(objetivo)
+        if not agregar and not quitar:
+            return False
+
+        through = field.remote_field.through
+        origen = f'{field.m2m_field_name()}_id'
+        destino = f'{field.m2m_reverse_field_name()}_id'
+        if quitar:
+            through.objects.filter(
+                **{origen: receta.pk, f'{destino}__in': quitar}
+            ).delete()
+        if agregar:
+            through.objects.bulk_create([
+                through(**{origen: receta.pk, destino: pk})
+                for pk in agregar
+            ], ignore_conflicts=True)
 
+        # La tabla intermedia se escribe sin m2m_changed, así que se
+        # tocan a mano los relacionados previos que cambiaron
+        tocados = quitar.union(agregar).difference(creados)
+        if tocados:
+            model.objects.filter(
+                pk__in=tocados
+            ).update(updated_at=timezone.now())
+        bump_version(auth_user.pk)
+
+        return True
+
+    def _actuales(self, relacion, receta):
+        """Ids relacionados hoy con la receta, leídos de la tabla
+        intermedia"""
+        field = Receta._meta.get_field(relacion)
+        return field.remote_field.through.objects.filter(
+            **{f'{field.m2m_field_name()}_id': receta.pk}
+        ).values_list(f'{field.m2m_reverse_field_name()}_id', flat=True)
+
+    @transaction.atomic
     def create(self, validated_data):
         """Crea una Receta"""
         tags = validated_data.pop('tags', [])
         ingredientes = validated_data.pop('ingredientes', [])
         receta = Receta.objects.create(**validated_data)
-        self._get_or_create_tags(tags, receta)
-        self._get_or_create_ingredientes(ingredientes, receta)
+        self._asignar('tags', tags, receta)
+        self._asignar('ingredientes', ingredientes, receta)
 
         return receta
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Modifica una receta"""
         tags = validated_data.pop('tags', None)
         ingredientes = validated_data.pop('ingredientes', None)
 
-        if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
-
-        if ingredientes is not None:
-            instance.ingredientes.clear()
-            self._get_or_create_ingredientes(ingredientes, instance)
+        relaciones_cambiadas = False
+        relaciones = {'tags': tags, 'ingredientes': ingredientes}
+        for relacion, items in relaciones.items():
+            if items is not None:
+                actuales = self._actuales(relacion, instance)
+                if self._asignar(relacion, items, instance, actuales):
+                    relaciones_cambiadas = True
 
-        for attr, vlaue in validated_data.items():
-            setattr(instance, attr, vlaue)
+        update_fields = []
+        for attr, value in validated_data.items():
+            if getattr(instance, attr) != value:
+                setattr(instance, attr, value)
+                update_fields.append(attr)
 
-        instance.save()
+        if update_fields or relaciones_cambiadas:
+            instance.save(update_fields=update_fields + ['updated_at'])
         return instance
 
 
+def _mapa_relacion(relacion, campos, ids):
+    """Regresa {receta_id: [{campo: valor}]} para una relación M2M
+    con una sola consulta sobre la tabla intermedia"""
+    field = Receta._meta.get_field(relacion)
+    origen = f'{field.m2m_field_name()}_id'
+    destino = field.m2m_reverse_field_name()
+    filas = field.remote_field.through.objects.filter(
+        **{f'{origen}__in': ids}
+    ).values_list(
+        'pk', origen, *[f'{destino}__{c}' for c in campos]
+    )
+
+    # Se ordena en Python, la página es pequeña y así la consulta
+    # no necesita un Sort en el plan
+    mapa = {}
+    for _, receta_id, *valores in sorted(filas):
+        mapa.setdefault(receta_id, []).append(dict(zip(campos, valores)))
+
+    return mapa
+
+
+class RecetaFilasListSerializer(serializers.ListSerializer):
+    """Serializa páginas de recetas a partir de filas values() y mapas
+    de relaciones precargados, sin instanciar modelos ni recorrer los
+    campos de DRF por cada receta. Produce la misma forma de JSON
+    que RecetaSerializer"""
+    # Campos cuyo valor de la base de datos ya es su representación
+    campos_directos = (serializers.CharField, serializers.IntegerField)
+
+    def to_representation(self, data):
+        filas = list(data)
+        campos = self.child.fields
+        ids = [fila['id'] for fila in filas]
+        relaciones = {
+            nombre: _mapa_relacion(
+                nombre, campos[nombre].child.Meta.fields, ids
+            ) if ids else {}
+            for nombre in ('tags', 'ingredientes') if nombre in campos
+        }
+        conversiones = {
+            nombre: None if isinstance(field, self.campos_directos)
+            else field.to_representation
+            for nombre, field in campos.items() if nombre not in relaciones
+        }
+
+        resultado = []
+        for fila in filas:
+            item = {}
+            for nombre in campos:
+                if nombre in relaciones:
+                    item[nombre] = relaciones[nombre].get(fila['id'], [])
+                    continue
+                valor = fila[nombre]
+                conversion = conversiones[nombre]
+                if conversion is not None and valor is not None:
+                    valor = conversion(valor)
+                item[nombre] = valor
+            resultado.append(item)
+
+        return resultado
+
+
+class RecetaFilasSerializer(RecetaSerializer):
+    """RecetaSerializer para listas servidas desde filas values()"""
+
+    class Meta(RecetaSerializer.Meta):
+        list_serializer_class = RecetaFilasListSerializer
+
+
 class RecetaDetailSerializer(RecetaSerializer):
     """Serializer para la vista de detalle"""
 
     class Meta(RecetaSerializer.Meta):
-        fields = RecetaSerializer.Meta.fields + ['desc', 'imagen']
+        fields = RecetaSerializer.Meta.fields + [
+            'desc', 'imagen', 'imagen_estado'
+        ]
+        # La imagen solo cambia por upload-image, que reserva el blob,
+        # encola los derivados y purga el anterior
+        read_only_fields = ['id', 'imagen', 'imagen_estado']
 
 
 class RecetaImagenSerializer(serializers.ModelSerializer):
     """Serializer para cargar imagenes a recetas"""
+    imagenes = DerivadosField()
 
     class Meta:
         model = Receta
-        fields = ['id', 'imagen']
-        read_only_fields = ['id']
+        fields = ['id', 'imagen', 'imagen_estado', 'imagenes']
+        read_only_fields = ['id', 'imagen_estado']
         extra_kwargs = {
             'imagen': {'required': 'True'}
         }
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        """Guarda el original una sola vez por contenido y programa sus
+        derivados, la petición no espera a que se generen. El archivo
+        anterior se purga si ya ninguna receta lo usa"""
+        archivo = validated_data['imagen']
+        storage = Receta._meta.get_field('imagen').storage
+        anterior = instance.imagen.name
+        Imagen.objects.reservar(storage.ruta_contenido(
+            receta_imagen_file_path(instance, archivo.name), archivo
+        ))
+        validated_data.update(
+            imagen_estado=Receta.EstadoImagen.PENDIENTE, imagenes={},
+        )
+        instance = super().update(instance, validated_data)
+        encolar_derivados(instance.pk)
+        if anterior and anterior != instance.imagen.name:
+            transaction.on_commit(lambda: purgar_imagenes([anterior]))
+
+        return instance
@@ -0,0 +1,107 @@
+"""
+Señales que mantienen updated_at e invalidan el cache de respuestas
+de recetas
+"""
+from django.db.models.signals import (
+    post_save,
+    post_delete,
+    pre_delete,
+    m2m_changed,
+)
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from Core.models import Receta, Tag, Ingrediente
+from receta.cache import bump_version
+from receta.imagenes import purgar_imagenes
+
+
+# Campo de Receta que corresponde a cada tabla intermedia
+CAMPOS_M2M = {
+    Receta.tags.through: 'tags',
+    Receta.ingredientes.through: 'ingredientes',
+}
+
+
+@receiver(post_save, sender=Receta)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingrediente)
+@receiver(post_delete, sender=Receta)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingrediente)
+def invalidar_por_escritura(sender, instance, **kwargs):
+    """Invalida el cache del dueño del objeto modificado"""
+    bump_version(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Receta.tags.through)
+@receiver(m2m_changed, sender=Receta.ingredientes.through)
+def invalidar_por_relacion(sender, instance, action, **kwargs):
+    """Invalida el cache al cambiar tags o ingredientes de una receta"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_version(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Receta.tags.through)
+@receiver(m2m_changed, sender=Receta.ingredientes.through)
+def tocar_por_relacion(sender, instance, action, reverse, model, pk_set,
+                       **kwargs):
+    """Actualiza updated_at en ambos lados de la relación para que
+    cambien los validadores de la receta y de sus tags o ingredientes"""
+    ahora = timezone.now()
+    if action in ('post_add', 'post_remove') and pk_set:
+        model.objects.filter(pk__in=pk_set).update(updated_at=ahora)
+    elif action == 'pre_clear':
+        # clear() no envía pk_set, los relacionados se tocan antes
+        # de borrar las filas intermedias
+        if reverse:
+            relacionados = Receta.objects.filter(
+                **{CAMPOS_M2M[sender]: instance}
+            )
+        else:
+            relacionados = model.objects.filter(receta=instance)
+        relacionados.update(updated_at=ahora)
+    else:
+        return
+
+    type(instance).objects.filter(pk=instance.pk).update(updated_at=ahora)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingrediente)
+def tocar_recetas_por_cambio(sender, instance, created, **kwargs):
+    """Un cambio de nombre altera la representación de sus recetas"""
+    if not created:
+        _tocar_recetas(sender, instance)
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingrediente)
+def tocar_recetas_por_eliminacion(sender, instance, **kwargs):
+    """Las recetas pierden el tag o ingrediente eliminado"""
+    _tocar_recetas(sender, instance)
+
+
+@receiver(pre_delete, sender=Receta)
+def tocar_relacionados_por_eliminacion(sender, instance, **kwargs):
+    """Los tags e ingredientes pueden dejar de estar asignados"""
+    ahora = timezone.now()
+    Tag.objects.filter(receta=instance).update(updated_at=ahora)
+    Ingrediente.objects.filter(receta=instance).update(updated_at=ahora)
+
+
+@receiver(post_delete, sender=Receta)
+def purgar_imagen_por_eliminacion(sender, instance, **kwargs):
+    """El archivo de la receta se purga si ninguna otra lo usa"""
+    if instance.imagen:
+        ruta = instance.imagen.name
+        transaction.on_commit(lambda: purgar_imagenes([ruta]))
+
+
+def _tocar_recetas(model, instance):
+    """Actualiza updated_at de las recetas que usan el objeto"""
+    campo = 'tags' if model is Tag else 'ingredientes'
+    Receta.objects.filter(
+        **{campo: instance}
+    ).update(updated_at=timezone.now())
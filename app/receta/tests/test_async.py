@@ -0,0 +1,120 @@
+"""
+Pruebas de las vistas async del despliegue ASGI
+"""
+import asyncio
+from decimal import Decimal
+import threading
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.urls import resolve, reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from Core.models import Receta, Tag
+from receta import async_views, views
+
+
+RECETAS_URL = reverse('receta:receta-list')
+TAGS_URL = reverse('receta:tag-list')
+
+
+@override_settings(ROOT_URLCONF='app.urls_asgi', ASYNC_LECTURA_INACTIVO=0.05)
+class VistasAsyncTests(TransactionTestCase):
+    """Las lecturas se ejecutan fuera del event loop y en paralelo, los
+    hilos de lectura usan sus propias conexiones por eso las pruebas no
+    corren dentro de una transacción. Los hilos del pool sobreviven a la
+    prueba y cierran sus conexiones al quedar inactivos"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass123'
+        )
+        self.auth = {
+            'AUTHORIZATION': f'Token {Token.objects.create(user=self.user)}'
+        }
+        self.receta = Receta.objects.create(
+            user=self.user,
+            titulo='Receta',
+            tiempo_minutos=10,
+            precio=Decimal('5.00'),
+        )
+        Tag.objects.create(user=self.user, nombre='Vegana')
+
+    def test_rutas_async(self):
+        """Prueba que las rutas del router resuelvan a vistas async"""
+        for url in [RECETAS_URL, TAGS_URL]:
+            with self.subTest(url=url):
+                vista = resolve(url).func
+
+                self.assertTrue(asyncio.iscoroutinefunction(vista))
+
+    async def test_lecturas_async(self):
+        """Prueba que las lecturas regresen lo mismo que las síncronas"""
+        detalle = reverse('receta:receta-detail', args=[self.receta.id])
+        res = await self.async_client.get(RECETAS_URL, **self.auth)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()['results'][0]['titulo'], 'Receta')
+
+        res = await self.async_client.get(detalle, **self.auth)
+        self.assertEqual(res.json()['id'], self.receta.id)
+
+        res = await self.async_client.get(TAGS_URL, **self.auth)
+        self.assertEqual(res.json()['results'][0]['nombre'], 'Vegana')
+
+        res = await self.async_client.get(RECETAS_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_lecturas_concurrentes(self):
+        """Prueba que dos lecturas se atiendan al mismo tiempo: cada una
+        espera a la otra antes de consultar, en serie fallaría"""
+        barrera = threading.Barrier(2, timeout=5)
+        get_queryset = views.RecetaViewSet.get_queryset
+
+        def esperar(vista):
+            barrera.wait()
+            return get_queryset(vista)
+
+        with patch.object(views.RecetaViewSet, 'get_queryset', esperar):
+            respuestas = await asyncio.gather(
+                self.async_client.get(RECETAS_URL, **self.auth),
+                self.async_client.get(f'{RECETAS_URL}?q=x', **self.auth),
+            )
+
+        for res in respuestas:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    async def test_escrituras(self):
+        """Prueba que las escrituras sigan funcionando en las rutas
+        async"""
+        res = await self.async_client.post(
+            RECETAS_URL,
+            '{"titulo": "Nueva", "tiempo_minutos": 5, "precio": "2.50"}',
+            content_type='application/json',
+            **self.auth,
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        existe = await Receta.objects.filter(titulo='Nueva').aexists()
+        self.assertTrue(existe)
+
+    async def test_cierra_conexiones_inactivas(self):
+        """Prueba que el hilo que atendió una lectura cierre su conexión
+        persistente al quedar sin peticiones"""
+        cerradas = threading.Event()
+        close_all = connections.close_all
+
+        def cerrar():
+            close_all()
+            if connections['default'].connection is None:
+                cerradas.set()
+
+        with patch.object(async_views.connections, 'close_all', cerrar):
+            res = await self.async_client.get(RECETAS_URL, **self.auth)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            listo = await asyncio.to_thread(cerradas.wait, 5)
+
+        self.assertTrue(listo)
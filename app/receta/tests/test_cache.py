@@ -0,0 +1,109 @@
+"""
+Pruebas para el cache de respuestas por usuario
+"""
+from decimal import Decimal
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from Core.models import Receta, Tag
+
+RECETAS_URL = reverse('receta:receta-list')
+TAGS_URL = reverse('receta:tag-list')
+
+
+def crear_receta(user, **params):
+    """Crea y regresa una receta de muestra"""
+    defaults = {
+        'titulo': 'Receta de muestra',
+        'tiempo_minutos': 10,
+        'precio': Decimal('5.00'),
+    }
+    defaults.update(params)
+    return Receta.objects.create(user=user, **defaults)
+
+
+class CacheRespuestasTests(TestCase):
+    """Pruebas del cache versionado de respuestas"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_segunda_lectura_sin_consultas(self):
+        """Prueba que la misma petición se sirva desde el cache"""
+        crear_receta(self.user)
+        res1 = self.client.get(RECETAS_URL)
+
+        with self.assertNumQueries(0):
+            res2 = self.client.get(RECETAS_URL)
+
+        self.assertEqual(res2.status_code, status.HTTP_200_OK)
+        self.assertEqual(res1.data, res2.data)
+
+    def test_parametros_distintos_no_comparten_entrada(self):
+        """Prueba que los parámetros formen parte de la clave"""
+        tag = Tag.objects.create(user=self.user, nombre='Cena')
+        receta = crear_receta(self.user)
+        receta.tags.add(tag)
+        crear_receta(self.user, titulo='Sin tag')
+
+        res_todas = self.client.get(RECETAS_URL)
+        res_filtro = self.client.get(RECETAS_URL, {'tags': tag.id})
+
+        self.assertEqual(len(res_todas.data['results']), 2)
+        self.assertEqual(len(res_filtro.data['results']), 1)
+
+    def test_escritura_invalida_cache(self):
+        """Prueba que crear un objeto invalide las respuestas"""
+        self.client.get(TAGS_URL)
+        Tag.objects.create(user=self.user, nombre='Nuevo')
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_cambio_m2m_invalida_cache(self):
+        """Prueba que asignar un tag a una receta invalide las respuestas"""
+        receta = crear_receta(self.user)
+        tag = Tag.objects.create(user=self.user, nombre='Cena')
+        url = reverse('receta:receta-detail', args=[receta.id])
+        self.client.get(url)
+
+        receta.tags.add(tag)
+        res = self.client.get(url)
+
+        self.assertEqual(res.data['tags'], [{'id': tag.id, 'nombre': 'Cena'}])
+
+    def test_cache_aislado_por_usuario(self):
+        """Prueba que un usuario no reciba respuestas de otro"""
+        otro = get_user_model().objects.create_user(
+            'otro@example.com', 'testpass123'
+        )
+        crear_receta(otro)
+        otro_client = APIClient()
+        otro_client.force_authenticate(user=otro)
+        otro_client.get(RECETAS_URL)
+
+        res = self.client.get(RECETAS_URL)
+
+        self.assertEqual(res.data['results'], [])
+
+    def test_escritura_de_otro_usuario_conserva_cache(self):
+        """Prueba que la escritura de otro usuario no invalide
+        el cache propio"""
+        otro = get_user_model().objects.create_user(
+            'otro@example.com', 'testpass123'
+        )
+        self.client.get(TAGS_URL)
+        Tag.objects.create(user=otro, nombre='Ajeno')
+
+        with self.assertNumQueries(0):
+            self.client.get(TAGS_URL)
@@ -0,0 +1,120 @@
+"""
+Pruebas para GET condicional con ETag y Last-Modified
+"""
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from Core.models import Receta, Tag
+from receta.serializers import RecetaDetailSerializer
+
+RECETAS_URL = reverse('receta:receta-list')
+TAGS_URL = reverse('receta:tag-list')
+
+
+def detail_url(receta_id):
+    """Crea y retorna una URL para el detalle de receta"""
+    return reverse('receta:receta-detail', args=[receta_id])
+
+
+def crear_receta(user, **params):
+    """Crea y regresa una receta de muestra"""
+    defaults = {
+        'titulo': 'Receta de muestra',
+        'tiempo_minutos': 10,
+        'precio': Decimal('5.00'),
+    }
+    defaults.update(params)
+    return Receta.objects.create(user=user, **defaults)
+
+
+class ConditionalGetTests(TestCase):
+    """Pruebas de validadores y respuestas 304"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.receta = crear_receta(self.user)
+
+    def test_respuesta_incluye_validadores(self):
+        """Prueba que lista y detalle incluyan ETag y Last-Modified"""
+        Tag.objects.create(user=self.user, nombre='Cena')
+        for url in (RECETAS_URL, detail_url(self.receta.id), TAGS_URL):
+            res = self.client.get(url)
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertIn('ETag', res)
+            self.assertIn('Last-Modified', res)
+
+    def test_if_none_match_regresa_304_sin_serializar(self):
+        """Prueba que un ETag vigente regrese 304 sin serializar"""
+        url = detail_url(self.receta.id)
+        etag = self.client.get(url)['ETag']
+        cache.clear()
+
+        with patch.object(
+            RecetaDetailSerializer, 'to_representation'
+        ) as mock_repr, self.assertNumQueries(1):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+        self.assertEqual(res.content, b'')
+        mock_repr.assert_not_called()
+
+    def test_if_modified_since_regresa_304(self):
+        """Prueba que If-Modified-Since regrese 304 sin cambios"""
+        last_modified = self.client.get(RECETAS_URL)['Last-Modified']
+
+        res = self.client.get(
+            RECETAS_URL, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_cambio_m2m_cambia_etag(self):
+        """Prueba que asignar un tag cambie el ETag de la receta"""
+        url = detail_url(self.receta.id)
+        etag = self.client.get(url)['ETag']
+
+        self.receta.tags.add(Tag.objects.create(user=self.user, nombre='X'))
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_cambio_nombre_tag_cambia_etag_receta(self):
+        """Prueba que renombrar un tag cambie el ETag de sus recetas"""
+        tag = Tag.objects.create(user=self.user, nombre='Cena')
+        self.receta.tags.add(tag)
+        url = detail_url(self.receta.id)
+        etag = self.client.get(url)['ETag']
+
+        self.client.patch(
+            reverse('receta:tag-detail', args=[tag.id]), {'nombre': 'Lunch'}
+        )
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['tags'][0]['nombre'], 'Lunch')
+
+    def test_eliminar_receta_cambia_etag_lista(self):
+        """Prueba que eliminar una receta cambie el ETag de la lista"""
+        crear_receta(self.user)
+        etag = self.client.get(RECETAS_URL)['ETag']
+
+        self.client.delete(detail_url(self.receta.id))
+        res = self.client.get(RECETAS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 1)
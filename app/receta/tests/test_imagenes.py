@@ -0,0 +1,188 @@
+"""
+Pruebas de la generación de derivados de imágenes de recetas
+"""
+from decimal import Decimal
+from io import BytesIO, StringIO
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from Core.models import Receta
+from receta import imagenes
+
+
+def archivo_imagen(size=(1600, 1200), formato='JPEG', modo='RGB'):
+    """Crea un archivo de imagen en memoria para cargar"""
+    buffer = BytesIO()
+    Image.new(modo, size, 'red').save(buffer, formato)
+    extension = formato.lower()
+    return SimpleUploadedFile(f'foto.{extension}', buffer.getvalue())
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, IMAGEN_WORKERS=0)
+class DerivadosImagenTests(TestCase):
+    """Pruebas del pipeline de miniaturas y derivados WebP/JPEG"""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.receta = Receta.objects.create(
+            user=self.user,
+            titulo='Receta',
+            tiempo_minutos=10,
+            precio=Decimal('5.00'),
+        )
+        self.url = reverse('receta:receta-upload-image', args=[self.receta.id])
+
+    def test_carga_regresa_antes_de_generar(self):
+        """Prueba que la carga responda con el estado pendiente y los
+        derivados se generen al confirmar la transacción"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            res = self.client.post(
+                self.url, {'imagen': archivo_imagen()}, format='multipart'
+            )
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data['imagen_estado'], 'pendiente')
+        self.assertEqual(res.data['imagenes'], {})
+        self.receta.refresh_from_db()
+        self.assertEqual(self.receta.imagen_estado, 'pendiente')
+
+        for callback in callbacks:
+            callback()
+
+        self.receta.refresh_from_db()
+        self.assertEqual(self.receta.imagen_estado, 'lista')
+        storage = self.receta.imagen.storage
+        for tamano, caja in imagenes.TAMANOS.items():
+            for formato, (nombre_pil, _) in imagenes.FORMATOS.items():
+                ruta = self.receta.imagenes[tamano][formato]
+                with storage.open(ruta) as archivo, Image.open(archivo) as img:
+                    self.assertEqual(img.format, nombre_pil)
+                    self.assertLessEqual(img.width, caja[0])
+                    self.assertLessEqual(img.height, caja[1])
+
+    def test_urls_de_derivados_en_respuestas(self):
+        """Prueba que detalle y listado expongan las URLs"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                self.url, {'imagen': archivo_imagen()}, format='multipart'
+            )
+
+        detalle = self.client.get(
+            reverse('receta:receta-detail', args=[self.receta.id])
+        )
+        lista = self.client.get(reverse('receta:receta-list'))
+
+        self.assertEqual(detalle.data['imagen_estado'], 'lista')
+        miniatura = detalle.data['imagenes']['miniatura']['webp']
+        self.assertTrue(miniatura.startswith('http://testserver/'))
+        self.assertTrue(miniatura.endswith('/miniatura.webp'))
+        self.assertEqual(
+            lista.data['results'][0]['imagenes'], detalle.data['imagenes']
+        )
+
+    def test_png_transparente(self):
+        """Prueba que una imagen con transparencia genere JPEG"""
+        archivo = archivo_imagen((400, 400), formato='PNG', modo='RGBA')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, {'imagen': archivo}, format='multipart')
+
+        self.receta.refresh_from_db()
+        self.assertEqual(self.receta.imagen_estado, 'lista')
+        self.assertIn('jpeg', self.receta.imagenes['mediana'])
+
+    def test_imagen_ilegible_queda_en_error(self):
+        """Prueba que un original ilegible marque el estado de error"""
+        self.receta.imagen.save('rota.jpg', BytesIO(b'no es imagen'))
+
+        with self.assertLogs('receta.imagenes', 'ERROR'):
+            imagenes.generar_derivados(self.receta.id)
+
+        self.receta.refresh_from_db()
+        self.assertEqual(self.receta.imagen_estado, 'error')
+        self.assertEqual(self.receta.imagenes, {})
+
+    def test_descarta_resultado_de_imagen_reemplazada(self):
+        """Prueba que no se guarden derivados de una imagen que fue
+        reemplazada mientras se procesaba"""
+        self.receta.imagen.save('vieja.jpg', archivo_imagen())
+        abrir = imagenes._abrir
+
+        def reemplazar(archivo):
+            Receta.objects.filter(pk=self.receta.pk).update(
+                imagen='uploads/receta/nueva.jpg',
+                imagen_estado='pendiente',
+            )
+            return abrir(archivo)
+
+        with patch('receta.imagenes._abrir', side_effect=reemplazar):
+            imagenes.generar_derivados(self.receta.id, forzar=True)
+
+        self.receta.refresh_from_db()
+        self.assertEqual(self.receta.imagen_estado, 'pendiente')
+        self.assertEqual(self.receta.imagenes, {})
+
+    def test_encolar_en_pool(self):
+        """Prueba que con workers la generación se envíe al pool"""
+        with override_settings(IMAGEN_WORKERS=2), \
+                patch('receta.imagenes.get_pool') as pool, \
+                self.captureOnCommitCallbacks(execute=True):
+            imagenes.encolar_derivados(self.receta.id)
+
+        pool.return_value.submit.assert_called_once_with(
+            imagenes._tarea, self.receta.id
+        )
+
+    def test_comando_procesar_imagenes(self):
+        """Prueba que el comando procese las imágenes pendientes"""
+        self.receta.imagen.save('foto.jpg', archivo_imagen())
+        salida = StringIO()
+
+        call_command('procesar_imagenes', workers=1, stdout=salida)
+
+        self.receta.refresh_from_db()
+        self.assertEqual(self.receta.imagen_estado, 'lista')
+        self.assertIn('1 imágenes procesadas, 0 con error', salida.getvalue())
+
+    def test_comando_procesar_imagenes_todas(self):
+        """Prueba que --todas reescriba los derivados de imágenes ya
+        procesadas y sin él se omitan"""
+        self.receta.imagen.save('foto.jpg', archivo_imagen())
+        call_command('procesar_imagenes', workers=1, stdout=StringIO())
+
+        with patch(
+            'receta.imagenes._escribir_derivados',
+            wraps=imagenes._escribir_derivados,
+        ) as escribir:
+            call_command('procesar_imagenes', workers=1, stdout=StringIO())
+            self.assertEqual(escribir.call_count, 0)
+
+            call_command(
+                'procesar_imagenes', todas=True, workers=1, stdout=StringIO()
+            )
+            self.assertEqual(escribir.call_count, 1)
+
+        self.receta.refresh_from_db()
+        self.assertEqual(self.receta.imagen_estado, 'lista')
@@ -17,6 +17,7 @@ from receta.serializers import (
 )
 
 INGREDIENTE_URL = reverse('receta:ingrediente-list')
+AUTOCOMPLETAR_URL = reverse('receta:ingrediente-autocompletar')
 
 
 def detail_url(ingrediente_id):
@@ -60,7 +61,7 @@ class PrivateIngredienteAPITests(TestCase):
         ingredientes = Ingrediente.objects.all().order_by("-nombre")
         serializer = IngredienteSerializer(ingredientes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_ingredientes_limitados_por_usuario(self):
         """Prueba la recuperación de una lista de ingredientes
@@ -78,9 +79,9 @@ class PrivateIngredienteAPITests(TestCase):
         res = self.client.get(INGREDIENTE_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['nombre'], ingrediente.nombre)
-        self.assertEqual(res.data[0]['id'], ingrediente.id)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['nombre'], ingrediente.nombre)
+        self.assertEqual(res.data['results'][0]['id'], ingrediente.id)
 
     def test_modificar_ingrediente(self):
         """Prueba de modificación del ingrediente"""
@@ -131,8 +132,8 @@ class PrivateIngredienteAPITests(TestCase):
         s2 = IngredienteSerializer(ing2)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertIn(s1.data, res.data)
-        self.assertNotIn(s2.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertNotIn(s2.data, res.data['results'])
 
     def test_filtrado_ingredientes_unicos(self):
         """Prueba que los ingredientes filtrados no
@@ -158,4 +159,36 @@ class PrivateIngredienteAPITests(TestCase):
         res = self.client.get(INGREDIENTE_URL, {'asignado': 1})
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_ingredientes_con_usage_count(self):
+        """Prueba que usage_count cuente las recetas de cada
+        ingrediente y que permita ordenar por popularidad"""
+        ing1 = Ingrediente.objects.create(user=self.user, nombre='Manzana')
+        ing2 = Ingrediente.objects.create(user=self.user, nombre='Pavo')
+        for i in range(2):
+            receta = Receta.objects.create(
+                titulo=f'Receta {i}',
+                tiempo_minutos=5,
+                precio=Decimal('4.50'),
+                user=self.user
+            )
+            receta.ingredientes.add(ing1)
+
+        res = self.client.get(INGREDIENTE_URL, {'orden': 'usage_count'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [
+            {'id': ing1.id, 'nombre': 'Manzana', 'usage_count': 2},
+            {'id': ing2.id, 'nombre': 'Pavo', 'usage_count': 0},
+        ])
+
+    def test_autocompletar_ingredientes(self):
+        """Prueba el autocompletado de ingredientes por prefijo"""
+        ing = Ingrediente.objects.create(user=self.user, nombre='Tomate')
+        Ingrediente.objects.create(user=self.user, nombre='Cebolla')
+
+        res = self.client.get(AUTOCOMPLETAR_URL, {'q': 'tom'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [IngredienteSerializer(ing).data])
@@ -4,10 +4,15 @@ Pruebas para el API de Recetas
 from decimal import Decimal
 import tempfile
 import os
+import threading
+from unittest.mock import patch
 
 from PIL import Image
 
-from django.test import TestCase
+from django.db import connection
+from django.db.models import Prefetch
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
@@ -20,6 +25,7 @@ from receta.serializers import (
     RecetaSerializer,
     RecetaDetailSerializer,
 )
+from receta.pagination import RecetaCursorPagination
 
 RECETAS_URL = reverse('receta:receta-list')
 
@@ -90,7 +96,7 @@ class PrivateRecetaAPITests(TestCase):
         serializer = RecetaSerializer(recetas, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_lista_recetas_limitada_por_usuario(self):
         """Prueba la recuperación de una lista de recetas
@@ -107,9 +113,9 @@ class PrivateRecetaAPITests(TestCase):
         res = self.client.get(RECETAS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['titulo'], receta.titulo)
-        self.assertEqual(res.data[0]['id'], receta.id)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['titulo'], receta.titulo)
+        self.assertEqual(res.data['results'][0]['id'], receta.id)
 
     def test_get_receta_detalle(self):
         """Prueba de obtención del detalle de la receta"""
@@ -419,6 +425,132 @@ class PrivateRecetaAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(receta.ingredientes.count(), 0)
 
+    def _payload_relacionados(self, n):
+        """Receta con n tags existentes y n ingredientes nuevos"""
+        Tag.objects.bulk_create([
+            Tag(user=self.user, nombre=f'Tag {n}-{i}') for i in range(n)
+        ])
+        return {
+            'titulo': f'Receta {n}',
+            'tiempo_minutos': 10,
+            'precio': Decimal('2.50'),
+            'tags': [{'nombre': f'Tag {n}-{i}'} for i in range(n)],
+            'ingredientes': [
+                {'nombre': f'Ingrediente {n}-{i}'} for i in range(n)
+            ],
+        }
+
+    def test_crear_receta_consultas_constantes(self):
+        """Prueba que crear una receta no dependa del número de
+        tags e ingredientes en consultas"""
+        for n in (1, 10, 100):
+            payload = self._payload_relacionados(n)
+            with self.subTest(n=n), self.assertNumQueries(10):
+                res = self.client.post(RECETAS_URL, payload, format='json')
+
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            receta = Receta.objects.get(id=res.data['id'])
+            self.assertEqual(receta.tags.count(), n)
+            self.assertEqual(receta.ingredientes.count(), n)
+            self.assertEqual(
+                Tag.objects.filter(nombre__startswith=f'Tag {n}-').count(), n
+            )
+
+    def test_modificar_receta_consultas_constantes(self):
+        """Prueba que reemplazar tags e ingredientes de una receta no
+        dependa de su número en consultas"""
+        receta = crear_receta(user=self.user)
+        for n in (1, 10, 100):
+            receta.tags.set([
+                Tag.objects.create(user=self.user, nombre=f'X {n}')
+            ])
+            receta.ingredientes.set([
+                Ingrediente.objects.create(user=self.user, nombre=f'X {n}')
+            ])
+            payload = self._payload_relacionados(n)
+            with self.subTest(n=n), self.assertNumQueries(16):
+                res = self.client.put(
+                    detail_url(receta.id), payload, format='json'
+                )
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(receta.tags.count(), n)
+            self.assertEqual(receta.ingredientes.count(), n)
+
+    def test_modificar_receta_sin_cambios_no_escribe(self):
+        """Prueba que reenviar los mismos datos no escriba en la base"""
+        receta = crear_receta(user=self.user)
+        receta.tags.add(Tag.objects.create(user=self.user, nombre='Cena'))
+        payload = {
+            'titulo': receta.titulo,
+            'tiempo_minutos': receta.tiempo_minutos,
+            'precio': receta.precio,
+            'link': receta.link,
+            'tags': [{'nombre': 'Cena'}],
+            'ingredientes': [],
+        }
+        with CaptureQueriesContext(connection) as consultas:
+            res = self.client.put(
+                detail_url(receta.id), payload, format='json'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        escrituras = [
+            q['sql'] for q in consultas
+            if q['sql'].split()[0] in ('INSERT', 'UPDATE', 'DELETE')
+        ]
+        self.assertEqual(escrituras, [])
+
+    def test_modificar_receta_solo_diferencia(self):
+        """Prueba que solo se borren e inserten las relaciones que
+        cambiaron y se guarden solo los campos modificados"""
+        receta = crear_receta(user=self.user)
+        cena = Tag.objects.create(user=self.user, nombre='Cena')
+        postre = Tag.objects.create(user=self.user, nombre='Postre')
+        receta.tags.add(cena, postre)
+        through = Receta.tags.through
+        fila_cena = through.objects.get(receta=receta, tag=cena)
+
+        payload = {
+            'titulo': 'Cambiado',
+            'tags': [{'nombre': 'Cena'}, {'nombre': 'Vegano'}],
+        }
+        with CaptureQueriesContext(connection) as consultas:
+            res = self.client.patch(
+                detail_url(receta.id), payload, format='json'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(through.objects.filter(pk=fila_cena.pk).exists())
+        self.assertEqual(
+            sorted(receta.tags.values_list('nombre', flat=True)),
+            ['Cena', 'Vegano'],
+        )
+        self.assertEqual(
+            dict(Tag.objects.values_list('nombre', 'usage_count')),
+            {'Cena': 1, 'Postre': 0, 'Vegano': 1},
+        )
+        update = [
+            q['sql'] for q in consultas
+            if q['sql'].lower().startswith('update "core_receta"')
+        ]
+        self.assertEqual(len(update), 1)
+        self.assertNotIn('"precio"', update[0])
+
+    def test_crear_receta_con_nombres_repetidos(self):
+        """Prueba que un nombre repetido en la petición se cree una vez"""
+        payload = {
+            'titulo': 'Nuevo Titulo',
+            'tiempo_minutos': 10,
+            'precio': Decimal('2.50'),
+            'tags': [{'nombre': 'Cena'}, {'nombre': 'Cena'}],
+        }
+        res = self.client.post(RECETAS_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Tag.objects.filter(nombre='Cena').count(), 1)
+        self.assertEqual(len(res.data['tags']), 1)
+
     def test_filtrar_por_tags(self):
         """Prueba de filtrado de recetas por tags"""
         r1 = crear_receta(user=self.user, titulo='Hamburguesa')
@@ -437,9 +569,9 @@ class PrivateRecetaAPITests(TestCase):
         s3 = RecetaSerializer(r3)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
 
     def test_filtrar_por_ingredientes(self):
         """Prueba de filtrado de recetas por ingredientes"""
@@ -459,9 +591,220 @@ class PrivateRecetaAPITests(TestCase):
         s3 = RecetaSerializer(r3)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
+
+    def test_filtrar_por_tags_sin_duplicados(self):
+        """Prueba que una receta con varios tags filtrados
+        aparezca una sola vez"""
+        receta = crear_receta(user=self.user)
+        tag1 = Tag.objects.create(user=self.user, nombre='Cena')
+        tag2 = Tag.objects.create(user=self.user, nombre='Vegano')
+        receta.tags.add(tag1, tag2)
+
+        params = {'tags': f'{tag1.id},{tag2.id}'}
+        res = self.client.get(RECETAS_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_filtrar_match_all(self):
+        """Prueba que match=all regrese solo las recetas que tienen
+        todos los tags e ingredientes pedidos"""
+        tag1 = Tag.objects.create(user=self.user, nombre='Cena')
+        tag2 = Tag.objects.create(user=self.user, nombre='Vegano')
+        ing = Ingrediente.objects.create(user=self.user, nombre='Tofu')
+        r1 = crear_receta(user=self.user, titulo='Tofu salteado')
+        r1.tags.add(tag1, tag2)
+        r1.ingredientes.add(ing)
+        r2 = crear_receta(user=self.user, titulo='Ensalada')
+        r2.tags.add(tag2)
+        r2.ingredientes.add(ing)
+        r3 = crear_receta(user=self.user, titulo='Pasta')
+        r3.tags.add(tag1, tag2)
+
+        params = {
+            'tags': f'{tag1.id},{tag2.id}',
+            'ingredientes': f'{ing.id}',
+            'match': 'all',
+        }
+        res = self.client.get(RECETAS_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [r['id'] for r in res.data['results']]
+        self.assertEqual(ids, [r1.id])
+
+    def test_busqueda_texto(self):
+        """Prueba la búsqueda de texto completo sobre titulo y desc"""
+        r1 = crear_receta(user=self.user, titulo='Sopa de tomate', desc='')
+        r2 = crear_receta(
+            user=self.user,
+            titulo='Ensalada',
+            desc='Con tomates frescos',
+        )
+        crear_receta(user=self.user, titulo='Pan de yuca', desc='Horneado')
+
+        res = self.client.get(RECETAS_URL, {'q': 'tomate'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [r['id'] for r in res.data['results']]
+        self.assertEqual(ids, [r1.id, r2.id])
+
+    def test_busqueda_texto_actualiza_vector(self):
+        """Prueba que modificar el titulo actualice el vector de búsqueda"""
+        receta = crear_receta(user=self.user, titulo='Encebollado', desc='')
+
+        url = detail_url(receta.id)
+        self.client.patch(url, {'titulo': 'Bolón de verde'})
+        res = self.client.get(RECETAS_URL, {'q': 'bolón'})
+
+        ids = [r['id'] for r in res.data['results']]
+        self.assertEqual(ids, [receta.id])
+        res = self.client.get(RECETAS_URL, {'q': 'encebollado'})
+        self.assertEqual(res.data['results'], [])
+
+    def test_busqueda_texto_con_filtros_y_paginas(self):
+        """Prueba combinar la búsqueda con el filtro de tags
+        y recorrer las páginas ordenadas por relevancia"""
+        tag = Tag.objects.create(user=self.user, nombre='Cena')
+        esperados = []
+        for i in range(3):
+            receta = crear_receta(user=self.user, titulo=f'Arroz {i}')
+            receta.tags.add(tag)
+            esperados.append(receta.id)
+        crear_receta(user=self.user, titulo='Arroz sin tag')
+
+        params = {'q': 'arroz', 'tags': f'{tag.id}', 'page_size': 2}
+        res = self.client.get(RECETAS_URL, params)
+        vistos = [r['id'] for r in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            vistos += [r['id'] for r in res.data['results']]
+
+        self.assertEqual(sorted(vistos), sorted(esperados))
+        self.assertEqual(len(vistos), len(esperados))
+
+    def test_busqueda_texto_empates_de_relevancia(self):
+        """Prueba recorrer más recetas con la misma relevancia que el
+        desplazamiento máximo del cursor de DRF, en ambas direcciones"""
+        recetas = Receta.objects.bulk_create([
+            Receta(
+                user=self.user,
+                titulo='Sopa de tomate',
+                tiempo_minutos=10,
+                precio=Decimal('5.00'),
+            )
+            for _ in range(RecetaCursorPagination.offset_cutoff + 500)
+        ])
+        ids = sorted([r.id for r in recetas], reverse=True)
+
+        params = {'q': 'sopa', 'page_size': 200}
+        res = self.client.get(RECETAS_URL, params)
+        vistos = [r['id'] for r in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            vistos += [r['id'] for r in res.data['results']]
+
+        self.assertEqual(vistos, ids)
+        vistos = [r['id'] for r in res.data['results']]
+        while res.data['previous']:
+            res = self.client.get(res.data['previous'])
+            vistos = [r['id'] for r in res.data['results']] + vistos
+        self.assertEqual(vistos, ids)
+
+    def test_lista_desde_filas_igual_a_serializer(self):
+        """Prueba que la lista servida desde filas values() tenga la
+        misma forma que RecetaSerializer"""
+        receta = crear_receta(user=self.user, precio=Decimal('7.5'))
+        for nombre in ['Cena', 'Vegano']:
+            receta.tags.add(Tag.objects.create(user=self.user, nombre=nombre))
+        receta.ingredientes.add(
+            Ingrediente.objects.create(user=self.user, nombre='Tofu')
+        )
+        crear_receta(user=self.user, titulo='Sin relaciones')
+
+        res = self.client.get(RECETAS_URL)
+
+        recetas = Receta.objects.order_by('-id').prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.order_by('id')),
+            'ingredientes',
+        )
+        serializer = RecetaSerializer(recetas, many=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], serializer.data)
+        self.assertEqual(res.json()['results'][1]['precio'], '7.50')
+
+    def test_campos_dispersos_lista(self):
+        """Prueba que ?fields= recorte la respuesta y no consulte
+        columnas ni relaciones que no se piden"""
+        receta = crear_receta(user=self.user)
+        receta.tags.add(Tag.objects.create(user=self.user, nombre='Cena'))
+
+        with CaptureQueriesContext(connection) as consultas:
+            res = self.client.get(RECETAS_URL, {'fields': 'id,titulo'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data['results'],
+            [{'id': receta.id, 'titulo': receta.titulo}],
+        )
+        sql = ' '.join(q['sql'] for q in consultas.captured_queries)
+        self.assertNotIn('"Core_tag"', sql)
+        self.assertNotIn('"precio"', sql)
+
+    def test_campos_omitidos_detalle(self):
+        """Prueba que ?omit= quite campos del detalle"""
+        receta = crear_receta(user=self.user)
+
+        url = detail_url(receta.id)
+        res = self.client.get(url, {'omit': 'desc,imagen,ingredientes'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('desc', res.data)
+        self.assertNotIn('imagen', res.data)
+        self.assertNotIn('ingredientes', res.data)
+        self.assertEqual(res.data['titulo'], receta.titulo)
+        self.assertIn('tags', res.data)
+
+    def test_campos_dispersos_no_afectan_escritura(self):
+        """Prueba que ?fields= no limite los campos al modificar"""
+        receta = crear_receta(user=self.user)
+
+        url = f'{detail_url(receta.id)}?fields=id'
+        res = self.client.patch(url, {'titulo': 'Nuevo'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        receta.refresh_from_db()
+        self.assertEqual(receta.titulo, 'Nuevo')
+        self.assertIn('titulo', res.data)
+
+    def test_paginacion_por_cursor(self):
+        """Prueba que las páginas por cursor recorran todas
+        las recetas en orden -id sin repetirse"""
+        recetas = [crear_receta(user=self.user) for _ in range(5)]
+        ids = sorted([r.id for r in recetas], reverse=True)
+
+        res = self.client.get(RECETAS_URL, {'page_size': 2})
+        vistos = [r['id'] for r in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            vistos += [r['id'] for r in res.data['results']]
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(vistos, ids)
+
+    def test_paginacion_tamano_maximo(self):
+        """Prueba que page_size no supere el máximo configurado"""
+        for _ in range(3):
+            crear_receta(user=self.user)
+
+        with patch.object(RecetaCursorPagination, 'max_page_size', 2):
+            res = self.client.get(RECETAS_URL, {'page_size': 100})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertIsNotNone(res.data['next'])
 
 
 class ImageUploadTest(TestCase):
@@ -495,6 +838,22 @@ class ImageUploadTest(TestCase):
         self.assertIn('imagen', res.data)
         self.assertTrue(os.path.exists(self.receta.imagen.path))
 
+    def test_detalle_no_cambia_imagen(self):
+        """Prueba que PATCH al detalle ignore la imagen, solo
+        upload-image la reemplaza"""
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (10, 10)).save(image_file, format='JPEG')
+            image_file.seek(0)
+            payload = {'titulo': 'Nuevo', 'imagen': image_file}
+            res = self.client.patch(
+                detail_url(self.receta.id), payload, format='multipart'
+            )
+
+        self.receta.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.receta.titulo, 'Nuevo')
+        self.assertFalse(self.receta.imagen)
+
     def test_upload_image_bad_request(self):
         """Prueba la carga de una imagen ivalida"""
         url = image_upload_url(self.receta.id)
@@ -502,3 +861,88 @@ class ImageUploadTest(TestCase):
         res = self.client.post(url, payload, format='multipart')
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ConcurrenciaRecetaAPITests(TransactionTestCase):
+    """Pruebas de escrituras concurrentes del mismo usuario"""
+
+    def test_crear_recetas_concurrentes_sin_duplicados(self):
+        """Prueba que peticiones simultáneas con los mismos nombres
+        nuevos no dupliquen tags ni ingredientes"""
+        user = crear_usuario(correo='test@example.com', password='pass123')
+        payload = {
+            'titulo': 'Concurrente',
+            'tiempo_minutos': 10,
+            'precio': Decimal('2.50'),
+            'tags': [{'nombre': f'Tag {i}'} for i in range(20)],
+            'ingredientes': [{'nombre': f'Ing {i}'} for i in range(20)],
+        }
+        barrera = threading.Barrier(4)
+        codigos = []
+
+        def crear():
+            client = APIClient()
+            client.force_authenticate(user=user)
+            barrera.wait()
+            try:
+                res = client.post(RECETAS_URL, payload, format='json')
+                codigos.append(res.status_code)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=crear) for _ in range(4)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(codigos, [status.HTTP_201_CREATED] * 4)
+        self.assertEqual(Tag.objects.filter(user=user).count(), 20)
+        self.assertEqual(Ingrediente.objects.filter(user=user).count(), 20)
+        for receta in Receta.objects.filter(user=user):
+            self.assertEqual(receta.tags.count(), 20)
+
+    def test_crear_recetas_concurrentes_orden_inverso(self):
+        """Prueba que peticiones simultáneas con los mismos nombres
+        nuevos en distinto orden no queden en deadlock. Todas llegan al
+        upsert al mismo tiempo"""
+        user = crear_usuario(correo='test@example.com', password='pass123')
+        nombres = [f'Tag {i}' for i in range(500)]
+        barrera = threading.Barrier(4, timeout=10)
+        codigos = []
+        upsert_nombres = Tag.objects.upsert_nombres
+
+        def upsert(*args):
+            barrera.wait()
+            return upsert_nombres(*args)
+
+        def crear(orden):
+            client = APIClient()
+            client.force_authenticate(user=user)
+            payload = {
+                'titulo': 'Concurrente',
+                'tiempo_minutos': 10,
+                'precio': Decimal('2.50'),
+                'tags': [{'nombre': nombre} for nombre in orden],
+            }
+            try:
+                res = client.post(RECETAS_URL, payload, format='json')
+                codigos.append(res.status_code)
+            finally:
+                connection.close()
+
+        hilos = [
+            threading.Thread(
+                target=crear,
+                args=[nombres if i % 2 else nombres[::-1]],
+            )
+            for i in range(4)
+        ]
+        with patch.object(Tag.objects, 'upsert_nombres', upsert):
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+
+        self.assertEqual(codigos, [status.HTTP_201_CREATED] * 4)
+        self.assertEqual(Tag.objects.filter(user=user).count(), 500)
@@ -2,6 +2,7 @@
 Pruebas para el API de Tags
 """
 from decimal import Decimal
+from unittest.mock import patch
 
 from django.test import TestCase
 from django.contrib.auth import get_user_model
@@ -15,8 +16,11 @@ from Core.models import Tag, Receta
 from receta.serializers import (
     TagSerializer,
 )
+from receta.pagination import AtributoCursorPagination
+from receta.views import TagViewSet
 
 TAGS_URL = reverse('receta:tag-list')
+AUTOCOMPLETAR_URL = reverse('receta:tag-autocompletar')
 
 
 def detail_url(tag_id):
@@ -61,7 +65,7 @@ class PrivateTagAPITests(TestCase):
         serializer = TagSerializer(tags, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_lista_tags_limitada_por_usuario(self):
         """Prueba la recuperación de una lista de tags
@@ -76,9 +80,9 @@ class PrivateTagAPITests(TestCase):
         res = self.client.get(TAGS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['nombre'], tag.nombre)
-        self.assertEqual(res.data[0]['id'], tag.id)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['nombre'], tag.nombre)
+        self.assertEqual(res.data['results'][0]['id'], tag.id)
 
     def test_modificar_tag(self):
         """Prueba de modificación del tag"""
@@ -121,8 +125,8 @@ class PrivateTagAPITests(TestCase):
         s2 = TagSerializer(tag2)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertIn(s1.data, res.data)
-        self.assertNotIn(s2.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertNotIn(s2.data, res.data['results'])
 
     def test_filtrado_tags_unicos(self):
         """Prueba que los tags filtrados no
@@ -148,4 +152,171 @@ class PrivateTagAPITests(TestCase):
         res = self.client.get(TAGS_URL, {'asignado': 1})
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_tags_con_usage_count(self):
+        """Prueba que usage_count cuente las recetas de cada tag"""
+        tag1 = Tag.objects.create(user=self.user, nombre='Cena')
+        tag2 = Tag.objects.create(user=self.user, nombre='Almuerzo')
+        for i in range(3):
+            receta = Receta.objects.create(
+                titulo=f'Receta {i}',
+                tiempo_minutos=10,
+                precio=Decimal('5.00'),
+                user=self.user
+            )
+            receta.tags.add(tag1)
+
+        res = self.client.get(TAGS_URL, {'usage_count': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [
+            {'id': tag1.id, 'nombre': 'Cena', 'usage_count': 3},
+            {'id': tag2.id, 'nombre': 'Almuerzo', 'usage_count': 0},
+        ])
+
+    def test_tags_sin_usage_count_por_defecto(self):
+        """Prueba que usage_count solo se incluya cuando se pide"""
+        Tag.objects.create(user=self.user, nombre='Cena')
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertNotIn('usage_count', res.data['results'][0])
+
+    def test_paginacion_tags_por_usage_count(self):
+        """Prueba que el orden por usage_count pagine sin repetir ni
+        omitir tags, con empates resueltos por nombre"""
+        tags = [
+            Tag.objects.create(user=self.user, nombre=f'Tag {i}')
+            for i in range(5)
+        ]
+        for i, tag in enumerate(tags[:3]):
+            for j in range(i + 1):
+                receta = Receta.objects.create(
+                    titulo=f'Receta {i} {j}',
+                    tiempo_minutos=10,
+                    precio=Decimal('5.00'),
+                    user=self.user
+                )
+                receta.tags.add(tag)
+
+        res = self.client.get(
+            TAGS_URL, {'orden': 'usage_count', 'page_size': 2}
+        )
+        vistos = res.data['results']
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            vistos += res.data['results']
+
+        self.assertEqual(
+            [(t['nombre'], t['usage_count']) for t in vistos],
+            [('Tag 2', 3), ('Tag 1', 2), ('Tag 0', 1), ('Tag 4', 0),
+             ('Tag 3', 0)],
+        )
+
+    def test_paginacion_tags_por_usage_count_empates(self):
+        """Prueba recorrer más tags empatados en usage_count que el
+        desplazamiento máximo del cursor de DRF, en ambas direcciones"""
+        Tag.objects.bulk_create([
+            Tag(user=self.user, nombre=f'Tag {i}')
+            for i in range(AtributoCursorPagination.offset_cutoff + 500)
+        ])
+        esperados = Tag.objects.filter(user=self.user).order_by(
+            '-usage_count', '-nombre'
+        ).values_list('id', flat=True)
+
+        params = {'orden': 'usage_count', 'page_size': 200}
+        res = self.client.get(TAGS_URL, params)
+        vistos = [t['id'] for t in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            vistos += [t['id'] for t in res.data['results']]
+
+        self.assertEqual(vistos, list(esperados))
+        vistos = [t['id'] for t in res.data['results']]
+        while res.data['previous']:
+            res = self.client.get(res.data['previous'])
+            vistos = [t['id'] for t in res.data['results']] + vistos
+        self.assertEqual(vistos, list(esperados))
+
+    def test_paginacion_tags_por_nombre(self):
+        """Prueba que la paginación por cursor no repita ni omita
+        tags ordenados por nombre"""
+        for nombre in ['Cena', 'cena', 'Cena 2', 'Almuerzo', 'Desayuno']:
+            Tag.objects.create(user=self.user, nombre=nombre)
+
+        res = self.client.get(TAGS_URL, {'page_size': 2})
+        vistos = [t['id'] for t in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            vistos += [t['id'] for t in res.data['results']]
+
+        esperados = Tag.objects.order_by('-nombre', '-id')
+        self.assertEqual(vistos, [t.id for t in esperados])
+
+    def test_renombrar_tag_a_nombre_existente_error(self):
+        """Prueba que no se pueda repetir el nombre de un tag"""
+        Tag.objects.create(user=self.user, nombre='Cena')
+        tag = Tag.objects.create(user=self.user, nombre='Almuerzo')
+
+        res = self.client.patch(detail_url(tag.id), {'nombre': 'Cena'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Tag.objects.filter(nombre='Cena').count(), 1)
+
+    def test_autocompletar_prefijo_primero(self):
+        """Prueba que el autocompletado priorice los nombres
+        que empiezan con el texto"""
+        Tag.objects.create(user=self.user, nombre='Postre frío')
+        Tag.objects.create(user=self.user, nombre='Cena')
+        Tag.objects.create(user=self.user, nombre='Postres')
+        Tag.objects.create(user=self.user, nombre='Mini postre')
+
+        res = self.client.get(AUTOCOMPLETAR_URL, {'q': 'pos'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        nombres = [t['nombre'] for t in res.data]
+        self.assertEqual(nombres[:2], ['Postre frío', 'Postres'])
+        self.assertNotIn('Cena', nombres)
+
+    def test_autocompletar_tolera_errores(self):
+        """Prueba que el autocompletado encuentre nombres con errores
+        de tipeo en el texto"""
+        tag = Tag.objects.create(user=self.user, nombre='Vegetariano')
+        Tag.objects.create(user=self.user, nombre='Mariscos')
+
+        res = self.client.get(AUTOCOMPLETAR_URL, {'q': 'vegetarano'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([t['id'] for t in res.data], [tag.id])
+
+    def test_autocompletar_limitado_por_usuario_y_limite(self):
+        """Prueba que el autocompletado respete el usuario y el límite"""
+        otro_user = crear_usuario(correo='otro@example.com')
+        Tag.objects.create(user=otro_user, nombre='Sopa ajena')
+        for i in range(5):
+            Tag.objects.create(user=self.user, nombre=f'Sopa {i}')
+
+        res = self.client.get(AUTOCOMPLETAR_URL, {'q': 'sopa', 'limite': 3})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 3)
+        self.assertNotIn('Sopa ajena', [t['nombre'] for t in res.data])
+
+    def test_autocompletar_limite_invalido(self):
+        """Prueba que un límite no numérico use el de omisión y uno muy
+        grande se recorte al máximo"""
+        for i in range(5):
+            Tag.objects.create(user=self.user, nombre=f'Sopa {i}')
+
+        res = self.client.get(AUTOCOMPLETAR_URL, {'q': 'sopa', 'limite': 'x'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 5)
+
+        with patch.object(TagViewSet, 'autocompletar_max', 2):
+            res = self.client.get(
+                AUTOCOMPLETAR_URL, {'q': 'sopa', 'limite': 1000}
+            )
+
+        self.assertEqual(len(res.data), 2)
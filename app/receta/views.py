@@ -1,6 +1,15 @@
 """
 Views para el API de Receta
 """
+import re
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramWordSimilarity,
+)
+from django.db.models import F, FloatField, Q, BooleanField, ExpressionWrapper
+from django.db.models.functions import Cast
 from drf_spectacular.utils import (
     extend_schema_view,
     extend_schema,
@@ -10,16 +19,44 @@ from drf_spectacular.utils import (
 from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
-from Core.models import Receta, Tag, Ingrediente
+from Core.authentication import (
+    CachedTokenAuthentication,
+    SignedTokenAuthentication,
+)
+from Core.models import Receta, Tag, Ingrediente, SEARCH_CONFIG
+from Core.routers import ReplicaReadMixin
 from receta import serializers
+from receta.cache import cache_por_usuario
+from receta.conditional import respuesta_condicional
+from receta.filters import (
+    filtrar_por_relacion,
+    filtrar_asignados,
+)
+from receta.pagination import (
+    RecetaCursorPagination,
+    AtributoCursorPagination,
+)
+
+
+CAMPOS_PARAMETERS = [
+    OpenApiParameter(
+        'fields',
+        OpenApiTypes.STR,
+        description='Campos separados por coma a incluir en la respuesta'
+    ),
+    OpenApiParameter(
+        'omit',
+        OpenApiTypes.STR,
+        description='Campos separados por coma a omitir de la respuesta'
+    ),
+]
 
 
 @extend_schema_view(
     list=extend_schema(
-        parameters=[
+        parameters=CAMPOS_PARAMETERS + [
             OpenApiParameter(
                 'tags',
                 OpenApiTypes.STR,
@@ -30,16 +67,34 @@ from receta import serializers
                 OpenApiTypes.STR,
                 description="""Lista de ingredientes IDs separados
                 por coma para filtrar"""
-            )
+            ),
+            OpenApiParameter(
+                'q',
+                OpenApiTypes.STR,
+                description="""Búsqueda de texto completo sobre titulo y
+                desc, los resultados se ordenan por relevancia"""
+            ),
+            OpenApiParameter(
+                'match',
+                OpenApiTypes.STR,
+                enum=['any', 'all'],
+                description="""any: recetas con alguno de los tags o
+                ingredientes pedidos, all: recetas con todos"""
+            ),
         ]
-    )
+    ),
+    retrieve=extend_schema(parameters=CAMPOS_PARAMETERS),
 )
-class RecetaViewSet(viewsets.ModelViewSet):
+class RecetaViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """Vista para gestionar APIs recetas"""
     serializer_class = serializers.RecetaDetailSerializer
-    queryset = Receta.objects.all()
-    authentication_classes = [TokenAuthentication]
+    queryset = Receta.objects.defer('search_vector')
+    authentication_classes = [
+        CachedTokenAuthentication,
+        SignedTokenAuthentication,
+    ]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecetaCursorPagination
 
     def _params_to_ints(self, qs):
         """Convierte una lista de strings a enteros"""
@@ -49,22 +104,69 @@ class RecetaViewSet(viewsets.ModelViewSet):
         """Recupera las recetas del usuario autenticado"""
         tags = self.request.query_params.get('tags')
         ingredientes = self.request.query_params.get('ingredientes')
+        match_all = self.request.query_params.get('match') == 'all'
+        q = self.request.query_params.get('q')
         queryset = self.queryset
+        if q:
+            queryset = self._buscar(queryset, q)
         if tags:
             tags_id = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tags_id)
+            queryset = filtrar_por_relacion(
+                queryset, 'tags', tags_id, match_all
+            )
         if ingredientes:
             ing_id = self._params_to_ints(ingredientes)
-            queryset = queryset.filter(ingredientes__id__in=ing_id)
+            queryset = filtrar_por_relacion(
+                queryset, 'ingredientes', ing_id, match_all
+            )
 
-        return queryset.filter(
+        queryset = queryset.filter(
             user=self.request.user
-        ).order_by('-id').distinct()
+        ).order_by('-id')
+
+        if self.action in ('list', 'retrieve'):
+            queryset = self._recortar(queryset)
+
+        return queryset
+
+    def _recortar(self, queryset):
+        """Carga solo las columnas y relaciones que el serializer va a
+        regresar según ?fields= y ?omit=. Las relaciones se precargan en
+        una consulta fija cada una en lugar de una consulta por receta"""
+        campos = serializers.campos_dinamicos(
+            self.request, self.get_serializer_class().Meta.fields
+        )
+        relaciones = [c for c in campos if c in ('tags', 'ingredientes')]
+        columnas = [c for c in campos if c not in relaciones]
+        if self.action == 'list':
+            # RecetaFilasListSerializer carga las relaciones de la página
+            return queryset.values(
+                'id', *columnas, *queryset.query.annotations
+            )
+
+        return queryset.only('id', *columnas).prefetch_related(*relaciones)
+
+    @respuesta_condicional
+    @cache_por_usuario
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @respuesta_condicional
+    @cache_por_usuario
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def _buscar(self, queryset, q):
+        """Filtra por el índice GIN de search_vector y anota la relevancia"""
+        query = SearchQuery(q, config=SEARCH_CONFIG, search_type='websearch')
+        return queryset.filter(search_vector=query).annotate(
+            rank=Cast(SearchRank(F('search_vector'), query), FloatField())
+        )
 
     def get_serializer_class(self):
         """Recupera la clase serializer para la petición"""
         if self.action == 'list':
-            return serializers.RecetaSerializer
+            return serializers.RecetaFilasSerializer
         elif self.action == 'upload_image':
             return serializers.RecetaImagenSerializer
 
@@ -96,16 +198,36 @@ class RecetaViewSet(viewsets.ModelViewSet):
                 enum=[0, 1],
                 description='Filtra por items asigandos a la receta'
             ),
+            OpenApiParameter(
+                'usage_count',
+                OpenApiTypes.INT,
+                enum=[0, 1],
+                description='Incluye el número de recetas que usan cada item'
+            ),
+            OpenApiParameter(
+                'orden',
+                OpenApiTypes.STR,
+                enum=['nombre', 'usage_count'],
+                description="""nombre: orden por nombre descendente,
+                usage_count: los más usados primero, incluye usage_count"""
+            ),
         ]
     )
 )
-class BaseRecetaAttrViewSet(mixins.DestroyModelMixin,
+class BaseRecetaAttrViewSet(ReplicaReadMixin,
+                            mixins.DestroyModelMixin,
                             mixins.UpdateModelMixin,
                             mixins.ListModelMixin,
                             viewsets.GenericViewSet):
     """Clase Base para TagViewSet y IngredienteViewSet"""
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [
+        CachedTokenAuthentication,
+        SignedTokenAuthentication,
+    ]
     permission_classes = [IsAuthenticated]
+    pagination_class = AtributoCursorPagination
+    autocompletar_limite = 10
+    autocompletar_max = 50
 
     def get_queryset(self):
         """Recupera los tags del usuario autenticado"""
@@ -114,20 +236,85 @@ class BaseRecetaAttrViewSet(mixins.DestroyModelMixin,
         )
         queryset = self.queryset
         if asignado:
-            queryset = queryset.filter(receta__isnull=False)
+            queryset = filtrar_asignados(queryset, self.relacion)
 
         return queryset.filter(
             user=self.request.user
-        ).order_by('-nombre').distinct()
+        ).order_by('-nombre')
+
+    def _con_usos(self):
+        """Indica si el listado debe incluir usage_count"""
+        params = self.request.query_params
+        return self.action == 'list' and (
+            params.get('usage_count') == '1'
+            or params.get('orden') == 'usage_count'
+        )
+
+    def get_serializer_class(self):
+        """Agrega usage_count al serializer cuando se pide"""
+        if self._con_usos():
+            return self.serializer_uso_class
+
+        return self.serializer_class
+
+    @respuesta_condicional
+    @cache_por_usuario
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'q',
+                OpenApiTypes.STR,
+                required=True,
+                description='Prefijo o texto aproximado del nombre'
+            ),
+            OpenApiParameter(
+                'limite',
+                OpenApiTypes.INT,
+                description='Número máximo de resultados'
+            ),
+        ]
+    )
+    @action(methods=['GET'], detail=False, url_path='autocompletar')
+    @cache_por_usuario
+    def autocompletar(self, request):
+        """Regresa los nombres que empiezan con el prefijo y luego los
+        más parecidos por trigramas, para tolerar errores de tipeo"""
+        texto = request.query_params.get('q', '').strip()
+        try:
+            limite = int(request.query_params['limite'])
+        except (KeyError, ValueError):
+            limite = self.autocompletar_limite
+        limite = max(1, min(limite, self.autocompletar_max))
+        if not texto:
+            return Response([])
+
+        # ~* y %> se resuelven con el índice GIN gin_trgm_ops de nombre
+        prefijo = Q(nombre__iregex=f'^{re.escape(texto)}')
+        queryset = self.queryset.filter(user=request.user).filter(
+            prefijo | Q(nombre__trigram_word_similar=texto)
+        ).annotate(
+            es_prefijo=ExpressionWrapper(prefijo, output_field=BooleanField()),
+            similitud=TrigramWordSimilarity(texto, 'nombre'),
+        ).order_by('-es_prefijo', '-similitud', 'nombre')[:limite]
+
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
 
 
 class TagViewSet(BaseRecetaAttrViewSet):
     """Vista para gestionar APIs Tags"""
     serializer_class = serializers.TagSerializer
+    serializer_uso_class = serializers.TagUsoSerializer
     queryset = Tag.objects.all()
+    relacion = 'tags'
 
 
 class IngredienteViewSet(BaseRecetaAttrViewSet):
     """Vista para gestionar APIs Ingredientes"""
     serializer_class = serializers.IngredienteSerializer
+    serializer_uso_class = serializers.IngredienteUsoSerializer
     queryset = Ingrediente.objects.all()
+    relacion = 'ingredientes'
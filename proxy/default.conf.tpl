@@ -1,13 +1,29 @@
 server {
     listen ${LISTEN_PORT};
 
+    sendfile   on;
+    tcp_nopush on;
+
+    # Django autoriza cada imagen y responde con X-Accel-Redirect
+    location /static/media/ {
+        include              /etc/nginx/app_pass.conf;
+    }
+
+    # Solo accesible por X-Accel-Redirect. nginx atiende Range,
+    # If-Modified-Since y ETag sobre el archivo. Los nombres dependen del
+    # contenido, por eso se pueden guardar en caché sin revalidar
+    location /media-interno/ {
+        internal;
+        alias      /vol/static/media/;
+        add_header Cache-Control "public, max-age=31536000, immutable";
+    }
+
     location /static {
         alias /vol/static;
     }
 
     location / {
-        uwsgi_pass           ${APP_HOST}:${APP_PORT};
-        include              /etc/nginx/uwsgi_params;
+        include              /etc/nginx/app_pass.conf;
         client_max_body_size 10M;
     }
-}
\ No newline at end of file
+}
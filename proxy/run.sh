@@ -2,5 +2,14 @@
 
 set -e
 
+# uWSGI habla el protocolo uwsgi, el despliegue ASGI (uvicorn) HTTP
+if [ "$SERVIDOR" = "asgi" ]; then
+    printf 'proxy_pass http://%s:%s;\ninclude /etc/nginx/proxy_params;\n' \
+        "$APP_HOST" "$APP_PORT" > /etc/nginx/app_pass.conf
+else
+    printf 'uwsgi_pass %s:%s;\ninclude /etc/nginx/uwsgi_params;\n' \
+        "$APP_HOST" "$APP_PORT" > /etc/nginx/app_pass.conf
+fi
+
 envsubst < /etc/nginx/default.conf.tpl > /etc/nginx/conf.d/default.conf
-nginx -g 'daemon off;'
\ No newline at end of file
+nginx -g 'daemon off;'